@@ -0,0 +1,125 @@
+"""Throughput of protocol-pruned vs. full dissection for a profile.
+
+Usage:
+    python benchmarks/bench_pruning.py CAPTURE [--profile ngap_nas] [--protocols ngap,nas-5gs]
+        [--field ngap.RAN_UE_NGAP_ID ...] [--repeat 3]
+
+Runs the same `tshark -T fields` pass over CAPTURE twice per repetition: once with the
+profile's decode_as/preferences only, once with a `protocols` allowlist added (the
+profile's own, or `--protocols`). Use a capture that mixes control plane
+(NGAP/S1AP/Diameter) with GTP-U user plane to see the effect of skipping inner IP/TCP/TLS
+dissection.
+
+The pruned output (frame number, protocol and info columns plus every `--field`) must be
+identical to the full run; otherwise the allowlist drops something the capture needs
+(a link type, a tunnel, a sub-dissector) and the script exits with status 1.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+from pathlib import Path
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from pcap_mcp.config import dissector_argv, expand_protocols, load_config  # noqa: E402
+
+COMPARE_FIELDS = ("frame.number", "_ws.col.Protocol", "_ws.col.Info")
+
+
+def _run(tshark: str, capture: Path, argv: tuple[str, ...], display_filter: str, fields: list[str]) -> tuple[float, list[str]]:
+    args = [tshark, "-n", *argv, "-r", str(capture)]
+    if display_filter:
+        args += ["-Y", display_filter]
+    args += ["-T", "fields"]
+    for f in fields:
+        args += ["-e", f]
+    t0 = time.perf_counter()
+    r = subprocess.run(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=False)
+    elapsed = time.perf_counter() - t0
+    if r.returncode != 0:
+        raise SystemExit(f"tshark failed ({r.returncode}): {r.stderr.strip()}")
+    return elapsed, [line for line in r.stdout.splitlines() if line.strip()]
+
+
+def _count_frames(tshark: str, capture: Path) -> int:
+    r = subprocess.run(
+        [tshark, "-n", "--disable-all-protocols", "--enable-protocol", "frame", "-r", str(capture), "-T", "fields", "-e", "frame.number"],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        check=False,
+    )
+    return sum(1 for line in r.stdout.splitlines() if line.strip())
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("capture", type=Path)
+    ap.add_argument("--profile", default="ngap_nas")
+    ap.add_argument("--protocols", default="", help="comma-separated allowlist (default: the profile's own)")
+    ap.add_argument("--field", action="append", default=[], help="extra field to compare (repeatable)")
+    ap.add_argument("--repeat", type=int, default=3)
+    ns = ap.parse_args()
+
+    cfg = load_config()
+    compiled = cfg.compiled_profiles.get(ns.profile)
+    if compiled is None:
+        raise SystemExit(f"unknown profile: {ns.profile} (available: {sorted(cfg.profiles)})")
+    requested = tuple(x.strip() for x in ns.protocols.split(",") if x.strip())
+    protocols = expand_protocols(requested, compiled.decode_as) if requested else compiled.protocols
+    if not protocols:
+        raise SystemExit(f"profile {ns.profile} has no protocols allowlist; pass --protocols")
+
+    total_frames = _count_frames(cfg.tshark_path, ns.capture)
+    fields = [*COMPARE_FIELDS, *(f for f in ns.field if f not in COMPARE_FIELDS)]
+    full_argv = dissector_argv(compiled.decode_as, compiled.preferences)
+    pruned_argv = dissector_argv(compiled.decode_as, compiled.preferences, protocols)
+    results: dict[str, list[float]] = {"full": [], "pruned": []}
+    output: dict[str, list[str]] = {}
+    for _ in range(max(1, ns.repeat)):
+        for mode, argv in (("full", full_argv), ("pruned", pruned_argv)):
+            elapsed, lines = _run(cfg.tshark_path, ns.capture, argv, compiled.display_filter, fields)
+            results[mode].append(elapsed)
+            output[mode] = lines
+
+    out: dict[str, object] = {
+        "capture": str(ns.capture),
+        "profile": ns.profile,
+        "frames": total_frames,
+        "enabled_protocols": list(protocols),
+        "compared_fields": fields,
+    }
+    for mode, times in results.items():
+        best = min(times)
+        out[mode] = {
+            "best_s": round(best, 4),
+            "frames_per_s": round(total_frames / best, 1) if best > 0 else None,
+            "matched_frames": len(output[mode]),
+        }
+    full_best = min(results["full"])
+    pruned_best = min(results["pruned"])
+    out["speedup"] = round(full_best / pruned_best, 2) if pruned_best > 0 else None
+    mismatch = next(
+        (i for i, (a, b) in enumerate(zip(output["full"], output["pruned"])) if a != b),
+        None if len(output["full"]) == len(output["pruned"]) else min(len(output["full"]), len(output["pruned"])),
+    )
+    if mismatch is not None:
+        out["mismatch"] = {
+            "row": mismatch,
+            "full": output["full"][mismatch] if mismatch < len(output["full"]) else None,
+            "pruned": output["pruned"][mismatch] if mismatch < len(output["pruned"]) else None,
+        }
+    print(json.dumps(out, indent=2))
+    if mismatch is not None:
+        print("pruned output differs from the full run; the protocols allowlist is missing a layer", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,154 @@
+"""Parsing throughput of tshark `-T fields` output: line-buffered text vs. bulk binary reads.
+
+Usage:
+    python benchmarks/bench_reader.py [--rows 500000] [--repeat 3]
+
+Writes synthetic `-T fields` output (the packet_list default columns, plain and
+`-E quote=d`, and a frame.number-only stream) to temporary files and streams each through
+`cat` twice per repetition: once the way the tools read it before (`text=True, bufsize=1`, per-line strip/split and
+a csv.reader per line for quoted output), once through `proc.stdout_rows`. Reports rows
+per second for the timeline, frames_by_filter and packet_list access patterns; tshark
+itself is not involved, so the numbers isolate the Python side.
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+from pathlib import Path
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from pcap_mcp.proc import popen_bytes, stdout_rows  # noqa: E402
+from pcap_mcp.tshark_tools import fields_row  # noqa: E402
+
+COLUMNS = 43
+TIMELINE_FIELDS = [f"f{i}" for i in range(COLUMNS)]
+
+
+def _write_output(path: Path, rows: int, quoted: bool, frames_only: bool = False) -> None:
+    q = '"' if quoted else ""
+    with path.open("w", encoding="utf-8") as f:
+        for i in range(1, rows + 1):
+            if frames_only:
+                f.write(f"{i}\n")
+                continue
+            values = [str(i), f"{1700000000 + i * 0.001:.6f}", "10.0.0.1", "10.0.0.2", "NGAP", "182"]
+            values.append("InitialUEMessage, Registration request" if i % 3 else "DownlinkNASTransport, Authentication request")
+            values += ["001010000000001" if i % 5 == 0 else "", "1|2" if i % 7 == 0 else ""]
+            values += [""] * (COLUMNS - len(values))
+            f.write("\t".join(f"{q}{v}{q}" for v in values) + "\n")
+
+
+def _old_timeline(path: Path) -> int:
+    p = subprocess.Popen(["cat", str(path)], stdout=subprocess.PIPE, text=True, bufsize=1)
+    n = 0
+    assert p.stdout is not None
+    for line in p.stdout:
+        line = line.rstrip("\n")
+        if line:
+            fields_row(line.split("\t"), TIMELINE_FIELDS)
+            n += 1
+    p.wait()
+    return n
+
+
+def _new_timeline(path: Path) -> int:
+    p = popen_bytes(["cat", str(path)])
+    n = 0
+    for batch in stdout_rows(p):
+        for parts in batch:
+            fields_row(parts, TIMELINE_FIELDS)
+        n += len(batch)
+    p.wait()
+    return n
+
+
+def _old_frames(path: Path) -> int:
+    p = subprocess.Popen(["cat", str(path)], stdout=subprocess.PIPE, text=True, bufsize=1)
+    frames: list[int] = []
+    assert p.stdout is not None
+    for line in p.stdout:
+        s = line.strip()
+        if s:
+            frames.append(int(s))
+    p.wait()
+    return len(frames)
+
+
+def _new_frames(path: Path) -> int:
+    p = popen_bytes(["cat", str(path)])
+    frames: list[int] = []
+    for batch in stdout_rows(p, columns=0):
+        frames.extend([int(v) for v in batch if v.isdigit()])
+    p.wait()
+    return len(frames)
+
+
+def _old_packet_list(path: Path) -> int:
+    p = subprocess.Popen(["cat", str(path)], stdout=subprocess.PIPE, text=True, bufsize=1)
+    n = 0
+    assert p.stdout is not None
+    for line in p.stdout:
+        line = line.rstrip("\n")
+        if line:
+            next(csv.reader([line], delimiter="\t", quotechar='"'))
+            n += 1
+    p.wait()
+    return n
+
+
+def _new_packet_list(path: Path) -> int:
+    p = popen_bytes(["cat", str(path)])
+    n = 0
+    for batch in stdout_rows(p, quoted=True):
+        n += len(batch)
+    p.wait()
+    return n
+
+
+def _best(fn: Callable[[Path], int], path: Path, repeat: int) -> tuple[float, int]:
+    best = float("inf")
+    rows = 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        rows = fn(path)
+        best = min(best, time.perf_counter() - t0)
+    return best, rows
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rows", type=int, default=500000)
+    ap.add_argument("--repeat", type=int, default=3)
+    ns = ap.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        plain = Path(tmp) / "fields.tsv"
+        quoted = Path(tmp) / "fields_quoted.tsv"
+        frames = Path(tmp) / "frames.tsv"
+        _write_output(plain, ns.rows, quoted=False)
+        _write_output(frames, ns.rows, quoted=False, frames_only=True)
+        _write_output(quoted, ns.rows, quoted=True)
+        cases = [
+            ("timeline", plain, _old_timeline, _new_timeline),
+            ("frames_by_filter", frames, _old_frames, _new_frames),
+            ("packet_list", quoted, _old_packet_list, _new_packet_list),
+        ]
+        print(f"{'pattern':<18} {'rows':>9} {'line rows/s':>12} {'bulk rows/s':>12} {'speedup':>8}")
+        for name, path, old, new in cases:
+            t_old, rows = _best(old, path, ns.repeat)
+            t_new, rows_new = _best(new, path, ns.repeat)
+            if rows != rows_new:
+                raise SystemExit(f"{name}: row count mismatch ({rows} vs {rows_new})")
+            print(f"{name:<18} {rows:>9} {rows / t_old:>12.0f} {rows / t_new:>12.0f} {t_old / t_new:>7.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,349 @@
+"""Benchmark harness: times every MCP tool against synthetic captures of several sizes.
+
+Usage:
+    python benchmarks/run.py [--sizes 1M,10M,50M] [--formats pcap,pcapng] [--tools pcap_timeline,...]
+        [--repeat 1] [--save NAME] [--compare benchmarks/baselines/NAME.json] [--threshold 1.25]
+
+Each measurement runs in a fresh Python process (cold in-memory caches, empty metadata
+store) against a local tshark. Reported per tool and capture:
+- wall_s: tool call wall time (best of --repeat)
+- tshark_spawns: tshark processes started by the call
+- bytes_read: rchar of the measurement process plus reaped children (/proc/self/io)
+- peak_rss_mb / peak_child_rss_mb: ru_maxrss of the Python process / largest child
+
+The `startup` pseudo-tool starts `python -m pcap_mcp` over stdio instead: wall_s is the time
+from spawn to the `initialize` response, first_call_s the time of a following pcap_info call
+on the capture (which may wait for the background warm-up).
+
+Captures are generated once per (size, format) with benchmarks/synth.py and kept under
+--workdir. `--save` writes a JSON baseline; `--compare` prints ratios against one and exits
+non-zero if any wall time regressed beyond --threshold.
+"""
+
+from __future__ import annotations
+
+import argparse
+from datetime import datetime, timezone
+import json
+import os
+from pathlib import Path
+import platform
+import shutil
+import subprocess
+import sys
+import time
+from typing import Any, Callable
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from synth import generate, parse_size  # noqa: E402
+
+
+BASELINE_DIR = Path(__file__).resolve().parent / "baselines"
+
+# tool name -> (server function name, kwargs builder taking the capture path)
+TOOLS: dict[str, tuple[str, Callable[[str], dict[str, Any]]]] = {
+    "pcap_info": ("pcap_info", lambda p: {"pcap_path": p}),
+    "pcap_catalog": ("pcap_catalog", lambda p: {}),
+    "pcap_conversations": ("pcap_conversations", lambda p: {"pcap_path": p}),
+    "pcap_decode_as_scan": ("pcap_decode_as_scan", lambda p: {"pcap_path": p}),
+    "pcap_ngap_ue_sessions": ("pcap_ngap_ue_sessions", lambda p: {"pcap_path": p}),
+    "pcap_ngap_pdu_sessions": ("pcap_ngap_pdu_sessions", lambda p: {"pcap_path": p}),
+    "pcap_timeline_export": (
+        "pcap_timeline_export",
+        lambda p: {
+            "pcap_path": p,
+            "display_filter": "",
+            "fields": ["frame.number", "frame.time_epoch", "_ws.col.Protocol", "_ws.col.Info"],
+        },
+    ),
+    "pcap_timeline": (
+        "pcap_timeline",
+        lambda p: {
+            "pcap_path": p,
+            "display_filter": "sip || diameter || http2",
+            "fields": ["frame.number", "frame.time_epoch", "_ws.col.Protocol", "_ws.col.Info"],
+            "limit": 1000,
+        },
+    ),
+    "pcap_timeline_compact": (
+        "pcap_timeline",
+        lambda p: {
+            "pcap_path": p,
+            "display_filter": "sip || diameter || http2",
+            "fields": ["frame.number", "frame.time_epoch", "_ws.col.Protocol", "_ws.col.Info"],
+            "limit": 1000,
+            "encoding": "compact",
+        },
+    ),
+    "pcap_timeline_window": (
+        "pcap_timeline",
+        lambda p: {
+            "pcap_path": p,
+            "display_filter": "sip",
+            "fields": ["frame.number", "sip.Call-ID"],
+            "around_frame": 1,
+            "around_seconds": 1.0,
+            "limit": 1000,
+        },
+    ),
+    "pcap_frames_by_filter": ("pcap_frames_by_filter", lambda p: {"pcap_path": p, "display_filter": "diameter", "limit": 1000}),
+    "pcap_frame_detail": ("pcap_frame_detail", lambda p: {"pcap_path": p, "frame_numbers": [1], "verbosity": "full"}),
+    "pcap_follow": ("pcap_follow", lambda p: {"pcap_path": p, "frame_number": 1}),
+    "pcap_text_search": ("pcap_text_search", lambda p: {"pcap_path": p, "display_filter": "sip", "query": "INVITE", "limit": 200}),
+    "pcap_packet_list": ("pcap_packet_list", lambda p: {"pcap_path": p, "display_filter": "sip || diameter"}),
+    "pcap_extract_subcapture": ("pcap_extract_subcapture", lambda p: {"pcap_path": p, "frame_numbers": list(range(1, 101))}),
+}
+
+
+STARTUP = "startup"
+
+
+def _rchar() -> int:
+    try:
+        for line in Path("/proc/self/io").read_text().splitlines():
+            if line.startswith("rchar:"):
+                return int(line.split()[1])
+    except (OSError, ValueError):
+        pass
+    return -1
+
+
+def _maxrss_mb(who: int) -> float:
+    import resource
+
+    kb = resource.getrusage(who).ru_maxrss
+    return round(kb / 1024.0 / (1024.0 if sys.platform == "darwin" else 1.0), 1)
+
+
+def measure(tool: str, capture: str) -> dict[str, Any]:
+    import resource
+
+    spawns = 0
+    real_init = subprocess.Popen.__init__
+
+    def counting_init(self: subprocess.Popen, args: Any, *a: Any, **kw: Any) -> None:
+        nonlocal spawns
+        argv = [str(x) for x in (args if isinstance(args, (list, tuple)) else [args])]
+        if any(Path(x).name.startswith("tshark") for x in argv[:4]):
+            spawns += 1
+        real_init(self, args, *a, **kw)
+
+    subprocess.Popen.__init__ = counting_init  # type: ignore[method-assign]
+
+    import pcap_mcp.server as server
+
+    fn_name, build = TOOLS[tool]
+    fn = getattr(server, fn_name)
+    kwargs = build(capture)
+    rchar0 = _rchar()
+    t0 = time.perf_counter()
+    error = None
+    try:
+        fn(**kwargs)
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    wall = time.perf_counter() - t0
+    rchar1 = _rchar()
+    return {
+        "wall_s": round(wall, 4),
+        "tshark_spawns": spawns,
+        "bytes_read": rchar1 - rchar0 if rchar0 >= 0 and rchar1 >= 0 else None,
+        "peak_rss_mb": _maxrss_mb(resource.RUSAGE_SELF),
+        "peak_child_rss_mb": _maxrss_mb(resource.RUSAGE_CHILDREN),
+        "error": error,
+    }
+
+
+def measure_startup(capture: str) -> dict[str, Any]:
+    def send(proc: subprocess.Popen, msg: dict[str, Any]) -> None:
+        assert proc.stdin is not None
+        proc.stdin.write(json.dumps(msg) + "\n")
+        proc.stdin.flush()
+
+    def reply(proc: subprocess.Popen, msg_id: int) -> dict[str, Any]:
+        assert proc.stdout is not None
+        for line in proc.stdout:
+            msg = json.loads(line)
+            if msg.get("id") == msg_id:
+                return msg
+        raise RuntimeError("server exited before replying")
+
+    t0 = time.perf_counter()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "pcap_mcp"],
+        cwd=str(ROOT),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        text=True,
+    )
+    error = None
+    initialize_s = first_call_s = None
+    try:
+        send(
+            proc,
+            {
+                "jsonrpc": "2.0",
+                "id": 1,
+                "method": "initialize",
+                "params": {"protocolVersion": "2025-03-26", "capabilities": {}, "clientInfo": {"name": "bench", "version": "0"}},
+            },
+        )
+        reply(proc, 1)
+        initialize_s = time.perf_counter() - t0
+        send(proc, {"jsonrpc": "2.0", "method": "notifications/initialized"})
+        t1 = time.perf_counter()
+        send(proc, {"jsonrpc": "2.0", "id": 2, "method": "tools/call", "params": {"name": "pcap_info", "arguments": {"pcap_path": capture}}})
+        res = reply(proc, 2)
+        first_call_s = time.perf_counter() - t1
+        if res.get("error") or (res.get("result") or {}).get("isError"):
+            error = json.dumps(res.get("error") or res.get("result"))[:500]
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    finally:
+        proc.kill()
+        proc.wait()
+    return {
+        "wall_s": round(initialize_s, 4) if initialize_s is not None else None,
+        "first_call_s": round(first_call_s, 4) if first_call_s is not None else None,
+        "tshark_spawns": None,
+        "error": error,
+    }
+
+
+def _write_config(workdir: Path) -> Path:
+    base = json.loads((ROOT / "pcap_mcp_config.json").read_text(encoding="utf-8"))
+    base["allowed_pcap_dirs"] = [str(workdir / "captures")]
+    base["output_dir"] = str(workdir / "out")
+    base["metadata_dir"] = str(workdir / "out" / ".metadata")
+    p = workdir / "config.json"
+    p.write_text(json.dumps(base, indent=2), encoding="utf-8")
+    return p
+
+
+def _ensure_capture(workdir: Path, size: str, fmt: str, seed: int) -> tuple[Path, dict[str, int]]:
+    cap_dir = workdir / "captures"
+    cap_dir.mkdir(parents=True, exist_ok=True)
+    path = cap_dir / f"synth_{size}_s{seed}.{fmt}"
+    meta_path = path.with_name(path.name + ".json")
+    if path.exists() and meta_path.exists():
+        return path, json.loads(meta_path.read_text())
+    info = generate(path, size=parse_size(size), fmt=fmt, seed=seed)
+    meta_path.write_text(json.dumps(info))
+    return path, info
+
+
+def _run_one(workdir: Path, config: Path, tool: str, capture: Path) -> dict[str, Any]:
+    shutil.rmtree(workdir / "out", ignore_errors=True)
+    env = dict(os.environ, PCAP_MCP_CONFIG_JSON=str(config))
+    r = subprocess.run(
+        [sys.executable, str(Path(__file__).resolve()), "--measure", tool, str(capture)],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        env=env,
+        check=False,
+    )
+    lines = [ln for ln in r.stdout.splitlines() if ln.strip()]
+    if r.returncode != 0 or not lines:
+        return {"error": f"measurement process failed ({r.returncode}): {r.stderr.strip()[-500:]}"}
+    return json.loads(lines[-1])
+
+
+def _tshark_version() -> str:
+    try:
+        r = subprocess.run(["tshark", "-v"], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, check=False)
+        return (r.stdout.splitlines() or [""])[0].strip()
+    except OSError:
+        return ""
+
+
+def _key(r: dict[str, Any]) -> tuple[str, str, str]:
+    return (r["tool"], r["size"], r["format"])
+
+
+def compare(results: list[dict[str, Any]], baseline_path: Path, threshold: float) -> int:
+    base = {_key(r): r for r in json.loads(baseline_path.read_text())["results"]}
+    regressions = 0
+    print(f"{'tool':28} {'size':>6} {'fmt':>6} {'base_s':>9} {'now_s':>9} {'ratio':>6}")
+    for r in results:
+        b = base.get(_key(r))
+        if not b or r.get("error") or b.get("error") or not b.get("wall_s"):
+            continue
+        ratio = r["wall_s"] / b["wall_s"]
+        flag = ""
+        if ratio > threshold:
+            regressions += 1
+            flag = "  REGRESSION"
+        print(f"{r['tool']:28} {r['size']:>6} {r['format']:>6} {b['wall_s']:9.3f} {r['wall_s']:9.3f} {ratio:6.2f}{flag}")
+    return 1 if regressions else 0
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--measure", nargs=2, metavar=("TOOL", "CAPTURE"), help=argparse.SUPPRESS)
+    ap.add_argument("--sizes", default="1M,10M,50M")
+    ap.add_argument("--formats", default="pcap")
+    ap.add_argument("--tools", default="all")
+    ap.add_argument("--repeat", type=int, default=1)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--workdir", type=Path, default=Path(__file__).resolve().parent / ".work")
+    ap.add_argument("--save", default="")
+    ap.add_argument("--compare", type=Path)
+    ap.add_argument("--threshold", type=float, default=1.25)
+    ns = ap.parse_args()
+
+    if ns.measure:
+        tool, capture = ns.measure
+        print(json.dumps(measure_startup(capture) if tool == STARTUP else measure(tool, capture)))
+        return 0
+
+    available = [*TOOLS, STARTUP]
+    tools = available if ns.tools == "all" else [t.strip() for t in ns.tools.split(",") if t.strip()]
+    unknown = [t for t in tools if t not in available]
+    if unknown:
+        raise SystemExit(f"unknown tools: {unknown} (available: {available})")
+
+    ns.workdir.mkdir(parents=True, exist_ok=True)
+    config = _write_config(ns.workdir)
+    results: list[dict[str, Any]] = []
+    for fmt in [f.strip() for f in ns.formats.split(",") if f.strip()]:
+        for size in [s.strip() for s in ns.sizes.split(",") if s.strip()]:
+            capture, info = _ensure_capture(ns.workdir, size, fmt, ns.seed)
+            for tool in tools:
+                runs = [_run_one(ns.workdir, config, tool, capture) for _ in range(max(1, ns.repeat))]
+                ok = [r for r in runs if not r.get("error")]
+                best = min(ok, key=lambda r: r["wall_s"]) if ok else runs[-1]
+                row = {"tool": tool, "size": size, "format": fmt, "capture_bytes": info["bytes"], "packets": info["packets"], **best}
+                results.append(row)
+                status = f"{row['wall_s']:.3f}s spawns={row['tshark_spawns']}" if row.get("wall_s") is not None else ""
+                print(f"{tool:28} {size:>6} {fmt:>6} {status} {row.get('error') or ''}", file=sys.stderr)
+
+    doc = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "tshark_version": _tshark_version(),
+            "repeat": ns.repeat,
+            "seed": ns.seed,
+        },
+        "results": results,
+    }
+    if ns.save:
+        BASELINE_DIR.mkdir(parents=True, exist_ok=True)
+        out = BASELINE_DIR / f"{ns.save}.json"
+        out.write_text(json.dumps(doc, indent=2), encoding="utf-8")
+        print(f"saved {out}", file=sys.stderr)
+    if ns.compare:
+        return compare(results, ns.compare, ns.threshold)
+    if not ns.save:
+        print(json.dumps(doc, indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
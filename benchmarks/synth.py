@@ -0,0 +1,388 @@
+"""Synthetic capture generator (pure Python, no dependencies).
+
+Writes pcap or pcapng files with a configurable mix of:
+- SIP over UDP/5060 (INVITE dialogs with Call-ID)
+- Diameter over TCP/3868 (Gx CCR/CCA with Session-Id)
+- HTTP2 SBI over TCP/7777 (HPACK literal headers + JSON bodies; matches the default
+  `tcp.port==7777,http2` decode-as)
+- GTP-U over UDP/2152 (bulk user plane with inner IPv4 UDP/TCP payloads)
+
+Usage:
+    python benchmarks/synth.py OUT.pcap --size 50M [--format pcapng] [--seed 1]
+        [--mix sip=1,diameter=1,http2=1,gtpu=4]
+
+Frame 1 is always a SIP INVITE so benchmarks can use it as a follow anchor.
+"""
+
+from __future__ import annotations
+
+import argparse
+from dataclasses import dataclass, field
+import json
+from pathlib import Path
+import random
+import struct
+from typing import BinaryIO, Iterator
+
+
+START_EPOCH_NS = 1_700_000_000_000_000_000
+LINKTYPE_ETHERNET = 1
+
+
+def parse_size(s: str) -> int:
+    v = s.strip().upper()
+    mult = 1
+    for suffix, m in (("G", 1 << 30), ("M", 1 << 20), ("K", 1 << 10)):
+        if v.endswith(suffix):
+            v, mult = v[:-1], m
+            break
+    return int(float(v) * mult)
+
+
+class PcapWriter:
+    def __init__(self, f: BinaryIO) -> None:
+        self.f = f
+        f.write(struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, LINKTYPE_ETHERNET))
+
+    def write(self, ts_ns: int, data: bytes) -> int:
+        sec, usec = divmod(ts_ns // 1000, 1_000_000)
+        self.f.write(struct.pack("<IIII", sec, usec, len(data), len(data)))
+        self.f.write(data)
+        return 16 + len(data)
+
+
+class PcapngWriter:
+    def __init__(self, f: BinaryIO) -> None:
+        self.f = f
+        shb_body = struct.pack("<IHHq", 0x1A2B3C4D, 1, 0, -1)
+        self._block(0x0A0D0D0A, shb_body)
+        # if_tsresol = 9 (nanoseconds), then opt_endofopt.
+        opts = struct.pack("<HHB3x", 9, 1, 9) + struct.pack("<HH", 0, 0)
+        self._block(0x00000001, struct.pack("<HHI", LINKTYPE_ETHERNET, 0, 65535) + opts)
+
+    def _block(self, block_type: int, body: bytes) -> int:
+        total = 12 + len(body)
+        self.f.write(struct.pack("<II", block_type, total))
+        self.f.write(body)
+        self.f.write(struct.pack("<I", total))
+        return total
+
+    def write(self, ts_ns: int, data: bytes) -> int:
+        pad = b"\x00" * (-len(data) % 4)
+        body = struct.pack("<IIIII", 0, ts_ns >> 32, ts_ns & 0xFFFFFFFF, len(data), len(data)) + data + pad
+        return self._block(0x00000006, body)
+
+
+def _ip_checksum(hdr: bytes) -> int:
+    s = sum(struct.unpack(f"!{len(hdr) // 2}H", hdr))
+    while s >> 16:
+        s = (s & 0xFFFF) + (s >> 16)
+    return ~s & 0xFFFF
+
+
+def ipv4(src: str, dst: str, proto: int, payload: bytes, ident: int = 0) -> bytes:
+    total = 20 + len(payload)
+    hdr = struct.pack(
+        "!BBHHHBBH4s4s",
+        0x45,
+        0,
+        total,
+        ident & 0xFFFF,
+        0x4000,
+        64,
+        proto,
+        0,
+        bytes(int(x) for x in src.split(".")),
+        bytes(int(x) for x in dst.split(".")),
+    )
+    csum = _ip_checksum(hdr)
+    return hdr[:10] + struct.pack("!H", csum) + hdr[12:] + payload
+
+
+def udp(sport: int, dport: int, payload: bytes) -> bytes:
+    return struct.pack("!HHHH", sport, dport, 8 + len(payload), 0) + payload
+
+
+def tcp(sport: int, dport: int, seq: int, ack: int, flags: int, payload: bytes) -> bytes:
+    return struct.pack("!HHIIBBHHH", sport, dport, seq & 0xFFFFFFFF, ack & 0xFFFFFFFF, 5 << 4, flags, 65535, 0, 0) + payload
+
+
+def ether(payload: bytes, src: bytes = b"\x02\x00\x00\x00\x00\x01", dst: bytes = b"\x02\x00\x00\x00\x00\x02") -> bytes:
+    return dst + src + b"\x08\x00" + payload
+
+
+TCP_FIN, TCP_SYN, TCP_PSH_ACK, TCP_ACK = 0x01, 0x02, 0x18, 0x10
+
+
+@dataclass
+class TcpConn:
+    client: str
+    server: str
+    cport: int
+    sport: int
+    cseq: int
+    sseq: int
+    opened: bool = False
+
+    def segment(self, from_client: bool, payload: bytes, flags: int = TCP_PSH_ACK) -> bytes:
+        if from_client:
+            seg = tcp(self.cport, self.sport, self.cseq, self.sseq, flags, payload)
+            self.cseq += len(payload) + (1 if flags & (TCP_SYN | TCP_FIN) else 0)
+            return ether(ipv4(self.client, self.server, 6, seg))
+        seg = tcp(self.sport, self.cport, self.sseq, self.cseq, flags, payload)
+        self.sseq += len(payload) + (1 if flags & (TCP_SYN | TCP_FIN) else 0)
+        return ether(ipv4(self.server, self.client, 6, seg))
+
+    def handshake(self) -> list[bytes]:
+        self.opened = True
+        return [
+            self.segment(True, b"", TCP_SYN),
+            self.segment(False, b"", TCP_SYN | TCP_ACK),
+            self.segment(True, b"", TCP_ACK),
+        ]
+
+
+def _sip(method_or_status: str, call_id: str, cseq: str, branch: str) -> bytes:
+    if method_or_status[0].isdigit():
+        first = f"SIP/2.0 {method_or_status}"
+    else:
+        first = f"{method_or_status} sip:+8613800000000@ims.example.net SIP/2.0"
+    body = ""
+    if method_or_status in ("INVITE", "200 OK") and cseq.endswith("INVITE"):
+        body = "v=0\r\no=- 0 0 IN IP4 10.10.0.1\r\ns=-\r\nc=IN IP4 10.10.0.1\r\nt=0 0\r\nm=audio 40000 RTP/AVP 0\r\n"
+    lines = [
+        first,
+        f"Via: SIP/2.0/UDP 10.10.0.1:5060;branch=z9hG4bK{branch}",
+        "From: <sip:+8613900000000@ims.example.net>;tag=a1",
+        "To: <sip:+8613800000000@ims.example.net>",
+        f"Call-ID: {call_id}",
+        f"CSeq: {cseq}",
+        "Max-Forwards: 70",
+        "Content-Type: application/sdp" if body else "",
+        f"Content-Length: {len(body)}",
+    ]
+    return ("\r\n".join(x for x in lines if x) + "\r\n\r\n" + body).encode()
+
+
+def _avp(code: int, data: bytes, flags: int = 0x40, vendor: int = 0) -> bytes:
+    hdr_len = 12 if vendor else 8
+    length = hdr_len + len(data)
+    out = struct.pack("!IB", code, flags | (0x80 if vendor else 0)) + length.to_bytes(3, "big")
+    if vendor:
+        out += struct.pack("!I", vendor)
+    return out + data + b"\x00" * (-len(data) % 4)
+
+
+def _diameter(request: bool, cmd: int, app: int, hbh: int, avps: list[bytes]) -> bytes:
+    body = b"".join(avps)
+    length = 20 + len(body)
+    return (
+        bytes([1])
+        + length.to_bytes(3, "big")
+        + bytes([0xC0 if request else 0x40])
+        + cmd.to_bytes(3, "big")
+        + struct.pack("!III", app, hbh, hbh)
+        + body
+    )
+
+
+def _hpack_int(value: int, prefix_bits: int, first: int) -> bytes:
+    limit = (1 << prefix_bits) - 1
+    if value < limit:
+        return bytes([first | value])
+    out = bytearray([first | limit])
+    value -= limit
+    while value >= 128:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+    return bytes(out)
+
+
+def _hpack_str(s: str) -> bytes:
+    b = s.encode()
+    return _hpack_int(len(b), 7, 0) + b
+
+
+def _hpack_literal(index: int, value: str) -> bytes:
+    # Literal header field without indexing, indexed name.
+    return _hpack_int(index, 4, 0) + _hpack_str(value)
+
+
+def _hpack_literal_new(name: str, value: str) -> bytes:
+    return b"\x00" + _hpack_str(name) + _hpack_str(value)
+
+
+def _h2_frame(ftype: int, flags: int, stream: int, payload: bytes) -> bytes:
+    return len(payload).to_bytes(3, "big") + bytes([ftype, flags]) + struct.pack("!I", stream & 0x7FFFFFFF) + payload
+
+
+_SBI_PATHS = (
+    "/nsmf-pdusession/v1/sm-contexts",
+    "/npcf-smpolicycontrol/v1/sm-policies",
+    "/nudm-sdm/v2/imsi-460001234567890/am-data",
+    "/namf-comm/v1/ue-contexts/imsi-460001234567890/n1-n2-messages",
+)
+
+
+@dataclass
+class Generator:
+    rng: random.Random
+    mix: dict[str, float]
+    ts_ns: int = START_EPOCH_NS
+    seq: int = 0
+    calls: int = 0
+    diameter_conn: TcpConn = field(default_factory=lambda: TcpConn("10.20.0.1", "10.20.0.2", 40001, 3868, 1000, 9000))
+    h2_conns: list[TcpConn] = field(default_factory=list)
+    h2_stream: dict[int, int] = field(default_factory=dict)
+
+    def _tick(self, max_us: int = 2000) -> int:
+        self.ts_ns += self.rng.randint(1, max_us) * 1000
+        return self.ts_ns
+
+    def sip_dialog(self) -> Iterator[bytes]:
+        self.calls += 1
+        call_id = f"call-{self.calls}-{self.rng.getrandbits(32):08x}@ims.example.net"
+        ue, pcscf = "10.10.0.1", "10.10.0.2"
+        steps = [
+            (True, "INVITE", "1 INVITE"),
+            (False, "100 Trying", "1 INVITE"),
+            (False, "180 Ringing", "1 INVITE"),
+            (False, "200 OK", "1 INVITE"),
+            (True, "ACK", "1 ACK"),
+            (True, "BYE", "2 BYE"),
+            (False, "200 OK", "2 BYE"),
+        ]
+        for i, (from_ue, what, cseq) in enumerate(steps):
+            msg = _sip(what, call_id, cseq, f"{self.calls:x}{i}")
+            src, dst = (ue, pcscf) if from_ue else (pcscf, ue)
+            yield ether(ipv4(src, dst, 17, udp(5060, 5060, msg)))
+
+    def diameter_session(self) -> Iterator[bytes]:
+        conn = self.diameter_conn
+        if not conn.opened:
+            yield from conn.handshake()
+        sid = f"pcef.example.net;{self.rng.getrandbits(32)};{self.calls}"
+        for req_type, req_num in ((1, 0), (2, 1), (3, 2)):
+            hbh = self.rng.getrandbits(32)
+            common = [
+                _avp(263, sid.encode()),
+                _avp(264, b"pcef.example.net"),
+                _avp(296, b"example.net"),
+                _avp(258, struct.pack("!I", 16777238)),
+                _avp(416, struct.pack("!I", req_type)),
+                _avp(415, struct.pack("!I", req_num)),
+            ]
+            ccr = _diameter(True, 272, 16777238, hbh, [*common, _avp(283, b"example.net")])
+            cca = _diameter(False, 272, 16777238, hbh, [*common, _avp(268, struct.pack("!I", 2001))])
+            yield conn.segment(True, ccr)
+            yield conn.segment(False, cca)
+
+    def sbi_exchange(self) -> Iterator[bytes]:
+        if len(self.h2_conns) < 4:
+            conn = TcpConn("10.30.0.1", "10.30.0.2", 50000 + len(self.h2_conns), 7777, 5000, 70000)
+            self.h2_conns.append(conn)
+            yield from conn.handshake()
+            preface = b"PRI * HTTP/2.0\r\n\r\nSM\r\n\r\n" + _h2_frame(4, 0, 0, b"")
+            yield conn.segment(True, preface)
+            yield conn.segment(False, _h2_frame(4, 0, 0, b"") + _h2_frame(4, 1, 0, b""))
+            yield conn.segment(True, _h2_frame(4, 1, 0, b""))
+        idx = self.rng.randrange(len(self.h2_conns))
+        conn = self.h2_conns[idx]
+        stream = self.h2_stream.get(idx, -1) + 2
+        self.h2_stream[idx] = stream
+        path = self.rng.choice(_SBI_PATHS)
+        body = json.dumps(
+            {
+                "supi": "imsi-460001234567890",
+                "pduSessionId": self.rng.randint(1, 15),
+                "dnn": "internet",
+                "sNssai": {"sst": 1, "sd": "000001"},
+                "servingNetwork": {"mcc": "460", "mnc": "00"},
+            }
+        ).encode()
+        req_headers = (
+            b"\x83\x86"
+            + _hpack_literal(4, path)
+            + _hpack_literal(1, "10.30.0.2:7777")
+            + _hpack_literal(31, "application/json")
+            + _hpack_literal_new("3gpp-sbi-correlation-info", f"imsi-460001234567890-{stream}")
+        )
+        yield conn.segment(True, _h2_frame(1, 0x4, stream, req_headers) + _h2_frame(0, 0x1, stream, body))
+        resp_body = json.dumps({"status": "ok", "stream": stream}).encode()
+        resp_headers = _hpack_literal(8, "201") + _hpack_literal(31, "application/json")
+        yield conn.segment(False, _h2_frame(1, 0x4, stream, resp_headers) + _h2_frame(0, 0x1, stream, resp_body))
+
+    def gtpu_burst(self) -> Iterator[bytes]:
+        teid = self.rng.randint(1, 0xFFFF)
+        ue = f"10.45.{self.rng.randint(0, 255)}.{self.rng.randint(1, 254)}"
+        for _ in range(self.rng.randint(10, 40)):
+            size = self.rng.choice((64, 200, 576, 1200, 1350))
+            payload = self.rng.randbytes(size)
+            if self.rng.random() < 0.5:
+                inner = ipv4(ue, "8.8.8.8", 17, udp(40000, 443, payload))
+            else:
+                self.seq += size
+                inner = ipv4(ue, "93.184.216.34", 6, tcp(40001, 443, self.seq, 1, TCP_PSH_ACK, payload))
+            gtp = struct.pack("!BBHI", 0x30, 0xFF, len(inner), teid) + inner
+            yield ether(ipv4("10.40.0.1", "10.40.0.2", 17, udp(2152, 2152, gtp)))
+
+    def transactions(self) -> Iterator[list[bytes]]:
+        yield list(self.sip_dialog())
+        kinds = [k for k, w in self.mix.items() if w > 0]
+        weights = [self.mix[k] for k in kinds]
+        producers = {
+            "sip": self.sip_dialog,
+            "diameter": self.diameter_session,
+            "http2": self.sbi_exchange,
+            "gtpu": self.gtpu_burst,
+        }
+        while True:
+            yield list(producers[self.rng.choices(kinds, weights)[0]]())
+
+
+def parse_mix(s: str) -> dict[str, float]:
+    mix = {"sip": 1.0, "diameter": 1.0, "http2": 1.0, "gtpu": 4.0}
+    for part in (s or "").split(","):
+        if not part.strip():
+            continue
+        k, _, v = part.partition("=")
+        k = k.strip().lower()
+        if k not in mix:
+            raise SystemExit(f"unknown traffic kind in --mix: {k}")
+        mix[k] = float(v or 0)
+    return mix
+
+
+def generate(out: Path, *, size: int, fmt: str = "pcap", seed: int = 1, mix: str = "") -> dict[str, int]:
+    gen = Generator(rng=random.Random(seed), mix=parse_mix(mix))
+    packets = 0
+    written = 0
+    with out.open("wb") as f:
+        writer = PcapngWriter(f) if fmt == "pcapng" else PcapWriter(f)
+        written = f.tell()
+        for tx in gen.transactions():
+            for pkt in tx:
+                written += writer.write(gen._tick(), pkt)
+                packets += 1
+            if written >= size:
+                break
+    return {"bytes": written, "packets": packets}
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("out", type=Path)
+    ap.add_argument("--size", default="10M")
+    ap.add_argument("--format", choices=("pcap", "pcapng"), default="")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--mix", default="")
+    ns = ap.parse_args()
+    fmt = ns.format or ("pcapng" if ns.out.suffix == ".pcapng" else "pcap")
+    res = generate(ns.out, size=parse_size(ns.size), fmt=fmt, seed=ns.seed, mix=ns.mix)
+    print(json.dumps({"path": str(ns.out), "format": fmt, **res}))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -7,6 +7,10 @@ def _main() -> None:
         from .doctor import run_doctor
 
         raise SystemExit(run_doctor())
+    if argv and argv[0] in ("http", "--http"):
+        from .daemon import run_http
+
+        raise SystemExit(run_http(argv[1] if len(argv) > 1 else None))
 
     from .server import main
 
@@ -0,0 +1,293 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import glob
+import heapq
+from pathlib import Path
+import threading
+from typing import Any, Optional
+
+from . import metrics
+from .config import Config
+from .errors import PcapMcpError
+from .identity import capture_identity
+from .paths import _is_relative_to
+from .pcapfile import detect_format, first_last_timestamps
+from .timeindex import filter_allows_slicing, slice_for_window
+from .timewin import and_filters, time_window_filter
+from .tshark_tools import timeline
+
+
+MAX_CAPTURE_SET_MEMBERS = 2000
+# Least recently used member infos are dropped beyond this many.
+MAX_CACHED_MEMBERS = 20000
+
+
+@dataclass(frozen=True)
+class MemberInfo:
+    path: Path
+    format: str
+    size: int
+    mtime_ns: int
+    first_ts: Optional[float]
+    last_ts: Optional[float]
+    packet_count: int
+
+    def overlaps(self, time_from: Optional[float], time_to: Optional[float]) -> bool:
+        if self.first_ts is None or self.last_ts is None:
+            return False
+        if time_from is not None and self.last_ts < time_from:
+            return False
+        if time_to is not None and self.first_ts > time_to:
+            return False
+        return True
+
+
+@dataclass(frozen=True)
+class CaptureSet:
+    spec: str
+    members: tuple[MemberInfo, ...]
+    frame_bases: tuple[int, ...]
+
+    @property
+    def packet_count(self) -> int:
+        return sum(m.packet_count for m in self.members)
+
+    def select(self, time_from: Optional[float], time_to: Optional[float]) -> list[int]:
+        return [i for i, m in enumerate(self.members) if m.overlaps(time_from, time_to)]
+
+
+_member_cache: OrderedDict[str, MemberInfo] = OrderedDict()
+_member_lock = threading.Lock()
+
+
+def _has_glob(s: str) -> bool:
+    return any(ch in s for ch in "*?[")
+
+
+def resolve_capture_set_paths(cfg: Config, spec: str) -> list[Path]:
+    raw_s = (spec or "").strip()
+    if not raw_s:
+        raise PcapMcpError("INVALID_ARGUMENT", "capture_set is empty")
+
+    raw = Path(raw_s).expanduser()
+    allow_any_abs = bool(cfg.allow_any_pcap_path) and raw.is_absolute()
+    patterns: list[Path] = [raw] if raw.is_absolute() else [Path.cwd() / raw, *(d / raw for d in cfg.allowed_pcap_dirs)]
+
+    candidates: list[Path] = []
+    for pat in patterns:
+        if _has_glob(raw_s):
+            candidates.extend(Path(x) for x in sorted(glob.glob(str(pat))))
+        elif pat.is_dir():
+            candidates.extend(sorted(pat.iterdir()))
+
+    found: dict[str, Path] = {}
+    for c in candidates:
+        c = c.resolve()
+        if str(c) in found or not c.is_file():
+            continue
+        if not allow_any_abs and not any(_is_relative_to(c, d) for d in cfg.allowed_pcap_dirs):
+            continue
+        if not detect_format(c):
+            continue
+        found[str(c)] = c
+        if len(found) > MAX_CAPTURE_SET_MEMBERS:
+            raise PcapMcpError(
+                "INVALID_ARGUMENT",
+                "too many captures in capture_set",
+                {"capture_set": raw_s, "max": MAX_CAPTURE_SET_MEMBERS},
+            )
+
+    if not found:
+        raise PcapMcpError(
+            "FILE_NOT_FOUND",
+            "no pcap files matched capture_set",
+            {"capture_set": raw_s, "allowed_pcap_dirs": [str(d) for d in cfg.allowed_pcap_dirs]},
+        )
+    return list(found.values())
+
+
+def index_member(p: Path) -> MemberInfo:
+    ident = capture_identity(p)
+    with _member_lock:
+        cached = _member_cache.get(ident.key)
+        if cached is not None:
+            _member_cache.move_to_end(ident.key)
+    metrics.cache_event("capture_set_member", cached is not None and cached.path == p)
+    if cached is not None and cached.path == p:
+        return cached
+
+    first, last, count = first_last_timestamps(p)
+    info = MemberInfo(
+        path=p,
+        format=detect_format(p),
+        size=ident.size,
+        mtime_ns=ident.mtime_ns,
+        first_ts=first,
+        last_ts=last,
+        packet_count=count,
+    )
+    with _member_lock:
+        _member_cache[ident.key] = info
+        _member_cache.move_to_end(ident.key)
+        while len(_member_cache) > MAX_CACHED_MEMBERS:
+            _member_cache.popitem(last=False)
+    return info
+
+
+def load_capture_set(cfg: Config, spec: str) -> CaptureSet:
+    paths = resolve_capture_set_paths(cfg, spec)
+    workers = max(1, min(int(cfg.capture_set_workers), len(paths)))
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        members = list(ex.map(metrics.queued("capture_set", index_member), paths))
+
+    members.sort(key=lambda m: (m.first_ts is None, m.first_ts or 0.0, str(m.path)))
+    bases: list[int] = []
+    base = 0
+    for m in members:
+        bases.append(base)
+        base += m.packet_count
+    return CaptureSet(spec=str(spec), members=tuple(members), frame_bases=tuple(bases))
+
+
+def member_summary(m: MemberInfo, base: int) -> dict[str, Any]:
+    return {
+        "pcap_path": str(m.path),
+        "format": m.format,
+        "size_bytes": m.size,
+        "packet_count": m.packet_count,
+        "first_frame": base + 1 if m.packet_count else None,
+        "last_frame": base + m.packet_count if m.packet_count else None,
+        "time_start_epoch": m.first_ts,
+        "time_end_epoch": m.last_ts,
+    }
+
+
+def _member_rows(
+    cfg: Config,
+    *,
+    member: MemberInfo,
+    frame_base: int,
+    display_filter: str,
+    decode_as: Optional[list[str]],
+    preferences: Optional[list[str]],
+    protocols: Optional[list[str]],
+    fields: list[str],
+    limit: int,
+    time_from: Optional[float],
+    time_to: Optional[float],
+) -> tuple[list[dict[str, Any]], list[str]]:
+    query_fields = ["frame.number", "frame.time_epoch", *[f for f in fields if f not in ("frame.number", "frame.time_epoch")]]
+
+    capture_slice = None
+    if (time_from is not None or time_to is not None) and filter_allows_slicing(display_filter, query_fields):
+        capture_slice = slice_for_window(cfg, member.path, time_from, time_to)
+    if capture_slice is None:
+        display_filter = and_filters(display_filter, time_window_filter(time_from, time_to))
+
+    res = timeline(
+        cfg,
+        p=member.path,
+        display_filter=display_filter,
+        decode_as=decode_as,
+        preferences=preferences,
+        protocols=protocols,
+        fields=query_fields,
+        limit=limit,
+        offset=0,
+        capture_slice=capture_slice,
+    )
+
+    rows: list[dict[str, Any]] = []
+    for r in res.rows:
+        try:
+            local = int(str(r.get("frame.number") or "0"))
+            ts = float(str(r.get("frame.time_epoch") or "0"))
+        except ValueError:
+            continue
+        out: dict[str, Any] = {
+            "frame_number": frame_base + local,
+            "capture": str(member.path),
+            "capture_frame_number": local,
+            "time_epoch": ts,
+        }
+        for f in fields:
+            out[f] = r.get(f, "")
+        if "frame.number" in fields:
+            out["frame.number"] = str(frame_base + local)
+        rows.append(out)
+    return rows, list(res.warnings)
+
+
+def set_timeline(
+    cfg: Config,
+    *,
+    cs: CaptureSet,
+    display_filter: str,
+    decode_as: Optional[list[str]] = None,
+    preferences: Optional[list[str]] = None,
+    protocols: Optional[list[str]] = None,
+    fields: list[str],
+    limit: int,
+    offset: int,
+    time_from: Optional[float] = None,
+    time_to: Optional[float] = None,
+) -> dict[str, Any]:
+    if limit < 0 or offset < 0:
+        raise PcapMcpError("INVALID_ARGUMENT", "limit/offset must be non-negative")
+    if limit + offset > cfg.max_timeline_rows:
+        raise PcapMcpError(
+            "INVALID_ARGUMENT",
+            "limit + offset exceeds max_timeline_rows",
+            {"limit": limit, "offset": offset, "max_timeline_rows": cfg.max_timeline_rows},
+        )
+
+    selected = cs.select(time_from, time_to)
+
+    per_member: list[list[dict[str, Any]]] = []
+    warnings: list[str] = []
+    if selected and limit > 0:
+        workers = max(1, min(int(cfg.capture_set_workers), len(selected)))
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            futs = [
+                ex.submit(
+                    metrics.queued("capture_set", _member_rows),
+                    cfg,
+                    member=cs.members[i],
+                    frame_base=cs.frame_bases[i],
+                    display_filter=display_filter,
+                    decode_as=decode_as,
+                    preferences=preferences,
+                    protocols=protocols,
+                    fields=fields,
+                    limit=limit + offset,
+                    time_from=time_from,
+                    time_to=time_to,
+                )
+                for i in selected
+            ]
+            for fut in futs:
+                rows, w = fut.result()
+                per_member.append(rows)
+                warnings.extend(x for x in w if x not in warnings)
+
+    merged = heapq.merge(*per_member, key=lambda r: (r["time_epoch"], r["frame_number"]))
+    rows: list[dict[str, Any]] = []
+    for i, r in enumerate(merged):
+        if i < offset:
+            continue
+        rows.append(r)
+        if len(rows) >= limit:
+            break
+
+    return {
+        "display_filter": display_filter,
+        "time_from_epoch": time_from,
+        "time_to_epoch": time_to,
+        "members_total": len(cs.members),
+        "members_queried": [str(cs.members[i].path) for i in selected],
+        "rows": rows,
+        "warnings": warnings,
+    }
@@ -0,0 +1,241 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+import os
+from pathlib import Path
+import re
+import threading
+import time
+from typing import Any, Optional
+
+from .config import Config
+from .identity import metadata_store
+from .pcapfile import detect_format
+
+
+MAX_CATALOG_DIRS = 4096
+MAX_CATALOG_DEPTH = 6
+MAX_CATALOG_FILES = 200000
+# A lookup miss triggers at most one incremental rescan per interval.
+MISS_REFRESH_INTERVAL_S = 5.0
+# Files are cataloged by name only; the format is sniffed when an entry is looked up.
+_CAPTURE_NAME = re.compile(r"\.(pcap|pcapng|cap|ntar|dmp)\d*$", re.IGNORECASE)
+_SKIP_DIRS = frozenset({"__pycache__", "node_modules", "site-packages"})
+
+
+@dataclass(frozen=True)
+class CatalogEntry:
+    path: Path
+    root: Path
+    rel: str
+
+
+@dataclass
+class _DirState:
+    mtime_ns: int
+    files: tuple[CatalogEntry, ...]
+    subdirs: tuple[str, ...]
+
+
+@dataclass
+class Catalog:
+    roots: tuple[Path, ...]
+    dirs: dict[str, _DirState] = field(default_factory=dict)
+    by_path: dict[str, CatalogEntry] = field(default_factory=dict)
+    by_rel: dict[str, list[CatalogEntry]] = field(default_factory=dict)
+    scans: int = 0
+    dirs_rescanned: int = 0
+    truncated: bool = False
+    last_refresh: float = 0.0
+    # scan_lock serialises walks; lock only guards publishing their result, so lookups never
+    # wait for a walk in progress.
+    scan_lock: threading.Lock = field(default_factory=threading.Lock)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def refresh(self, *, wait: bool = True) -> int:
+        # Walks the known directory tree and re-lists only directories whose mtime moved;
+        # unchanged directories reuse their previous listing. Returns 0 without walking when
+        # wait=False and another walk is already running.
+        if not self.scan_lock.acquire(blocking=wait):
+            return 0
+        try:
+            with self.lock:
+                prev = self.dirs
+            dirs: dict[str, _DirState] = {}
+            rescanned = 0
+            truncated = False
+            for root in self.roots:
+                stack = [(root, 0)]
+                while stack:
+                    if len(dirs) >= MAX_CATALOG_DIRS:
+                        truncated = True
+                        break
+                    d, depth = stack.pop()
+                    key = str(d)
+                    if key in dirs:
+                        continue
+                    try:
+                        mtime_ns = int(d.stat().st_mtime_ns)
+                    except OSError:
+                        continue
+                    state = prev.get(key)
+                    if state is None or state.mtime_ns != mtime_ns:
+                        state = self._scan_dir(root, d, mtime_ns)
+                        rescanned += 1
+                    dirs[key] = state
+                    if depth >= MAX_CATALOG_DEPTH:
+                        truncated = truncated or bool(state.subdirs)
+                        continue
+                    stack.extend((d / name, depth + 1) for name in reversed(state.subdirs))
+
+            changed = rescanned or len(dirs) != len(prev) or not self.scans
+            by_path, by_rel = _build_lookup(dirs) if changed else (self.by_path, self.by_rel)
+            with self.lock:
+                self.dirs = dirs
+                self.by_path = by_path
+                self.by_rel = by_rel
+                self.truncated = truncated or len(by_path) >= MAX_CATALOG_FILES
+                self.scans += 1
+                self.dirs_rescanned += rescanned
+                self.last_refresh = time.monotonic()
+            return rescanned
+        finally:
+            self.scan_lock.release()
+
+    def refresh_on_miss(self) -> int:
+        if time.monotonic() - self.last_refresh < MISS_REFRESH_INTERVAL_S:
+            return 0
+        return self.refresh(wait=False)
+
+    def _scan_dir(self, root: Path, d: Path, mtime_ns: int) -> _DirState:
+        files: list[CatalogEntry] = []
+        subdirs: list[str] = []
+        try:
+            with os.scandir(d) as it:
+                items = sorted(it, key=lambda e: e.name)
+        except OSError:
+            return _DirState(mtime_ns=mtime_ns, files=(), subdirs=())
+        for e in items:
+            if e.name.startswith("."):
+                continue
+            try:
+                if e.is_dir(follow_symlinks=False):
+                    if e.name not in _SKIP_DIRS:
+                        subdirs.append(e.name)
+                    continue
+                if not _CAPTURE_NAME.search(e.name) or not e.is_file():
+                    continue
+            except OSError:
+                continue
+            p = Path(e.path)
+            if e.is_symlink():
+                # A link is only cataloged when its target stays inside an allowed root.
+                p = p.resolve()
+                if not any(_is_under(p, r) for r in self.roots):
+                    continue
+            files.append(CatalogEntry(path=p, root=root, rel=os.path.relpath(e.path, root)))
+        return _DirState(mtime_ns=mtime_ns, files=tuple(files), subdirs=tuple(subdirs))
+
+    def lookup(self, raw: str) -> list[Path]:
+        rel = os.path.normpath(raw)
+        if os.path.isabs(rel):
+            entry = self.by_path.get(rel)
+            found = [entry] if entry is not None else []
+        else:
+            found = self.by_rel.get(rel, [])
+        return [e.path for e in found if entry_format(e)]
+
+    def entries(self) -> list[CatalogEntry]:
+        return sorted(self.by_path.values(), key=lambda e: str(e.path))
+
+
+def _build_lookup(dirs: dict[str, _DirState]) -> tuple[dict[str, CatalogEntry], dict[str, list[CatalogEntry]]]:
+    by_path: dict[str, CatalogEntry] = {}
+    by_rel: dict[str, list[CatalogEntry]] = {}
+    for state in dirs.values():
+        for entry in state.files:
+            if len(by_path) >= MAX_CATALOG_FILES:
+                break
+            if str(entry.path) in by_path:
+                continue
+            by_path[str(entry.path)] = entry
+            by_rel.setdefault(entry.rel, []).append(entry)
+    return by_path, by_rel
+
+
+_formats: OrderedDict[str, tuple[int, int, str]] = OrderedDict()
+_formats_lock = threading.Lock()
+
+
+def entry_format(entry: CatalogEntry, st: Optional[os.stat_result] = None) -> str:
+    # Sniffed on demand and remembered per (size, mtime); "" for files that are not captures.
+    try:
+        st = st or entry.path.stat()
+    except OSError:
+        return ""
+    key = str(entry.path)
+    stamp = (int(st.st_size), int(st.st_mtime_ns))
+    with _formats_lock:
+        cached = _formats.get(key)
+        if cached is not None and cached[:2] == stamp:
+            _formats.move_to_end(key)
+            return cached[2]
+    fmt = detect_format(entry.path)
+    with _formats_lock:
+        _formats[key] = (*stamp, fmt)
+        _formats.move_to_end(key)
+        while len(_formats) > MAX_CATALOG_FILES:
+            _formats.popitem(last=False)
+    return fmt
+
+
+def _is_under(path: Path, base: Path) -> bool:
+    try:
+        path.relative_to(base)
+        return True
+    except ValueError:
+        return False
+
+
+_catalogs: dict[tuple[str, ...], Catalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def get_catalog(cfg: Config) -> Catalog:
+    key = tuple(str(d) for d in cfg.allowed_pcap_dirs)
+    with _catalogs_lock:
+        cat = _catalogs.get(key)
+        if cat is None:
+            cat = Catalog(roots=tuple(cfg.allowed_pcap_dirs))
+            _catalogs[key] = cat
+    if not cat.scans:
+        cat.refresh()
+    return cat
+
+
+def entry_summary(cfg: Config, entry: CatalogEntry) -> Optional[dict[str, Any]]:
+    try:
+        st = entry.path.stat()
+    except OSError:
+        return None
+    fmt = entry_format(entry, st)
+    if not fmt:
+        return None
+    meta = metadata_store(cfg).peek(st)
+    info = meta.get("capinfos") if isinstance(meta.get("capinfos"), dict) else {}
+    protocols = meta.get("has_protocols") if isinstance(meta.get("has_protocols"), dict) else None
+    return {
+        "pcap_path": str(entry.path),
+        "relative_path": entry.rel,
+        "allowed_dir": str(entry.root),
+        "format": fmt,
+        "size_bytes": int(st.st_size),
+        "mtime_ns": int(st.st_mtime_ns),
+        "metadata_cached": bool(info),
+        "packet_count": info.get("packet_count"),
+        "time_start": info.get("time_start"),
+        "time_end": info.get("time_end"),
+        "duration": info.get("duration"),
+        "protocols": sorted(k for k, v in protocols.items() if v) if protocols is not None else None,
+    }
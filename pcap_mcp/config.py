@@ -4,7 +4,46 @@ from dataclasses import dataclass
 from pathlib import Path
 import json
 import os
-from typing import Any
+from typing import Any, Optional
+
+
+# Lower layers a protocol-pruned profile always keeps enabled: link types (incl. LINKTYPE_RAW
+# and BSD loopback), common tunnels, then network/transport.
+BASE_PROTOCOLS = (
+    "frame",
+    "eth",
+    "ethertype",
+    "vlan",
+    "sll",
+    "raw",
+    "null",
+    "loop",
+    "gre",
+    "erspan",
+    "mpls",
+    "ip",
+    "ipv6",
+    "udp",
+    "tcp",
+    "sctp",
+)
+
+PROTOCOL_DEPENDENCIES: dict[str, tuple[str, ...]] = {
+    "nas-5gs": ("ngap", "e212"),
+    "ngap": ("sctp", "e212", "nr-rrc", "lte-rrc"),
+    "nas-eps": ("s1ap", "e212"),
+    "s1ap": ("sctp", "e212", "lte-rrc"),
+    "x2ap": ("sctp",),
+    "xnap": ("sctp",),
+    "f1ap": ("sctp",),
+    "diameter": ("sctp", "tcp"),
+    "http2": ("tcp", "tls"),
+    "json": ("http2",),
+    "sip": ("udp", "tcp", "sdp"),
+    "gtp": ("udp",),
+    "gtpv2": ("udp",),
+    "pfcp": ("udp",),
+}
 
 
 @dataclass(frozen=True)
@@ -12,6 +51,104 @@ class Profile:
     display_filter: str
     decode_as: tuple[str, ...]
     preferences: tuple[str, ...]
+    protocols: tuple[str, ...] = ()
+
+
+@dataclass(frozen=True)
+class ResourcePolicy:
+    name: str
+    nice: int = 0
+    ionice_class: str = ""
+    max_rss_mb: int = 0
+    max_address_space_mb: int = 0
+    max_cpu_s: int = 0
+    session_reset: int = 0
+
+
+# "interactive" is used for queries an agent waits on, "export" for file-writing jobs,
+# "prefetch" for speculative background work nobody is waiting on yet.
+DEFAULT_RESOURCE_POLICIES: dict[str, ResourcePolicy] = {
+    "interactive": ResourcePolicy(name="interactive", ionice_class="best-effort", max_rss_mb=4096),
+    "export": ResourcePolicy(name="export", nice=10, ionice_class="idle", max_rss_mb=8192),
+    "prefetch": ResourcePolicy(name="prefetch", nice=15, ionice_class="idle", max_rss_mb=2048),
+}
+
+
+@dataclass(frozen=True)
+class CompiledProfile:
+    name: str
+    display_filter: str
+    decode_as: tuple[str, ...]
+    preferences: tuple[str, ...]
+    protocols: tuple[str, ...]
+    argv: tuple[str, ...]
+
+    def compose_filter(self, display_filter: str) -> str:
+        user = (display_filter or "").strip()
+        if not self.display_filter:
+            return user
+        if not user:
+            return self.display_filter
+        return f"({self.display_filter}) && ({user})"
+
+
+def _dedupe(items: Any) -> tuple[str, ...]:
+    out: dict[str, None] = {}
+    for x in items:
+        s = (x or "").strip()
+        if s:
+            out.setdefault(s, None)
+    return tuple(out)
+
+
+def expand_protocols(protocols: tuple[str, ...], decode_as: Any = ()) -> tuple[str, ...]:
+    # Closure of the requested protocols, the decode-as targets and what they ride on.
+    out: dict[str, None] = dict.fromkeys(BASE_PROTOCOLS)
+    todo = [p.strip().lower() for p in protocols]
+    todo += [d.rsplit(",", 1)[-1].strip().lower() for d in decode_as if "," in d]
+    while todo:
+        p = todo.pop()
+        if not p or p in out:
+            continue
+        out[p] = None
+        todo.extend(PROTOCOL_DEPENDENCIES.get(p, ()))
+    return tuple(out)
+
+
+def dissector_argv(
+    decode_as: tuple[str, ...],
+    preferences: tuple[str, ...],
+    protocols: tuple[str, ...] = (),
+) -> tuple[str, ...]:
+    args: list[str] = []
+    if protocols:
+        args.append("--disable-all-protocols")
+        for p in protocols:
+            args += ["--enable-protocol", p]
+    for d in decode_as:
+        args += ["-d", d]
+    for pref in preferences:
+        args += ["-o", pref]
+    return tuple(args)
+
+
+def compile_profile(
+    name: str,
+    prof: Optional[Profile],
+    global_decode_as: tuple[str, ...],
+    global_preferences: tuple[str, ...],
+) -> CompiledProfile:
+    decode_as = _dedupe([*global_decode_as, *(prof.decode_as if prof else ())])
+    preferences = _dedupe([*global_preferences, *(prof.preferences if prof else ())])
+    protocols = expand_protocols(prof.protocols, decode_as) if prof and prof.protocols else ()
+    return CompiledProfile(
+        name=name,
+        display_filter=(prof.display_filter if prof else "").strip(),
+        decode_as=decode_as,
+        preferences=preferences,
+        protocols=protocols,
+        argv=dissector_argv(decode_as, preferences, protocols),
+    )
 
 
 @dataclass(frozen=True)
@@ -30,6 +167,22 @@ class Config:
     global_preferences: tuple[str, ...]
     profiles: dict[str, Profile]
     packet_list_columns: dict[str, tuple[tuple[str, str], ...]]
+    capture_set_workers: int
+    time_index_stride: int
+    metadata_dir: Path
+    compiled_profiles: dict[str, CompiledProfile]
+    resource_policies: dict[str, ResourcePolicy]
+    metrics_export: str
+    metrics_export_path: Optional[Path]
+    metrics_export_interval_s: float
+    profile_tools: tuple[str, ...]
+    detail_cache_mb: int
+    detail_prefetch_frames: int
+    http_listen: str
+    http_client_concurrency: int
+    http_queue_timeout_s: float
+    http_drain_timeout_s: float
+    warmup_recent_captures: int
 
 
 def load_config() -> Config:
@@ -85,13 +238,60 @@ def load_config() -> Config:
     max_timeline_rows = int(file_cfg.get("max_timeline_rows") or os.environ.get("PCAP_MCP_MAX_TIMELINE_ROWS", "5000"))
     max_detail_bytes = int(file_cfg.get("max_detail_bytes") or os.environ.get("PCAP_MCP_MAX_DETAIL_BYTES", "200000"))
     export_timeout_s = float(file_cfg.get("export_timeout_s") or os.environ.get("PCAP_MCP_EXPORT_TIMEOUT_S", "300"))
+    capture_set_workers = int(file_cfg.get("capture_set_workers") or os.environ.get("PCAP_MCP_CAPTURE_SET_WORKERS", "4"))
+    if capture_set_workers < 1:
+        capture_set_workers = 1
+    time_index_stride = int(file_cfg.get("time_index_stride") or os.environ.get("PCAP_MCP_TIME_INDEX_STRIDE", "1000"))
+    if time_index_stride < 1:
+        time_index_stride = 1
 
     output_dir_raw = str(os.environ.get("PCAP_MCP_OUTPUT_DIR") or file_cfg.get("output_dir") or "./pcap_mcp_outputs")
+    # Created by whatever writes there first (or by start-up warm-up), not while loading config.
     output_dir = _resolve_path(output_dir_raw)
-    try:
-        output_dir.mkdir(parents=True, exist_ok=True)
-    except Exception:
-        pass
+
+    metadata_dir_raw = str(os.environ.get("PCAP_MCP_METADATA_DIR") or file_cfg.get("metadata_dir") or "").strip()
+    metadata_dir = _resolve_path(metadata_dir_raw) if metadata_dir_raw else output_dir / ".metadata"
+
+    metrics_export = str(file_cfg.get("metrics_export") or os.environ.get("PCAP_MCP_METRICS_EXPORT", "")).strip().lower()
+    if metrics_export not in ("", "prometheus", "jsonl"):
+        raise RuntimeError(f"invalid metrics_export: {metrics_export} (expected prometheus or jsonl)")
+    metrics_export_path_raw = str(file_cfg.get("metrics_export_path") or os.environ.get("PCAP_MCP_METRICS_EXPORT_PATH", "")).strip()
+    if metrics_export_path_raw:
+        metrics_export_path: Optional[Path] = _resolve_path(metrics_export_path_raw)
+    elif metrics_export == "prometheus":
+        metrics_export_path = output_dir / "pcap_mcp.prom"
+    else:
+        # JSON lines go to stderr unless a file is configured.
+        metrics_export_path = None
+    metrics_export_interval_s = float(
+        file_cfg.get("metrics_export_interval_s") or os.environ.get("PCAP_MCP_METRICS_EXPORT_INTERVAL_S", "60")
+    )
+
+    profile_tools_raw = file_cfg.get("profile_tools")
+    if isinstance(profile_tools_raw, list):
+        profile_tools = tuple(str(x).strip() for x in profile_tools_raw if str(x).strip())
+    else:
+        env_profile_tools = (os.environ.get("PCAP_MCP_PROFILE_TOOLS") or "").strip()
+        profile_tools = tuple(s.strip() for s in env_profile_tools.split(",") if s.strip())
+
+    if "detail_cache_mb" in file_cfg:
+        detail_cache_mb = int(file_cfg.get("detail_cache_mb") or 0)
+    else:
+        detail_cache_mb = int(os.environ.get("PCAP_MCP_DETAIL_CACHE_MB", "64"))
+    if "detail_prefetch_frames" in file_cfg:
+        detail_prefetch_frames = int(file_cfg.get("detail_prefetch_frames") or 0)
+    else:
+        detail_prefetch_frames = int(os.environ.get("PCAP_MCP_DETAIL_PREFETCH_FRAMES", "5"))
+
+    http_listen = str(file_cfg.get("http_listen") or os.environ.get("PCAP_MCP_HTTP_LISTEN", "127.0.0.1:8765")).strip()
+    http_client_concurrency = int(file_cfg.get("http_client_concurrency") or os.environ.get("PCAP_MCP_HTTP_CLIENT_CONCURRENCY", "2"))
+    http_queue_timeout_s = float(file_cfg.get("http_queue_timeout_s") or os.environ.get("PCAP_MCP_HTTP_QUEUE_TIMEOUT_S", "120"))
+    http_drain_timeout_s = float(file_cfg.get("http_drain_timeout_s") or os.environ.get("PCAP_MCP_HTTP_DRAIN_TIMEOUT_S", "30"))
+
+    if "warmup_recent_captures" in file_cfg:
+        warmup_recent_captures = int(file_cfg.get("warmup_recent_captures") or 0)
+    else:
+        warmup_recent_captures = int(os.environ.get("PCAP_MCP_WARMUP_RECENT_CAPTURES", "5"))
 
     if "time_offset_hours" in file_cfg:
         time_offset_hours = int(file_cfg.get("time_offset_hours") or 0)
@@ -129,7 +329,12 @@ def load_config() -> Config:
                 prefs = tuple(str(x).strip() for x in pref_raw if str(x).strip())
             else:
                 prefs = ()
-            profiles[name.strip()] = Profile(display_filter=df, decode_as=da, preferences=prefs)
+            proto_raw = pv.get("protocols")
+            if isinstance(proto_raw, list):
+                protos = tuple(str(x).strip().lower() for x in proto_raw if str(x).strip())
+            else:
+                protos = ()
+            profiles[name.strip()] = Profile(display_filter=df, decode_as=da, preferences=prefs, protocols=protos)
 
     packet_list_columns: dict[str, tuple[tuple[str, str], ...]] = {}
     plc_raw = file_cfg.get("packet_list_columns")
@@ -153,6 +358,31 @@ def load_config() -> Config:
             if cols:
                 packet_list_columns[name.strip()] = tuple(cols)
 
+    resource_policies = dict(DEFAULT_RESOURCE_POLICIES)
+    rp_raw = file_cfg.get("resource_policies")
+    if isinstance(rp_raw, dict):
+        for name, rv in rp_raw.items():
+            if not isinstance(name, str) or not name.strip() or not isinstance(rv, dict):
+                continue
+            base = resource_policies.get(name.strip()) or ResourcePolicy(name=name.strip())
+            ionice_class = str(rv.get("ionice_class", base.ionice_class) or "").strip()
+            if ionice_class not in ("", "best-effort", "idle"):
+                raise RuntimeError(f"invalid ionice_class for resource policy {name}: {ionice_class}")
+            resource_policies[name.strip()] = ResourcePolicy(
+                name=name.strip(),
+                nice=int(rv.get("nice", base.nice) or 0),
+                ionice_class=ionice_class,
+                max_rss_mb=int(rv.get("max_rss_mb", base.max_rss_mb) or 0),
+                max_address_space_mb=int(rv.get("max_address_space_mb", base.max_address_space_mb) or 0),
+                max_cpu_s=int(rv.get("max_cpu_s", base.max_cpu_s) or 0),
+                session_reset=int(rv.get("session_reset", base.session_reset) or 0),
+            )
+
+    # "" is the no-profile case: only the global decode_as/preferences apply.
+    compiled_profiles = {"": compile_profile("", None, global_decode_as, global_preferences)}
+    for name, prof in profiles.items():
+        compiled_profiles[name] = compile_profile(name, prof, global_decode_as, global_preferences)
+
     return Config(
         allowed_pcap_dirs=allowed_dirs,
         allow_any_pcap_path=bool(allow_any_pcap_path),
@@ -168,4 +398,20 @@ def load_config() -> Config:
         global_preferences=global_preferences,
         profiles=profiles,
         packet_list_columns=packet_list_columns,
+        capture_set_workers=capture_set_workers,
+        time_index_stride=time_index_stride,
+        metadata_dir=metadata_dir,
+        compiled_profiles=compiled_profiles,
+        resource_policies=resource_policies,
+        metrics_export=metrics_export,
+        metrics_export_path=metrics_export_path,
+        metrics_export_interval_s=metrics_export_interval_s,
+        profile_tools=profile_tools,
+        detail_cache_mb=detail_cache_mb,
+        detail_prefetch_frames=detail_prefetch_frames,
+        http_listen=http_listen,
+        http_client_concurrency=http_client_concurrency,
+        http_queue_timeout_s=http_queue_timeout_s,
+        http_drain_timeout_s=http_drain_timeout_s,
+        warmup_recent_captures=warmup_recent_captures,
     )
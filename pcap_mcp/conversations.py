@@ -0,0 +1,185 @@
+from __future__ import annotations
+
+from pathlib import Path
+import re
+from typing import Any, Optional
+
+from .config import Config
+from .errors import PcapMcpError
+from .identity import cached_metadata
+from .proc import run_checked
+
+
+STAT_PROTOCOLS = ("ip", "ipv6", "tcp", "udp", "sctp")
+STAT_KINDS = ("conversations", "endpoints")
+SORT_KEYS = ("bytes", "packets", "duration", "bytes_per_s", "packets_per_s", "rel_start")
+
+# Tables are stored per capture in the metadata store; beyond this only the heaviest rows are kept.
+MAX_STORED_ROWS = 10000
+
+_SECTION_PROTOCOLS = {"IPv4": "ip", "IPv6": "ipv6", "TCP": "tcp", "UDP": "udp", "SCTP": "sctp"}
+_SECTION_RE = re.compile(r"^(IPv4|IPv6|TCP|UDP|SCTP) (Conversations|Endpoints)\s*$")
+_NUMBER_RE = re.compile(r"^-?[\d,]*\.?\d+$")
+# Newer tshark prints byte counts through format_size(), e.g. "9,876 bytes" or "12 kB".
+_UNITS = {
+    "bytes": 1,
+    "kB": 10**3,
+    "MB": 10**6,
+    "GB": 10**9,
+    "TB": 10**12,
+    "KiB": 2**10,
+    "MiB": 2**20,
+    "GiB": 2**30,
+    "TiB": 2**40,
+}
+
+
+def _values(tokens: list[str]) -> tuple[list[float], bool]:
+    # Numbers in column order; a unit token scales the number before it. The flag is set
+    # when a count was only printed rounded to a unit.
+    out: list[float] = []
+    approximate = False
+    for tok in tokens:
+        if _NUMBER_RE.match(tok):
+            out.append(float(tok.replace(",", "")))
+        elif tok in _UNITS and out:
+            out[-1] *= _UNITS[tok]
+            approximate = approximate or tok != "bytes"
+    return out, approximate
+
+
+def _split_port(addr: str) -> tuple[str, Optional[int]]:
+    host, sep, port = addr.rpartition(":")
+    if sep and port.isdigit():
+        return host, int(port)
+    return addr, None
+
+
+def _rate(value: float, duration: float) -> Optional[float]:
+    return round(value / duration, 3) if duration > 0 else None
+
+
+def _conversation(proto: str, line: str) -> Optional[dict[str, Any]]:
+    parts = line.split()
+    if len(parts) < 4 or parts[1] != "<->":
+        return None
+    vals, approximate = _values(parts[3:])
+    if len(vals) < 8:
+        return None
+    b_to_a_packets, b_to_a_bytes, a_to_b_packets, a_to_b_bytes, packets, nbytes, rel_start, duration = vals[:8]
+    row: dict[str, Any] = {"a": parts[0], "b": parts[2]}
+    if proto in ("tcp", "udp", "sctp"):
+        row["a"], row["a_port"] = _split_port(parts[0])
+        row["b"], row["b_port"] = _split_port(parts[2])
+    row.update(
+        {
+            "packets": int(packets),
+            "bytes": int(nbytes),
+            "a_to_b_packets": int(a_to_b_packets),
+            "a_to_b_bytes": int(a_to_b_bytes),
+            "b_to_a_packets": int(b_to_a_packets),
+            "b_to_a_bytes": int(b_to_a_bytes),
+            "rel_start": rel_start,
+            "duration": duration,
+            "bytes_per_s": _rate(nbytes, duration),
+            "packets_per_s": _rate(packets, duration),
+        }
+    )
+    if approximate:
+        row["bytes_approximate"] = True
+    return row
+
+
+def _endpoint(proto: str, line: str) -> Optional[dict[str, Any]]:
+    parts = line.split()
+    with_port = proto in ("tcp", "udp", "sctp")
+    head = 2 if with_port else 1
+    if len(parts) <= head or _NUMBER_RE.match(parts[0]):
+        return None
+    vals, approximate = _values(parts[head:])
+    if len(vals) < 6:
+        return None
+    packets, nbytes, tx_packets, tx_bytes, rx_packets, rx_bytes = vals[:6]
+    row: dict[str, Any] = {"address": parts[0]}
+    if with_port:
+        row["port"] = int(parts[1]) if parts[1].isdigit() else parts[1]
+    row.update(
+        {
+            "packets": int(packets),
+            "bytes": int(nbytes),
+            "tx_packets": int(tx_packets),
+            "tx_bytes": int(tx_bytes),
+            "rx_packets": int(rx_packets),
+            "rx_bytes": int(rx_bytes),
+        }
+    )
+    if approximate:
+        row["bytes_approximate"] = True
+    return row
+
+
+def parse_stats(text: str) -> dict[str, dict[str, list[dict[str, Any]]]]:
+    out: dict[str, dict[str, list[dict[str, Any]]]] = {k: {} for k in STAT_KINDS}
+    table: Optional[list[dict[str, Any]]] = None
+    kind = proto = ""
+    for line in text.splitlines():
+        m = _SECTION_RE.match(line.strip())
+        if m:
+            proto = _SECTION_PROTOCOLS[m.group(1)]
+            kind = m.group(2).lower()
+            table = out[kind].setdefault(proto, [])
+            continue
+        if table is None or not line.strip() or line.startswith(("=", "Filter:")) or "|" in line:
+            continue
+        row = _conversation(proto, line) if kind == "conversations" else _endpoint(proto, line)
+        if row is not None:
+            table.append(row)
+    return out
+
+
+def conversation_stats(cfg: Config, p: Path) -> dict[str, Any]:
+    # All conversation and endpoint tables in a single tshark pass.
+    args: list[str] = [cfg.tshark_path, "-n", "-q", "-r", str(p)]
+    for proto in STAT_PROTOCOLS:
+        args += ["-z", f"conv,{proto}", "-z", f"endpoints,{proto}"]
+    r = run_checked(args, timeout_s=cfg.export_timeout_s, policy=cfg.resource_policies.get("interactive"))
+    if r.returncode != 0:
+        raise PcapMcpError("INTERNAL_ERROR", "tshark conv/endpoints statistics failed", {"stderr": r.stderr.strip()})
+
+    tables = parse_stats(r.stdout)
+    out: dict[str, Any] = {"totals": {}}
+    for kind in STAT_KINDS:
+        out[kind] = {}
+        for proto in STAT_PROTOCOLS:
+            rows = sorted(tables[kind].get(proto, []), key=lambda row: row["bytes"], reverse=True)
+            out["totals"][f"{kind}.{proto}"] = len(rows)
+            out[kind][proto] = rows[:MAX_STORED_ROWS]
+    return out
+
+
+def cached_conversation_stats(cfg: Config, p: Path) -> dict[str, Any]:
+    return cached_metadata(cfg, p, "conversations", lambda: conversation_stats(cfg, p))
+
+
+def top_rows(
+    stats: dict[str, Any],
+    *,
+    kind: str,
+    protocols: list[str],
+    sort_by: str,
+    limit: int,
+    address: str = "",
+) -> dict[str, Any]:
+    needle = (address or "").strip()
+    out: dict[str, Any] = {}
+    for proto in protocols:
+        rows = stats.get(kind, {}).get(proto, [])
+        if needle:
+            fields = ("a", "b") if kind == "conversations" else ("address",)
+            rows = [row for row in rows if any(needle in str(row.get(f, "")) for f in fields)]
+        rows = sorted(rows, key=lambda row: row.get(sort_by) or 0, reverse=True)
+        out[proto] = {
+            "total": stats.get("totals", {}).get(f"{kind}.{proto}", 0) if not needle else len(rows),
+            "items": rows[:limit],
+        }
+    return out
@@ -0,0 +1,167 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from pathlib import Path
+import sys
+import time
+from typing import Any, Awaitable, Callable, Optional
+
+from . import metrics
+
+
+Scope = dict[str, Any]
+Receive = Callable[[], Awaitable[dict[str, Any]]]
+Send = Callable[[dict[str, Any]], Awaitable[None]]
+ASGIApp = Callable[[Scope, Receive, Send], Awaitable[None]]
+
+# While draining, exit once no request was in flight for this long (follow-up requests of a
+# finishing client arrive right after its call result).
+DRAIN_IDLE_S = 0.5
+
+
+def parse_listen(listen: str) -> tuple[Optional[str], Optional[int], Optional[Path]]:
+    # "unix:/path/to.sock" or "host:port" -> (host, port, uds)
+    s = (listen or "").strip()
+    if s.startswith("unix:"):
+        return None, None, Path(s[len("unix:") :]).expanduser()
+    host, sep, port = s.rpartition(":")
+    if not sep or not port.isdigit():
+        raise RuntimeError(f"invalid http_listen: {listen} (expected host:port or unix:/path)")
+    return host.strip("[]") or "127.0.0.1", int(port), None
+
+
+def _client_key(scope: Scope) -> str:
+    # One MCP session per client window; fall back to the peer address before the session exists.
+    for k, v in scope.get("headers") or ():
+        if k == b"mcp-session-id":
+            return "session:" + v.decode("latin-1")
+    client = scope.get("client")
+    return f"peer:{client[0]}" if client else "peer:local"
+
+
+class ClientQuota:
+    """ASGI middleware: at most `per_client` POST requests (tool calls) in flight per client.
+
+    Requests over the quota wait up to `wait_s` and are then answered with 429. Once draining,
+    only clients that had requests in flight may continue (e.g. the tools/list a client sends
+    after a call result); everyone else gets 503.
+    """
+
+    def __init__(self, app: ASGIApp, *, per_client: int, wait_s: float) -> None:
+        self.app = app
+        self.per_client = max(1, int(per_client))
+        self.wait_s = float(wait_s)
+        self.draining = False
+        self.in_flight = 0
+        self._clients: dict[str, list[Any]] = {}
+        self._finishing: set[str] = set()
+
+    def drain(self) -> None:
+        self.draining = True
+        self._finishing = set(self._clients)
+
+    async def _reject(self, send: Send, status: int, message: str) -> None:
+        body = json.dumps({"jsonrpc": "2.0", "id": None, "error": {"code": -32000, "message": message}}).encode()
+        headers = [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+        if status == 503:
+            headers.append((b"retry-after", b"1"))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope.get("type") != "http" or scope.get("method") != "POST":
+            await self.app(scope, receive, send)
+            return
+        key = _client_key(scope)
+        if self.draining and key not in self._finishing:
+            metrics.inc("http_rejected_total", reason="draining")
+            await self._reject(send, 503, "server is draining for restart")
+            return
+
+        entry = self._clients.get(key)
+        if entry is None:
+            entry = self._clients[key] = [asyncio.Semaphore(self.per_client), 0]
+        entry[1] += 1
+        t0 = time.perf_counter()
+        try:
+            try:
+                await asyncio.wait_for(entry[0].acquire(), timeout=self.wait_s or None)
+            except asyncio.TimeoutError:
+                metrics.inc("http_rejected_total", reason="quota")
+                await self._reject(send, 429, f"too many concurrent requests for this client (max {self.per_client})")
+                return
+            metrics.observe("queue_wait_seconds", time.perf_counter() - t0, queue="http_client", tool="")
+            self.in_flight += 1
+            try:
+                await self.app(scope, receive, send)
+            finally:
+                self.in_flight -= 1
+                entry[0].release()
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._clients.pop(key, None)
+
+
+def run_http(listen: Optional[str] = None) -> int:
+    import uvicorn
+
+    from .server import app, cfg
+    from .warmup import start_warmup
+
+    host, port, uds = parse_listen(listen or cfg.http_listen)
+    quota = ClientQuota(app.streamable_http_app(), per_client=cfg.http_client_concurrency, wait_s=cfg.http_queue_timeout_s)
+    metrics.register_collector(
+        lambda: [("http_in_flight_requests", {}, float(quota.in_flight)), ("http_active_clients", {}, float(len(quota._clients)))]
+    )
+
+    class DrainingServer(uvicorn.Server):
+        # uvicorn (and sse-starlette, which closes open SSE responses) act on should_exit at
+        # once, so the first signal only stops admitting new work; uvicorn is told to exit once
+        # nothing was in flight for a moment or http_drain_timeout_s passed. A second signal
+        # exits now.
+        def handle_exit(self, sig: int, frame: Any) -> None:
+            if quota.draining:
+                super().handle_exit(sig, frame)
+                return
+            quota.drain()
+            print(f"pcap-mcp: draining {quota.in_flight} in-flight request(s)", file=sys.stderr, flush=True)
+            asyncio.get_running_loop().create_task(self._exit_when_drained(sig, frame))
+
+        async def _exit_when_drained(self, sig: int, frame: Any) -> None:
+            deadline = time.monotonic() + float(cfg.http_drain_timeout_s)
+            idle_since: Optional[float] = None
+            while not cfg.http_drain_timeout_s or time.monotonic() < deadline:
+                now = time.monotonic()
+                idle_since = (idle_since or now) if not quota.in_flight else None
+                if idle_since is not None and now - idle_since >= DRAIN_IDLE_S:
+                    break
+                await asyncio.sleep(0.1)
+            super().handle_exit(sig, frame)
+
+    if uds is not None:
+        uds.parent.mkdir(parents=True, exist_ok=True)
+        if uds.is_socket():
+            uds.unlink()
+    config = uvicorn.Config(
+        quota,
+        host=host or "127.0.0.1",
+        port=port or 0,
+        uds=str(uds) if uds is not None else None,
+        lifespan="on",
+        log_level="warning",
+        timeout_graceful_shutdown=int(cfg.http_drain_timeout_s) or None,
+    )
+    server = DrainingServer(config)
+    start_warmup(cfg)
+    metrics.start_exporter(cfg.metrics_export, cfg.metrics_export_path, cfg.metrics_export_interval_s)
+    print(
+        f"pcap-mcp: streamable HTTP on {('unix:' + str(uds)) if uds else f'http://{host}:{port}'}{app.settings.streamable_http_path}",
+        file=sys.stderr,
+        flush=True,
+    )
+    server.run()
+    if uds is not None and uds.is_socket():
+        uds.unlink()
+    return 0
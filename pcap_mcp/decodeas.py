@@ -0,0 +1,281 @@
+from __future__ import annotations
+
+from collections import Counter
+from pathlib import Path
+import re
+import time
+from typing import Any, Optional
+
+from .config import Config
+from .errors import PcapMcpError
+from .identity import cached_metadata
+from .pcapfile import CaptureFile
+
+
+# `decode_as` entry that is replaced by the scan's proposals for the capture.
+AUTO_DECODE_AS = "auto"
+
+PREFIX_BYTES = 64
+# Payload packets classified per port pair; later packets of the pair are only counted.
+SAMPLES_PER_PAIR = 16
+# Frame-header heuristics need this many matching packets on a port; a connection preface
+# or a SIP start line counts as this many on its own.
+MIN_SCORE = 3
+MIN_SHARE = 0.25
+
+# Ports tshark already dissects these protocols on without any decode-as.
+DEFAULT_PORTS: dict[tuple[str, str], frozenset[int]] = {
+    ("udp", "sip"): frozenset({5060}),
+    ("tcp", "sip"): frozenset({5060}),
+    ("sctp", "sip"): frozenset({5060}),
+    ("tcp", "diameter"): frozenset({3868}),
+    ("sctp", "diameter"): frozenset({3868}),
+    ("udp", "pfcp"): frozenset({8805}),
+    ("udp", "gtp"): frozenset({2152, 2123, 3386}),
+    ("udp", "gtpv2"): frozenset({2123}),
+}
+# SCTP payload protocol identifiers that select a dissector regardless of the port.
+_SCTP_PPIDS = {46: "diameter", 47: "diameter"}
+
+_TRANSPORTS = {6: "tcp", 17: "udp", 132: "sctp"}
+_H2_PREFACE = b"PRI * HTTP/2.0\r\n\r\nSM\r\n\r\n"
+_SIP_START_RE = re.compile(rb"^(?:[A-Z]{3,10} [^ \r\n]+ SIP/2\.0\r?\n|SIP/2\.0 [1-6]\d\d )")
+_PFCP_TYPES = frozenset([*range(1, 16), *range(50, 58)])
+
+
+def _link_payload(buf: Any, off: int, end: int, linktype: int) -> tuple[int, int]:
+    # (ethertype, offset of the network header), ethertype 0 when unsupported.
+    if linktype == 1:
+        if end - off < 14:
+            return 0, off
+        etype = (buf[off + 12] << 8) | buf[off + 13]
+        pos = off + 14
+        while etype in (0x8100, 0x88A8, 0x9100) and end - pos >= 4:
+            etype = (buf[pos + 2] << 8) | buf[pos + 3]
+            pos += 4
+        return etype, pos
+    if linktype == 113:
+        return ((buf[off + 14] << 8) | buf[off + 15], off + 16) if end - off >= 16 else (0, off)
+    if linktype == 276:
+        return ((buf[off] << 8) | buf[off + 1], off + 20) if end - off >= 20 else (0, off)
+    if linktype in (101, 228, 229) and end > off:
+        return {4: 0x0800, 6: 0x86DD}.get(buf[off] >> 4, 0), off
+    if linktype == 0 and end - off >= 4:
+        family = buf[off] or buf[off + 3]
+        return (0x0800 if family == 2 else 0x86DD if family in (24, 28, 30) else 0), off + 4
+    return 0, off
+
+
+def _transport_payload(buf: Any, pos: int, end: int, etype: int) -> Optional[tuple[str, int, int, int, int, bool, int]]:
+    # (transport, sport, dport, payload start, payload end, tcp_syn, sctp_ppid); None for
+    # non-first fragments and anything without a TCP/UDP/SCTP payload.
+    if etype == 0x0800:
+        if end - pos < 20 or buf[pos] >> 4 != 4:
+            return None
+        ihl = (buf[pos] & 0x0F) * 4
+        total = (buf[pos + 2] << 8) | buf[pos + 3]
+        if ((buf[pos + 6] << 8) | buf[pos + 7]) & 0x1FFF:
+            return None
+        proto = buf[pos + 9]
+        if total >= ihl:
+            end = min(end, pos + total)
+        pos += ihl
+    elif etype == 0x86DD:
+        if end - pos < 40:
+            return None
+        proto = buf[pos + 6]
+        plen = (buf[pos + 4] << 8) | buf[pos + 5]
+        if plen:
+            end = min(end, pos + 40 + plen)
+        pos += 40
+        for _ in range(4):
+            if end - pos < 8:
+                break
+            if proto in (0, 43, 60):
+                proto, pos = buf[pos], pos + (buf[pos + 1] + 1) * 8
+            elif proto == 44:
+                if ((buf[pos + 2] << 8) | buf[pos + 3]) & 0xFFF8:
+                    return None
+                proto, pos = buf[pos], pos + 8
+            else:
+                break
+    else:
+        return None
+
+    transport = _TRANSPORTS.get(proto)
+    if transport is None or end - pos < 8:
+        return None
+    sport = (buf[pos] << 8) | buf[pos + 1]
+    dport = (buf[pos + 2] << 8) | buf[pos + 3]
+    if transport == "udp":
+        return transport, sport, dport, pos + 8, end, False, 0
+    if transport == "tcp":
+        if end - pos < 20:
+            return None
+        syn = buf[pos + 13] & 0x12 == 0x02
+        return transport, sport, dport, pos + (buf[pos + 12] >> 4) * 4, end, syn, 0
+
+    # SCTP: the first DATA chunk that starts a user message.
+    chunk = pos + 12
+    while end - chunk >= 16:
+        ctype, flags = buf[chunk], buf[chunk + 1]
+        clen = (buf[chunk + 2] << 8) | buf[chunk + 3]
+        if clen < 4:
+            break
+        if ctype == 0 and clen > 16 and flags & 0x02:
+            ppid = int.from_bytes(bytes(buf[chunk + 12 : chunk + 16]), "big")
+            return transport, sport, dport, chunk + 16, min(end, chunk + clen), False, ppid
+        chunk += (clen + 3) & ~3
+    return None
+
+
+def _h2_frame_header(data: bytes) -> bool:
+    if len(data) < 9 or data[5] & 0x80:
+        return False
+    length = int.from_bytes(data[0:3], "big")
+    ftype = data[3]
+    stream = int.from_bytes(data[5:9], "big")
+    if length > 16384 or ftype > 9:
+        return False
+    if ftype == 4:
+        return stream == 0 and length % 6 == 0
+    if ftype == 6:
+        return stream == 0 and length == 8
+    if ftype == 7:
+        return stream == 0 and length >= 8
+    if ftype == 8:
+        return length == 4
+    return stream != 0
+
+
+def classify(transport: str, data: bytes, size: int) -> Optional[tuple[str, bool, str]]:
+    # (protocol, strong, evidence) for a payload prefix `data` of a `size`-byte payload.
+    if transport == "tcp" and data.startswith(_H2_PREFACE):
+        return "http2", True, "connection preface"
+    if _SIP_START_RE.match(data):
+        return "sip", True, "start line"
+    if transport in ("tcp", "sctp") and len(data) >= 20 and data[0] == 1 and not data[4] & 0x0F:
+        length = int.from_bytes(data[1:4], "big")
+        if length >= 20 and length % 4 == 0 and int.from_bytes(data[5:8], "big"):
+            return "diameter", False, "header"
+    if transport == "tcp" and _h2_frame_header(data):
+        return "http2", False, "frame header"
+    if transport == "udp" and len(data) >= 8:
+        version = data[0] >> 5
+        length = int.from_bytes(data[2:4], "big")
+        if version == 1 and data[0] & 0x10 and length == size - 8 and data[1]:
+            return "gtp", False, "header"
+        if version == 1 and not data[0] & 0x18 and data[1] in _PFCP_TYPES and length == size - 4:
+            return "pfcp", False, "header"
+        if version == 2 and not data[0] & 0x07 and data[1] and length == size - 4:
+            return "gtpv2", False, "header"
+    return None
+
+
+def scan_decode_as(p: Path) -> dict[str, Any]:
+    # One pass over the capture in Python (no tshark): TCP/UDP/SCTP payload prefixes are
+    # classified per port pair, and each pair is attributed to its server port (the SYN
+    # destination if seen, else the lower port).
+    started = time.perf_counter()
+    pairs: dict[tuple[str, int, int], dict[str, Any]] = {}
+    servers: set[tuple[str, int]] = set()
+    frames = 0
+    with CaptureFile(p) as cf:
+        buf = cf.buf
+        for rec in cf.iter_records():
+            frames += 1
+            linktype = cf.linktype_for(rec.interface)
+            end = rec.data_offset + rec.caplen
+            etype, pos = _link_payload(buf, rec.data_offset, end, linktype)
+            if not etype:
+                continue
+            l4 = _transport_payload(buf, pos, end, etype)
+            if l4 is None:
+                continue
+            transport, sport, dport, start, stop, syn, ppid = l4
+            if syn:
+                servers.add((transport, dport))
+            if stop <= start:
+                continue
+            key = (transport, min(sport, dport), max(sport, dport))
+            pair = pairs.get(key)
+            if pair is None:
+                pair = pairs[key] = {"samples": 0, "scores": Counter(), "evidence": {}, "first_frame": {}, "ppid": Counter()}
+            if pair["samples"] >= SAMPLES_PER_PAIR:
+                continue
+            pair["samples"] += 1
+            if ppid:
+                pair["ppid"][ppid] += 1
+            hit = classify(transport, bytes(buf[start : min(stop, start + PREFIX_BYTES)]), stop - start)
+            if hit is None:
+                continue
+            proto, strong, evidence = hit
+            pair["scores"][proto] += MIN_SCORE if strong else 1
+            if strong or proto not in pair["evidence"]:
+                pair["evidence"][proto] = evidence
+            pair["first_frame"].setdefault(proto, frames)
+
+    by_port: dict[tuple[str, int, str], dict[str, Any]] = {}
+    for (transport, lo, hi), pair in pairs.items():
+        if not pair["scores"]:
+            continue
+        proto, score = pair["scores"].most_common(1)[0]
+        if (transport, hi) in servers and (transport, lo) not in servers:
+            port = hi
+        else:
+            port = lo
+        ppid = pair["ppid"].most_common(1)[0][0] if pair["ppid"] else 0
+        d = by_port.setdefault(
+            (transport, port, proto),
+            {"score": 0, "samples": 0, "pairs": 0, "evidence": "", "first_frame": 0, "by_ppid": False},
+        )
+        d["score"] += score
+        d["samples"] += pair["samples"]
+        d["pairs"] += 1
+        if not d["evidence"] or pair["evidence"][proto] != "header":
+            d["evidence"] = pair["evidence"][proto]
+        first = pair["first_frame"][proto]
+        d["first_frame"] = min(d["first_frame"] or first, first)
+        d["by_ppid"] = d["by_ppid"] or _SCTP_PPIDS.get(ppid) == proto
+
+    detections: list[dict[str, Any]] = []
+    for (transport, port, proto), d in sorted(by_port.items(), key=lambda kv: -kv[1]["score"]):
+        if d["score"] < MIN_SCORE or d["score"] < MIN_SHARE * d["samples"]:
+            continue
+        default = port in DEFAULT_PORTS.get((transport, proto), ()) or d["by_ppid"]
+        detections.append(
+            {
+                "transport": transport,
+                "port": port,
+                "protocol": proto,
+                "decode_as": f"{transport}.port=={port},{proto}",
+                "dissected_by_default": default,
+                "evidence": d["evidence"],
+                "score": d["score"],
+                "samples": d["samples"],
+                "port_pairs": d["pairs"],
+                "first_frame": d["first_frame"],
+            }
+        )
+    return {
+        "frames_scanned": frames,
+        "scan_s": round(time.perf_counter() - started, 3),
+        "detections": detections,
+        "decode_as": [d["decode_as"] for d in detections if not d["dissected_by_default"]],
+    }
+
+
+def cached_decode_as_scan(cfg: Config, p: Path) -> dict[str, Any]:
+    return cached_metadata(cfg, p, "decode_as_scan", lambda: scan_decode_as(p))
+
+
+def expand_auto(cfg: Config, p: Optional[Path], decode_as: list[str]) -> list[str]:
+    # Replaces the `auto` entry by the scanned proposals of the capture.
+    if AUTO_DECODE_AS not in decode_as:
+        return decode_as
+    if p is None:
+        raise PcapMcpError("INVALID_ARGUMENT", "decode_as \"auto\" is only supported for single-capture tools")
+    out: list[str] = []
+    for d in decode_as:
+        out.extend(cached_decode_as_scan(cfg, p)["decode_as"] if d == AUTO_DECODE_AS else [d])
+    return out
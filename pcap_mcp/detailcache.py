@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+import threading
+from typing import Any, Optional
+
+from . import metrics
+from .config import Config
+from .errors import PcapMcpError
+from .identity import capture_identity
+from .tshark_tools import frame_detail_json, render_frame_details, truncate_text
+
+
+DetailKey = tuple[Any, ...]
+
+
+class DetailCache:
+    # LRU of rendered frame details bounded by the total size of the cached renderings.
+    def __init__(self) -> None:
+        self._items: OrderedDict[DetailKey, tuple[Any, int]] = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: DetailKey) -> Optional[tuple[Any, int]]:
+        with self._lock:
+            item = self._items.get(key)
+            if item is not None:
+                self._items.move_to_end(key)
+        metrics.cache_event("frame_detail", item is not None)
+        return item
+
+    def __contains__(self, key: DetailKey) -> bool:
+        with self._lock:
+            return key in self._items
+
+    def put(self, key: DetailKey, value: Any, size: int, max_bytes: int) -> None:
+        if size > max_bytes // 4:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self._size -= old[1]
+            self._items[key] = (value, size)
+            self._size += size
+            while self._size > max_bytes and self._items:
+                _k, (_v, s) = self._items.popitem(last=False)
+                self._size -= s
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            return {"entries": len(self._items), "bytes": self._size}
+
+
+_cache = DetailCache()
+_prefetch_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pcap-mcp-prefetch")
+_inflight: dict[DetailKey, Future] = {}
+_inflight_lock = threading.Lock()
+
+
+def _key(
+    kind: str,
+    p: Path,
+    frame_number: int,
+    *,
+    layers: Optional[list[str]],
+    restrict_layers: bool,
+    verbosity: str,
+    decode_as: Optional[list[str]],
+    preferences: Optional[list[str]],
+    protocols: Optional[list[str]],
+) -> DetailKey:
+    return (
+        kind,
+        capture_identity(p).key,
+        int(frame_number),
+        tuple(layers or ()) if restrict_layers else (),
+        verbosity,
+        tuple(decode_as or ()),
+        tuple(preferences or ()),
+        tuple(protocols or ()),
+    )
+
+
+def _text_size(text: str) -> int:
+    # detail_cache_mb bounds bytes, not characters.
+    return len(text.encode("utf-8", errors="replace"))
+
+
+def cached_frame_details(
+    cfg: Config,
+    *,
+    p: Path,
+    frame_numbers: list[int],
+    layers: Optional[list[str]],
+    restrict_layers: bool = True,
+    verbosity: str = "summary",
+    decode_as: Optional[list[str]] = None,
+    preferences: Optional[list[str]] = None,
+    protocols: Optional[list[str]] = None,
+    max_bytes: int,
+) -> list[tuple[str, bool, bool]]:
+    # Returns (text, truncated, cached) per requested frame. Frames missing from the cache are
+    # rendered together in one tshark pass. The full rendering is cached; max_bytes is applied per call.
+    if max_bytes <= 0:
+        raise PcapMcpError("INVALID_ARGUMENT", "max_bytes must be > 0")
+    opts = dict(layers=layers, restrict_layers=restrict_layers, verbosity=verbosity, decode_as=decode_as, preferences=preferences, protocols=protocols)
+    keys = {int(n): _key("text", p, int(n), **opts) for n in frame_numbers}
+    limit = cfg.detail_cache_mb * 1024 * 1024
+
+    texts: dict[int, str] = {}
+    for n, key in keys.items():
+        hit = _cache.get(key) if limit > 0 else None
+        if hit is None:
+            with _inflight_lock:
+                fut = _inflight.get(key)
+            if fut is not None:
+                # A prefetch for this frame is already running; wait for it instead of starting another pass.
+                try:
+                    fut.result(timeout=cfg.default_timeout_s or None)
+                except Exception:
+                    pass
+                hit = _cache.get(key) if limit > 0 else None
+        if hit is not None:
+            texts[n] = hit[0]
+    cached = set(texts)
+
+    missing = [n for n in keys if n not in cached]
+    if missing:
+        rendered = render_frame_details(cfg, p=p, frame_numbers=missing, **opts)
+        for n in missing:
+            texts[n] = rendered.get(n, "")
+            if limit > 0:
+                _cache.put(keys[n], texts[n], _text_size(texts[n]), limit)
+
+    out: list[tuple[str, bool, bool]] = []
+    for n in frame_numbers:
+        text, truncated = truncate_text(texts[int(n)], max_bytes)
+        out.append((text, truncated, int(n) in cached))
+    return out
+
+
+def cached_frame_detail_json(
+    cfg: Config,
+    *,
+    p: Path,
+    frame_number: int,
+    layers: Optional[list[str]],
+    restrict_layers: bool = True,
+    verbosity: str = "summary",
+    decode_as: Optional[list[str]] = None,
+    preferences: Optional[list[str]] = None,
+    protocols: Optional[list[str]] = None,
+    max_bytes: int,
+) -> tuple[dict[str, Any], bool, bool, bool]:
+    # Returns (layers, truncated, repaired, cached). Only complete trees are cached, and a
+    # cached tree is used only if it fits this call's max_bytes.
+    opts = dict(layers=layers, restrict_layers=restrict_layers, verbosity=verbosity, decode_as=decode_as, preferences=preferences, protocols=protocols)
+    key = _key("json", p, frame_number, **opts)
+    limit = cfg.detail_cache_mb * 1024 * 1024
+
+    hit = _cache.get(key) if limit > 0 else None
+    if hit is not None and hit[1] <= max_bytes:
+        return hit[0], False, False, True
+
+    tree, truncated, repaired, size = frame_detail_json(cfg, p=p, frame_number=frame_number, max_bytes=max_bytes, **opts)
+    if limit > 0 and not truncated:
+        _cache.put(key, tree, size, limit)
+    return tree, truncated, repaired, False
+
+
+def _prefetch(cfg: Config, p: Path, frames: list[int], keys: list[DetailKey], opts: dict[str, Any]) -> None:
+    limit = cfg.detail_cache_mb * 1024 * 1024
+    try:
+        texts = render_frame_details(cfg, p=p, frame_numbers=frames, policy="prefetch", **opts)
+        for n, key in zip(frames, keys):
+            _cache.put(key, texts.get(n, ""), _text_size(texts.get(n, "")), limit)
+        metrics.inc("prefetched_frames_total", len(frames))
+    finally:
+        with _inflight_lock:
+            for key in keys:
+                _inflight.pop(key, None)
+
+
+def prefetch_frame_details(
+    cfg: Config,
+    *,
+    p: Path,
+    frame_numbers: list[int],
+    decode_as: Optional[list[str]] = None,
+    preferences: Optional[list[str]] = None,
+    protocols: Optional[list[str]] = None,
+) -> int:
+    # Renders the first detail_prefetch_frames frames in the background, with the default
+    # pcap_frame_detail options, so the usual filter -> drill-down loop hits the cache.
+    n = int(cfg.detail_prefetch_frames)
+    if n <= 0 or cfg.detail_cache_mb <= 0 or not frame_numbers:
+        return 0
+    opts: dict[str, Any] = dict(
+        layers=None,
+        restrict_layers=True,
+        verbosity="summary",
+        decode_as=decode_as,
+        preferences=preferences,
+        protocols=protocols,
+    )
+    frames: list[int] = []
+    keys: list[DetailKey] = []
+    with _inflight_lock:
+        for f in frame_numbers[:n]:
+            key = _key("text", p, int(f), **opts)
+            if key in _cache or key in _inflight:
+                continue
+            frames.append(int(f))
+            keys.append(key)
+        if not frames:
+            return 0
+        fut = _prefetch_executor.submit(metrics.queued("prefetch", _prefetch), cfg, p, frames, keys, opts)
+        for key in keys:
+            _inflight[key] = fut
+    return len(frames)
+
+
+def cache_stats() -> dict[str, int]:
+    return _cache.stats()
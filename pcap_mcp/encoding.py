@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Optional
+
+from .errors import PcapMcpError
+
+
+ROW_ENCODINGS = ("rows", "compact")
+FRAME_KEYS = ("frame.number", "frame_number")
+
+# A column is dictionary-encoded when it has at most this share of distinct values.
+_DICTIONARY_MAX_DISTINCT_RATIO = 0.5
+_DICTIONARY_MIN_ROWS = 4
+
+
+def json_size(obj: Any) -> int:
+    return len(json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+
+def _columns(rows: list[dict[str, Any]]) -> list[str]:
+    seen: dict[str, None] = {}
+    for r in rows:
+        for k in r:
+            seen.setdefault(k, None)
+    return list(seen)
+
+
+def _hashable(v: Any) -> Any:
+    return tuple(v) if isinstance(v, list) else v
+
+
+def _frame_runs(values: list[Any]) -> Optional[list[list[int]]]:
+    # [[first, count], ...] for runs of consecutive frame numbers; None if any value is not an int.
+    runs: list[list[int]] = []
+    for v in values:
+        if isinstance(v, int):
+            n = v
+        elif isinstance(v, str) and v.isdigit():
+            n = int(v)
+        else:
+            return None
+        if runs and runs[-1][0] + runs[-1][1] == n:
+            runs[-1][1] += 1
+        else:
+            runs.append([n, 1])
+    return runs
+
+
+def encode_compact(rows: list[dict[str, Any]]) -> dict[str, Any]:
+    columns = _columns(rows)
+    frame_key = next((k for k in FRAME_KEYS if k in columns), None)
+    frame_runs = None
+    if frame_key is not None:
+        frame_runs = _frame_runs([r.get(frame_key) for r in rows])
+        if frame_runs is not None:
+            columns.remove(frame_key)
+        else:
+            frame_key = None
+
+    dictionaries: dict[str, list[Any]] = {}
+    codes: dict[str, dict[Any, int]] = {}
+    if len(rows) >= _DICTIONARY_MIN_ROWS:
+        for c in columns:
+            index: dict[Any, int] = {}
+            values: list[Any] = []
+            limit = int(len(rows) * _DICTIONARY_MAX_DISTINCT_RATIO)
+            for r in rows:
+                v = r.get(c)
+                key = _hashable(v)
+                if key not in index:
+                    if len(values) >= limit:
+                        break
+                    index[key] = len(values)
+                    values.append(v)
+            else:
+                dictionaries[c] = values
+                codes[c] = index
+
+    encoded_rows: list[list[Any]] = []
+    for r in rows:
+        row: list[Any] = []
+        for c in columns:
+            v = r.get(c)
+            index = codes.get(c)
+            row.append(index[_hashable(v)] if index is not None else v)
+        encoded_rows.append(row)
+
+    return {
+        "encoding": "compact",
+        "columns": columns,
+        "frame_column": frame_key,
+        "frame_runs": frame_runs,
+        "dictionaries": dictionaries,
+        "rows": encoded_rows,
+    }
+
+
+def encode_rows(
+    rows: list[dict[str, Any]],
+    *,
+    encoding: str = "rows",
+    max_bytes: Optional[int] = None,
+    offset: int = 0,
+) -> dict[str, Any]:
+    enc = (encoding or "rows").strip().lower()
+    if enc not in ROW_ENCODINGS:
+        raise PcapMcpError("INVALID_ARGUMENT", "unknown encoding", {"encoding": encoding, "available": list(ROW_ENCODINGS)})
+    if max_bytes is not None and int(max_bytes) <= 0:
+        raise PcapMcpError("INVALID_ARGUMENT", "max_bytes must be positive", {"max_bytes": max_bytes})
+
+    def build(n: int) -> dict[str, Any]:
+        out = encode_compact(rows[:n]) if enc == "compact" else {"rows": rows[:n]}
+        if max_bytes is not None:
+            out["rows_returned"] = n
+            out["truncated_by_max_bytes"] = n < len(rows)
+            if n < len(rows):
+                out["next_offset"] = int(offset) + n
+        return out
+
+    out = build(len(rows))
+    if max_bytes is None or len(rows) <= 1 or json_size(out) <= int(max_bytes):
+        return out
+
+    # Largest row prefix whose encoded form fits the budget (sizes are measured on compact JSON,
+    # over the rows block only, not the tool's whole response). At least one row is always
+    # returned, so next_offset moves forward even when a single row is over the budget.
+    budget = int(max_bytes)
+    lo, hi = 1, len(rows) - 1
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if json_size(build(mid)) <= budget:
+            lo = mid
+        else:
+            hi = mid - 1
+    return build(lo)
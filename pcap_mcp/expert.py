@@ -0,0 +1,219 @@
+from __future__ import annotations
+
+import hashlib
+from pathlib import Path
+import re
+import time
+from typing import Any, Optional
+
+from . import metrics
+from .config import Config
+from .errors import PcapMcpError
+from .identity import capture_identity, metadata_store
+from .proc import check_resources, popen_lines, read_all_stderr, safe_kill, stdout_lines
+from .tshark_tools import dissector_args
+
+
+SEVERITIES = ("error", "warning", "note", "chat", "comment")
+FIRST_FRAMES = 10
+# Distinct (severity, group, protocol, message) entries kept per capture and decode settings.
+MAX_STORED_ENTRIES = 2000
+
+# epan/proto.h PI_* values, as printed by -T fields for _ws.expert.severity/_ws.expert.group.
+_SEVERITY_VALUES = {0x00100000: "comment", 0x00200000: "chat", 0x00400000: "note", 0x00600000: "warning", 0x00800000: "error"}
+_GROUP_VALUES = {
+    0x01000000: "Checksum",
+    0x02000000: "Sequence",
+    0x03000000: "Response",
+    0x04000000: "Request",
+    0x05000000: "Undecoded",
+    0x06000000: "Reassemble",
+    0x07000000: "Malformed",
+    0x08000000: "Debug",
+    0x09000000: "Protocol",
+    0x0A000000: "Security",
+    0x0B000000: "Comment",
+    0x0C000000: "Decryption",
+    0x0D000000: "Assumption",
+    0x0E000000: "Deprecated",
+    0x0F000000: "Receive",
+    0x10000000: "Interface",
+    0x11000000: "Dissector bug",
+}
+_SEVERITY_NAMES = {"errors": "error", "warnings": "warning", "notes": "note", "chats": "chat", "comments": "comment"}
+_STATS_SECTION_RE = re.compile(r"^(Errors|Warnings|Notes|Chats|Comments) \(\d+\)\s*$")
+_STATS_ROW_RE = re.compile(r"^\s*(\d+)\s+(.*)$")
+_GROUPS_LONGEST_FIRST = sorted(_GROUP_VALUES.values(), key=len, reverse=True)
+
+
+def _severity(raw: str) -> str:
+    s = raw.strip()
+    try:
+        return _SEVERITY_VALUES.get(int(s, 0), s)
+    except ValueError:
+        s = s.lower()
+        return _SEVERITY_NAMES.get(s, s)
+
+
+def _group(raw: str) -> str:
+    s = raw.strip()
+    try:
+        return _GROUP_VALUES.get(int(s, 0), s)
+    except ValueError:
+        return s
+
+
+def _stats_protocols(lines: list[str]) -> dict[tuple[str, str, str], str]:
+    # (severity, group, summary) -> protocol, from the -z expert table printed after the packets.
+    out: dict[tuple[str, str, str], str] = {}
+    severity = ""
+    for line in lines:
+        m = _STATS_SECTION_RE.match(line.strip())
+        if m:
+            severity = _SEVERITY_NAMES[m.group(1).lower()]
+            continue
+        m = _STATS_ROW_RE.match(line)
+        if not severity or not m:
+            continue
+        rest = m.group(2)
+        group = next((g for g in _GROUPS_LONGEST_FIRST if rest.startswith(g + " ")), None)
+        if group is None:
+            continue
+        proto, _, summary = rest[len(group) :].strip().partition(" ")
+        out.setdefault((severity, group, summary.strip()), proto)
+    return out
+
+
+def settings_key(
+    decode_as: Optional[list[str]],
+    preferences: Optional[list[str]],
+    protocols: Optional[list[str]],
+) -> str:
+    argv = dissector_args(decode_as, preferences, protocols)
+    return hashlib.blake2b("\0".join(argv).encode("utf-8"), digest_size=8).hexdigest()
+
+
+def expert_summary(
+    cfg: Config,
+    *,
+    p: Path,
+    decode_as: Optional[list[str]] = None,
+    preferences: Optional[list[str]] = None,
+    protocols: Optional[list[str]] = None,
+) -> dict[str, Any]:
+    # One pass: per-frame expert fields give counts and frame numbers, the trailing
+    # -z expert table gives the protocol each entry was raised by.
+    args: list[str] = [cfg.tshark_path]
+    args += dissector_args(decode_as, preferences, protocols)
+    args += [
+        "-r",
+        str(p),
+        "-Y",
+        "_ws.expert",
+        "-T",
+        "fields",
+        "-E",
+        "separator=\t",
+        "-E",
+        "occurrence=a",
+        "-E",
+        "aggregator=|",
+        "-e",
+        "frame.number",
+        "-e",
+        "_ws.expert.severity",
+        "-e",
+        "_ws.expert.group",
+        "-e",
+        "_ws.expert.message",
+        "-e",
+        "_ws.col.Protocol",
+        "-z",
+        "expert",
+    ]
+
+    proc = popen_lines(args, policy=cfg.resource_policies.get("interactive"))
+    started = time.time()
+    entries: dict[tuple[str, str, str], dict[str, Any]] = {}
+    stats_lines: list[str] = []
+    frames = 0
+    try:
+        if not proc.stdout:
+            raise PcapMcpError("INTERNAL_ERROR", "tshark produced no stdout")
+
+        for line in stdout_lines(proc):
+            if cfg.export_timeout_s and (time.time() - started) > cfg.export_timeout_s:
+                raise PcapMcpError("TIMEOUT", "tshark timed out")
+
+            cols = line.rstrip("\r\n").split("\t")
+            if len(cols) < 4 or not cols[0].isdigit():
+                stats_lines.append(line.rstrip("\r\n"))
+                continue
+
+            frame = int(cols[0])
+            frames += 1
+            col_protocol = cols[4] if len(cols) > 4 else ""
+            for sev, grp, msg in zip(cols[1].split("|"), cols[2].split("|"), cols[3].split("|")):
+                key = (_severity(sev), _group(grp), msg.strip())
+                e = entries.get(key)
+                if e is None:
+                    e = entries[key] = {"count": 0, "first_frames": [], "column_protocol": col_protocol}
+                e["count"] += 1
+                if len(e["first_frames"]) < FIRST_FRAMES and (not e["first_frames"] or e["first_frames"][-1] != frame):
+                    e["first_frames"].append(frame)
+
+        stderr = read_all_stderr(proc).strip()
+        proc.wait()
+        check_resources(proc, stderr)
+        if proc.returncode not in (0, None) and not entries:
+            raise PcapMcpError("INTERNAL_ERROR", "tshark expert summary failed", {"stderr": stderr})
+    finally:
+        if proc.poll() is None:
+            safe_kill(proc)
+
+    stats_protocols = _stats_protocols(stats_lines)
+    rank = {s: i for i, s in enumerate(SEVERITIES)}
+    items: list[dict[str, Any]] = []
+    by_severity = {s: 0 for s in SEVERITIES}
+    for (sev, grp, msg), e in entries.items():
+        by_severity[sev] = by_severity.get(sev, 0) + e["count"]
+        items.append(
+            {
+                "severity": sev,
+                "group": grp,
+                "protocol": stats_protocols.get((sev, grp, msg)) or e["column_protocol"],
+                "message": msg,
+                "count": e["count"],
+                "first_frames": e["first_frames"],
+            }
+        )
+    items.sort(key=lambda x: (rank.get(x["severity"], len(SEVERITIES)), -x["count"]))
+    return {
+        "frames_with_expert_info": frames,
+        "by_severity": by_severity,
+        "entries_total": len(items),
+        "entries": items[:MAX_STORED_ENTRIES],
+    }
+
+
+def cached_expert_summary(
+    cfg: Config,
+    *,
+    p: Path,
+    decode_as: Optional[list[str]] = None,
+    preferences: Optional[list[str]] = None,
+    protocols: Optional[list[str]] = None,
+) -> dict[str, Any]:
+    # Stored under one "expert" metadata entry, keyed by a digest of the dissector arguments.
+    ident = capture_identity(p)
+    store = metadata_store(cfg)
+    key = settings_key(decode_as, preferences, protocols)
+    known = store.get(ident).get("expert") or {}
+    metrics.cache_event("metadata.expert", key in known)
+    if key in known:
+        return known[key]
+    value = expert_summary(cfg, p=p, decode_as=decode_as, preferences=preferences, protocols=protocols)
+    known = dict(store.get(ident).get("expert") or {})
+    known[key] = value
+    store.update(ident, {"expert": known})
+    return value
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Optional
+
+from . import metrics
+from .capture_set import MAX_CAPTURE_SET_MEMBERS, _has_glob, resolve_capture_set_paths
+from .config import Config
+from .errors import PcapMcpError
+from .paths import validate_pcap_path
+
+
+MemberQuery = Callable[[Path], dict[str, Any]]
+ResultCallback = Callable[[dict[str, Any], int, int], Awaitable[None]]
+
+
+def resolve_captures(cfg: Config, captures: list[str]) -> list[Path]:
+    # Each entry is a capture path, a directory or a glob; duplicates keep their first position.
+    found: dict[str, Path] = {}
+    for spec in captures:
+        s = (spec or "").strip()
+        if not s:
+            continue
+        if _has_glob(s) or Path(s).expanduser().is_dir():
+            paths = resolve_capture_set_paths(cfg, s)
+        else:
+            paths = [validate_pcap_path(cfg, s)]
+        for p in paths:
+            found.setdefault(str(p), p)
+        if len(found) > MAX_CAPTURE_SET_MEMBERS:
+            raise PcapMcpError("INVALID_ARGUMENT", "too many captures", {"max": MAX_CAPTURE_SET_MEMBERS})
+    if not found:
+        raise PcapMcpError("INVALID_ARGUMENT", "captures is empty")
+    return list(found.values())
+
+
+def _run_member(query: MemberQuery, p: Path) -> dict[str, Any]:
+    # Per-capture failures are reported in that capture's result instead of failing the fan-out.
+    try:
+        out = query(p)
+    except PcapMcpError as e:
+        return {"pcap_path": str(p), "matched": False, "error": {"code": e.code, "message": e.message, "details": e.details}}
+    except Exception as e:
+        return {"pcap_path": str(p), "matched": False, "error": {"code": "INTERNAL_ERROR", "message": str(e)}}
+    return {"pcap_path": str(p), **out}
+
+
+async def fan_out(
+    cfg: Config,
+    paths: list[Path],
+    query: MemberQuery,
+    *,
+    stop_after_matches: Optional[int] = None,
+    on_result: Optional[ResultCallback] = None,
+) -> dict[str, Any]:
+    # At most capture_set_workers captures (and so tshark processes) run at once. Results are
+    # handed to on_result in completion order; once stop_after_matches captures matched, queued
+    # captures are dropped and captures still running are left to finish in the background.
+    workers = max(1, min(int(cfg.capture_set_workers), len(paths)))
+    ex = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pcap-mcp-fanout")
+    pending = {asyncio.wrap_future(ex.submit(metrics.queued("fanout", _run_member), query, p)): p for p in paths}
+    results: list[dict[str, Any]] = []
+    matched = 0
+    stopped = False
+    try:
+        while pending and not stopped:
+            done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for fut in done:
+                pending.pop(fut)
+                res = fut.result()
+                results.append(res)
+                matched += bool(res.get("matched"))
+                if on_result is not None:
+                    await on_result(res, len(results), len(paths))
+            stopped = bool(stop_after_matches) and matched >= int(stop_after_matches or 0)
+    finally:
+        for fut in pending:
+            fut.cancel()
+        ex.shutdown(wait=False, cancel_futures=True)
+
+    return {
+        "captures_total": len(paths),
+        "captures_completed": len(results),
+        "captures_matched": matched,
+        "stopped_early": bool(pending),
+        "captures_not_completed": [str(p) for p in pending.values()],
+        "results": results,
+    }
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+import hashlib
+import json
+import os
+from pathlib import Path
+import threading
+from typing import Any, Callable, Optional
+
+from . import metrics
+from .config import Config
+
+
+SAMPLE_BYTES = 64 * 1024
+_HASH_CHUNK_BYTES = 4 << 20
+# Most recently used capture paths kept in the metadata directory for start-up warm-up.
+MAX_RECENT_CAPTURES = 50
+_RECENT_FILE = "recent_captures.txt"
+
+
+@dataclass(frozen=True)
+class CaptureIdentity:
+    dev: int
+    inode: int
+    size: int
+    mtime_ns: int
+    sample: str
+
+    @property
+    def key(self) -> str:
+        return f"{self.dev:x}-{self.inode:x}-{self.size:x}-{self.mtime_ns:x}-{self.sample}"
+
+
+_identity_cache: dict[tuple[str, int, int, int, int], CaptureIdentity] = {}
+_identity_lock = threading.Lock()
+
+
+def _sample_hash(p: Path, size: int) -> str:
+    # Head and tail of the file; together with the stat tuple this is enough to tell
+    # a rewritten capture apart without reading the whole thing.
+    h = hashlib.blake2b(digest_size=12)
+    h.update(size.to_bytes(8, "little"))
+    with p.open("rb") as f:
+        h.update(f.read(SAMPLE_BYTES))
+        if size > SAMPLE_BYTES:
+            f.seek(max(SAMPLE_BYTES, size - SAMPLE_BYTES))
+            h.update(f.read(SAMPLE_BYTES))
+    return h.hexdigest()
+
+
+def capture_identity(p: Path) -> CaptureIdentity:
+    st = p.stat()
+    stat_key = (str(p), int(st.st_dev), int(st.st_ino), int(st.st_size), int(st.st_mtime_ns))
+    with _identity_lock:
+        cached = _identity_cache.get(stat_key)
+    metrics.cache_event("capture_identity", cached is not None)
+    if cached is not None:
+        return cached
+
+    ident = CaptureIdentity(
+        dev=int(st.st_dev),
+        inode=int(st.st_ino),
+        size=int(st.st_size),
+        mtime_ns=int(st.st_mtime_ns),
+        sample=_sample_hash(p, int(st.st_size)),
+    )
+    with _identity_lock:
+        for k in [k for k in _identity_cache if k[0] == stat_key[0]]:
+            del _identity_cache[k]
+        _identity_cache[stat_key] = ident
+    return ident
+
+
+def _stat_prefix(st: os.stat_result) -> str:
+    return f"{int(st.st_dev):x}-{int(st.st_ino):x}-{int(st.st_size):x}-{int(st.st_mtime_ns):x}-"
+
+
+class MetadataStore:
+    def __init__(self, root: Path) -> None:
+        self.root = root
+        self._lock = threading.Lock()
+        self._listing_mtime_ns = -1
+        self._by_prefix: dict[str, str] = {}
+        self._recent: Optional[list[str]] = None
+
+    def _path(self, ident: CaptureIdentity) -> Path:
+        return self.root / f"{ident.key}.json"
+
+    def get(self, ident: CaptureIdentity) -> dict[str, Any]:
+        try:
+            data = json.loads(self._path(ident).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def peek(self, st: os.stat_result) -> dict[str, Any]:
+        # Stat-only lookup for listings: avoids sampling every file, at the cost of trusting
+        # (dev, inode, size, mtime) alone.
+        with self._lock:
+            try:
+                mtime_ns = int(self.root.stat().st_mtime_ns)
+            except OSError:
+                return {}
+            if mtime_ns != self._listing_mtime_ns:
+                by_prefix: dict[str, str] = {}
+                for name in os.listdir(self.root):
+                    if name.endswith(".json"):
+                        key = name[: -len(".json")]
+                        by_prefix[key[: key.rfind("-") + 1]] = name
+                self._by_prefix = by_prefix
+                self._listing_mtime_ns = mtime_ns
+            name = self._by_prefix.get(_stat_prefix(st))
+        if name is None:
+            return {}
+        try:
+            data = json.loads((self.root / name).read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return {}
+        return data if isinstance(data, dict) else {}
+
+    def update(self, ident: CaptureIdentity, values: dict[str, Any]) -> dict[str, Any]:
+        with self._lock:
+            data = self.get(ident)
+            data.update(values)
+            try:
+                self.root.mkdir(parents=True, exist_ok=True)
+                target = self._path(ident)
+                tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+                tmp.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+                os.replace(tmp, target)
+            except OSError:
+                pass
+            return data
+
+    def recent(self) -> list[str]:
+        with self._lock:
+            return list(self._load_recent())
+
+    def touch_recent(self, p: Path) -> None:
+        # Rewritten only when the most recent capture changes, not on every call.
+        key = str(p)
+        with self._lock:
+            recent = self._load_recent()
+            if recent[:1] == [key]:
+                return
+            self._recent = [key, *(x for x in recent if x != key)][:MAX_RECENT_CAPTURES]
+            try:
+                self.root.mkdir(parents=True, exist_ok=True)
+                target = self.root / _RECENT_FILE
+                tmp = target.with_name(f"{target.name}.{os.getpid()}.tmp")
+                tmp.write_text("\n".join(self._recent) + "\n", encoding="utf-8")
+                os.replace(tmp, target)
+            except OSError:
+                pass
+
+    def _load_recent(self) -> list[str]:
+        if self._recent is None:
+            try:
+                lines = (self.root / _RECENT_FILE).read_text(encoding="utf-8").splitlines()
+            except OSError:
+                lines = []
+            self._recent = [x for x in lines if x.strip()][:MAX_RECENT_CAPTURES]
+        return self._recent
+
+
+_stores: dict[str, MetadataStore] = {}
+_stores_lock = threading.Lock()
+
+
+def metadata_store(cfg: Config) -> MetadataStore:
+    with _stores_lock:
+        store = _stores.get(str(cfg.metadata_dir))
+        if store is None:
+            store = MetadataStore(cfg.metadata_dir)
+            _stores[str(cfg.metadata_dir)] = store
+        return store
+
+
+def cached_metadata(
+    cfg: Config,
+    p: Path,
+    name: str,
+    compute: Callable[[], Any],
+) -> Any:
+    ident = capture_identity(p)
+    store = metadata_store(cfg)
+    data = store.get(ident)
+    metrics.cache_event(f"metadata.{name}", name in data)
+    if name in data:
+        return data[name]
+    value = compute()
+    store.update(ident, {name: value})
+    return value
+
+
+_hash_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pcap-mcp-sha256")
+_hash_jobs: dict[str, Future] = {}
+_hash_lock = threading.Lock()
+
+
+def _full_sha256(cfg: Config, p: Path, ident: CaptureIdentity) -> str:
+    h = hashlib.sha256()
+    with p.open("rb") as f:
+        while True:
+            chunk = f.read(_HASH_CHUNK_BYTES)
+            if not chunk:
+                break
+            h.update(chunk)
+    digest = h.hexdigest()
+    # Only persist if the file did not change while it was being hashed.
+    if capture_identity(p) == ident:
+        metadata_store(cfg).update(ident, {"sha256": digest})
+    return digest
+
+
+def sha256_status(cfg: Config, p: Path, *, request: bool) -> dict[str, Any]:
+    ident = capture_identity(p)
+    known = metadata_store(cfg).get(ident).get("sha256")
+    if known:
+        return {"sha256": known, "sha256_status": "done"}
+
+    with _hash_lock:
+        fut = _hash_jobs.get(ident.key)
+        if fut is None and request:
+            fut = _hash_executor.submit(metrics.queued("sha256", _full_sha256), cfg, p, ident)
+            _hash_jobs[ident.key] = fut
+    if fut is None:
+        return {"sha256": None, "sha256_status": "not_requested"}
+    if not fut.done():
+        return {"sha256": None, "sha256_status": "pending"}
+
+    with _hash_lock:
+        _hash_jobs.pop(ident.key, None)
+    err: Optional[BaseException] = fut.exception()
+    if err is not None:
+        return {"sha256": None, "sha256_status": "failed", "sha256_error": str(err)}
+    return {"sha256": fut.result(), "sha256_status": "done"}
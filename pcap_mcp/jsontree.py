@@ -0,0 +1,160 @@
+from __future__ import annotations
+
+from fnmatch import fnmatchcase
+import json
+from typing import Any, Iterator, Optional
+
+from .errors import PcapMcpError
+
+
+def _merge_duplicates(pairs: list[tuple[str, Any]]) -> dict[str, Any]:
+    # tshark's JSON repeats keys for repeated fields (e.g. several ProtocolIE items);
+    # keep all of them as a list instead of letting the last one win.
+    out: dict[str, Any] = {}
+    dup: set[str] = set()
+    for k, v in pairs:
+        if k not in out:
+            out[k] = v
+        elif k in dup:
+            out[k].append(v)
+        else:
+            out[k] = [out[k], v]
+            dup.add(k)
+    return out
+
+
+def repair_truncated_json(text: str) -> str:
+    # Cuts a truncated JSON document back to the last complete member/element and closes
+    # the open containers, so a byte-capped tshark -T json stream still parses.
+    stack: list[str] = []
+    cut = 0
+    cut_stack: list[str] = []
+    in_string = False
+    escape = False
+    for i, ch in enumerate(text):
+        if in_string:
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append("}" if ch == "{" else "]")
+            cut, cut_stack = i + 1, list(stack)
+        elif ch in "}]":
+            if stack:
+                stack.pop()
+            cut, cut_stack = i + 1, list(stack)
+        elif ch == ",":
+            cut, cut_stack = i, list(stack)
+    return text[:cut] + "".join(reversed(cut_stack))
+
+
+def parse_tshark_json(text: str, *, truncated: bool) -> tuple[Any, bool]:
+    if not text.strip():
+        return [], False
+    try:
+        return json.loads(text, object_pairs_hook=_merge_duplicates), False
+    except ValueError:
+        if not truncated:
+            raise
+    try:
+        return json.loads(repair_truncated_json(text), object_pairs_hook=_merge_duplicates), True
+    except ValueError as e:
+        raise PcapMcpError("INTERNAL_ERROR", "could not parse truncated tshark json output", {"error": str(e)})
+
+
+def _escape_pointer(key: str) -> str:
+    return key.replace("~", "~0").replace("/", "~1")
+
+
+def _children(node: Any, pointer: str) -> Iterator[tuple[str, str, Any]]:
+    # (key, pointer, value); list elements inherit the key of the list they belong to.
+    if isinstance(node, dict):
+        for k, v in node.items():
+            child = f"{pointer}/{_escape_pointer(k)}"
+            if isinstance(v, list):
+                for i, item in enumerate(v):
+                    yield k, f"{child}/{i}", item
+            else:
+                yield k, child, v
+
+
+def _compile(pattern: str) -> list[str]:
+    segs = [s for s in (pattern or "").strip().split(".") if s != ""]
+    if not segs:
+        raise PcapMcpError("INVALID_ARGUMENT", "empty field path pattern")
+    return segs
+
+
+def _match(segs: list[str], parts: list[str]) -> bool:
+    # A bare "*" segment matches zero or more name segments; other segments use shell-style globs.
+    if not segs:
+        return not parts
+    head, rest = segs[0], segs[1:]
+    if head == "*":
+        return any(_match(rest, parts[i:]) for i in range(len(parts) + 1))
+    return bool(parts) and fnmatchcase(parts[0], head) and _match(rest, parts[1:])
+
+
+def summarize(value: Any, pointer: str) -> Any:
+    if isinstance(value, dict):
+        return {"_collapsed": True, "_children": len(value), "_pointer": pointer}
+    if isinstance(value, list):
+        return {"_collapsed": True, "_items": len(value), "_pointer": pointer}
+    return value
+
+
+def _walk(node: Any, pointer: str) -> Iterator[tuple[str, str, Any]]:
+    for key, child_ptr, value in _children(node, pointer):
+        yield key, child_ptr, value
+        if isinstance(value, dict):
+            yield from _walk(value, child_ptr)
+
+
+def project(tree: Any, patterns: list[str], *, root: str = "", limit: int = 500) -> tuple[list[dict[str, Any]], bool]:
+    compiled = [_compile(p) for p in patterns if (p or "").strip()]
+    matches: list[dict[str, Any]] = []
+    for key, pointer, value in _walk(tree, root):
+        parts = key.split(".")
+        if any(_match(segs, parts) for segs in compiled):
+            if len(matches) >= limit:
+                return matches, True
+            matches.append({"field": key, "pointer": pointer, "value": summarize(value, pointer)})
+    return matches, False
+
+
+def collapse(node: Any, depth: int, pointer: str = "") -> Any:
+    if not isinstance(node, dict):
+        return node
+    if depth <= 0:
+        return summarize(node, pointer)
+    out: dict[str, Any] = {}
+    for k, v in node.items():
+        child = f"{pointer}/{_escape_pointer(k)}"
+        if isinstance(v, list):
+            out[k] = [collapse(item, depth - 1, f"{child}/{i}") for i, item in enumerate(v)]
+        else:
+            out[k] = collapse(v, depth - 1, child)
+    return out
+
+
+def resolve_pointer(tree: Any, pointer: str) -> Optional[Any]:
+    if pointer in ("", "/"):
+        return tree
+    if not pointer.startswith("/"):
+        raise PcapMcpError("INVALID_ARGUMENT", "expand paths must be JSON pointers starting with '/'", {"path": pointer})
+    node = tree
+    for raw in pointer[1:].split("/"):
+        key = raw.replace("~1", "/").replace("~0", "~")
+        if isinstance(node, dict) and key in node:
+            node = node[key]
+        elif isinstance(node, list) and key.isdigit() and int(key) < len(node):
+            node = node[int(key)]
+        else:
+            return None
+    return node
@@ -0,0 +1,199 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+import heapq
+from pathlib import Path
+import statistics
+from typing import Any, Iterator, Optional
+
+from . import metrics
+from .capture_set import _member_rows, index_member
+from .config import Config
+from .errors import PcapMcpError
+from .timewin import and_filters
+from .tshark_tools import timeline
+
+
+MAX_MERGE_CAPTURES = 32
+MIN_CORRELATED_KEYS = 3
+# The same IP packet seen by two probes; override with e.g. sip.Call-ID + sip.CSeq for
+# probes that see different legs of the same signalling.
+DEFAULT_CORRELATE_FIELDS = ("ip.src", "ip.dst", "ip.id", "ip.len")
+
+
+def _first_seen(
+    cfg: Config,
+    p: Path,
+    *,
+    fields: list[str],
+    display_filter: str,
+    decode_as: Optional[list[str]],
+    preferences: Optional[list[str]],
+    protocols: Optional[list[str]],
+) -> dict[tuple[str, ...], float]:
+    # key -> timestamp for keys seen exactly once; repeated keys (retransmissions, id wrap) are ambiguous.
+    res = timeline(
+        cfg,
+        p=p,
+        display_filter=display_filter,
+        decode_as=decode_as,
+        preferences=preferences,
+        protocols=protocols,
+        fields=["frame.time_epoch", *fields],
+        limit=cfg.max_timeline_rows,
+        offset=0,
+    )
+    seen: dict[tuple[str, ...], float] = {}
+    dup: set[tuple[str, ...]] = set()
+    for r in res.rows:
+        key = tuple(str(r.get(f) or "") for f in fields)
+        if not all(key):
+            continue
+        try:
+            ts = float(str(r.get("frame.time_epoch") or ""))
+        except ValueError:
+            continue
+        if key in seen:
+            dup.add(key)
+        else:
+            seen[key] = ts
+    for key in dup:
+        del seen[key]
+    return seen
+
+
+def estimate_offsets(
+    cfg: Config,
+    paths: list[Path],
+    known: dict[int, float],
+    *,
+    fields: list[str],
+    display_filter: str = "",
+    decode_as: Optional[list[str]] = None,
+    preferences: Optional[list[str]] = None,
+    protocols: Optional[list[str]] = None,
+) -> tuple[dict[int, float], list[dict[str, Any]]]:
+    # Offsets (seconds to add to a capture's timestamps) relative to the anchors in `known`
+    # (the first capture if none). Each unresolved capture is aligned to the already-resolved
+    # capture it shares the most keys with, using the median of the per-key time differences,
+    # so the result includes the one-way transit time between the two probes.
+    if not fields:
+        raise PcapMcpError("INVALID_ARGUMENT", "correlate_fields is empty")
+    flt = and_filters(display_filter, " && ".join(fields))
+    workers = max(1, min(int(cfg.capture_set_workers), len(paths)))
+    with ThreadPoolExecutor(max_workers=workers) as ex:
+        samples = list(
+            ex.map(
+                metrics.queued(
+                    "merge",
+                    lambda p: _first_seen(
+                        cfg,
+                        p,
+                        fields=fields,
+                        display_filter=flt,
+                        decode_as=decode_as,
+                        preferences=preferences,
+                        protocols=protocols,
+                    ),
+                ),
+                paths,
+            )
+        )
+
+    offsets = dict(known) if known else {0: 0.0}
+    report: list[dict[str, Any]] = []
+    while True:
+        best: Optional[tuple[int, int, list[float]]] = None
+        for i in range(len(paths)):
+            if i in offsets:
+                continue
+            for a in offsets:
+                common = samples[i].keys() & samples[a].keys()
+                if len(common) >= MIN_CORRELATED_KEYS and (best is None or len(common) > len(best[2])):
+                    best = (i, a, [samples[a][k] - samples[i][k] for k in common])
+        if best is None:
+            break
+        i, a, deltas = best
+        median = statistics.median(deltas)
+        offsets[i] = offsets[a] + median
+        report.append(
+            {
+                "pcap_path": str(paths[i]),
+                "anchor": str(paths[a]),
+                "correlated_keys": len(deltas),
+                "offset_s": round(offsets[i], 6),
+                "spread_s": round(statistics.median(abs(d - median) for d in deltas), 6),
+            }
+        )
+    return offsets, report
+
+
+def merged_timeline(
+    cfg: Config,
+    *,
+    paths: list[Path],
+    offsets: dict[int, float],
+    labels: list[str],
+    display_filter: str,
+    decode_as: Optional[list[str]] = None,
+    preferences: Optional[list[str]] = None,
+    protocols: Optional[list[str]] = None,
+    fields: list[str],
+    limit: int,
+    offset: int,
+    time_from: Optional[float] = None,
+    time_to: Optional[float] = None,
+) -> dict[str, Any]:
+    # Every capture contributes at most limit + offset rows (the most any one capture can
+    # place in the requested page); the page is then cut from a k-way merge by corrected time.
+    if limit < 0 or offset < 0:
+        raise PcapMcpError("INVALID_ARGUMENT", "limit/offset must be non-negative")
+    if limit + offset > cfg.max_timeline_rows:
+        raise PcapMcpError(
+            "INVALID_ARGUMENT",
+            "limit + offset exceeds max_timeline_rows",
+            {"limit": limit, "offset": offset, "max_timeline_rows": cfg.max_timeline_rows},
+        )
+
+    def member(i: int) -> tuple[list[dict[str, Any]], list[str]]:
+        shift = offsets.get(i, 0.0)
+        rows, warnings = _member_rows(
+            cfg,
+            member=index_member(paths[i]),
+            frame_base=0,
+            display_filter=display_filter,
+            decode_as=decode_as,
+            preferences=preferences,
+            protocols=protocols,
+            fields=fields,
+            limit=limit + offset,
+            time_from=time_from - shift if time_from is not None else None,
+            time_to=time_to - shift if time_to is not None else None,
+        )
+        for r in rows:
+            r.pop("frame_number", None)
+            r["label"] = labels[i]
+            r["raw_time_epoch"] = r["time_epoch"]
+            r["time_epoch"] = round(r["time_epoch"] + shift, 9)
+        return rows, warnings
+
+    per_capture: list[list[dict[str, Any]]] = []
+    warnings: list[str] = []
+    if limit > 0:
+        workers = max(1, min(int(cfg.capture_set_workers), len(paths)))
+        with ThreadPoolExecutor(max_workers=workers) as ex:
+            for rows, w in ex.map(metrics.queued("merge", member), range(len(paths))):
+                per_capture.append(rows)
+                warnings.extend(x for x in w if x not in warnings)
+
+    merged: Iterator[dict[str, Any]] = heapq.merge(
+        *per_capture, key=lambda r: (r["time_epoch"], r["capture"], r["capture_frame_number"])
+    )
+    rows: list[dict[str, Any]] = []
+    for i, r in enumerate(merged):
+        if i < offset:
+            continue
+        rows.append(r)
+        if len(rows) >= limit:
+            break
+    return {"rows": rows, "warnings": warnings}
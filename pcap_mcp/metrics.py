@@ -0,0 +1,280 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from contextlib import contextmanager
+import contextvars
+import json
+import os
+from pathlib import Path
+import sys
+import threading
+import time
+from typing import Any, Callable, Iterator, Optional
+
+from .errors import PcapMcpError
+
+
+PREFIX = "pcap_mcp_"
+
+# Upper bounds in seconds; the last bucket is +Inf.
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0,
+)
+
+Labels = tuple[tuple[str, str], ...]
+
+current_tool: contextvars.ContextVar[str] = contextvars.ContextVar("pcap_mcp_current_tool", default="")
+
+
+class Histogram:
+    __slots__ = ("buckets", "count", "sum", "max")
+
+    def __init__(self) -> None:
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, v: float) -> None:
+        self.buckets[bisect_left(LATENCY_BUCKETS, v)] += 1
+        self.count += 1
+        self.sum += v
+        if v > self.max:
+            self.max = v
+
+    def quantile(self, q: float) -> Optional[float]:
+        # Linear interpolation inside the bucket holding the q-th observation, capped by the max.
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for i, n in enumerate(self.buckets):
+            if not n or seen + n < rank:
+                seen += n
+                continue
+            lo = LATENCY_BUCKETS[i - 1] if i > 0 else 0.0
+            hi = LATENCY_BUCKETS[i] if i < len(LATENCY_BUCKETS) else self.max
+            return min(self.max, lo + (hi - lo) * ((rank - seen) / n))
+        return self.max
+
+    def summary(self) -> dict[str, Any]:
+        def r(v: Optional[float]) -> Optional[float]:
+            return round(v, 6) if v is not None else None
+
+        return {
+            "count": self.count,
+            "mean": r(self.sum / self.count) if self.count else None,
+            "p50": r(self.quantile(0.5)),
+            "p90": r(self.quantile(0.9)),
+            "p99": r(self.quantile(0.99)),
+            "max": r(self.max) if self.count else None,
+        }
+
+
+_lock = threading.Lock()
+_counters: dict[tuple[str, Labels], float] = {}
+_histograms: dict[tuple[str, Labels], Histogram] = {}
+_collectors: list[Callable[[], list[tuple[str, dict[str, str], float]]]] = []
+_started = time.time()
+
+
+def _labels(labels: dict[str, Any]) -> Labels:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def inc(name: str, value: float = 1.0, **labels: Any) -> None:
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + value
+
+
+def observe(name: str, seconds: float, **labels: Any) -> None:
+    key = (name, _labels(labels))
+    with _lock:
+        h = _histograms.get(key)
+        if h is None:
+            h = _histograms[key] = Histogram()
+        h.observe(seconds)
+
+
+def cache_event(cache: str, hit: bool) -> None:
+    inc("cache_hits_total" if hit else "cache_misses_total", cache=cache)
+
+
+def register_collector(fn: Callable[[], list[tuple[str, dict[str, str], float]]]) -> None:
+    # For counters kept elsewhere (e.g. functools.lru_cache statistics), read at snapshot time.
+    with _lock:
+        _collectors.append(fn)
+
+
+@contextmanager
+def tool_call(tool: str) -> Iterator[None]:
+    token = current_tool.set(tool)
+    code = "OK"
+    t0 = time.perf_counter()
+    try:
+        yield
+    except PcapMcpError as e:
+        code = e.code
+        raise
+    except Exception:
+        code = "INTERNAL_ERROR"
+        raise
+    finally:
+        elapsed = time.perf_counter() - t0
+        current_tool.reset(token)
+        inc("tool_calls_total", tool=tool, code=code)
+        observe("tool_latency_seconds", elapsed, tool=tool)
+
+
+def queued(queue: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+    # Wraps work handed to an executor: records how long it waited for a worker and keeps
+    # the caller's tool attribution inside the worker thread.
+    ctx = contextvars.copy_context()
+    submitted = time.perf_counter()
+
+    def run(*args: Any, **kwargs: Any) -> Any:
+        observe("queue_wait_seconds", time.perf_counter() - submitted, queue=queue, tool=ctx.get(current_tool, ""))
+        return ctx.copy().run(fn, *args, **kwargs)
+
+    return run
+
+
+def _series() -> tuple[list[tuple[str, Labels, float]], list[tuple[str, Labels, Histogram]]]:
+    with _lock:
+        counters = [(name, labels, v) for (name, labels), v in _counters.items()]
+        histograms = []
+        for (name, labels), h in _histograms.items():
+            copy = Histogram()
+            copy.buckets = list(h.buckets)
+            copy.count, copy.sum, copy.max = h.count, h.sum, h.max
+            histograms.append((name, labels, copy))
+        collectors = list(_collectors)
+    for fn in collectors:
+        try:
+            counters.extend((name, _labels(labels), float(v)) for name, labels, v in fn())
+        except Exception:
+            continue
+    counters.sort(key=lambda x: (x[0], x[1]))
+    histograms.sort(key=lambda x: (x[0], x[1]))
+    return counters, histograms
+
+
+def snapshot() -> dict[str, Any]:
+    counters, histograms = _series()
+    tools: dict[str, dict[str, Any]] = {}
+    for name, labels, v in counters:
+        lab = dict(labels)
+        if name == "tool_calls_total":
+            t = tools.setdefault(lab["tool"], {"calls": 0, "errors": {}})
+            t["calls"] += int(v)
+            if lab.get("code") != "OK":
+                t["errors"][lab["code"]] = t["errors"].get(lab["code"], 0) + int(v)
+    for name, labels, h in histograms:
+        lab = dict(labels)
+        if name == "tool_latency_seconds":
+            tools.setdefault(lab["tool"], {"calls": 0, "errors": {}})["latency_s"] = h.summary()
+
+    return {
+        "uptime_s": round(time.time() - _started, 3),
+        "tools": tools,
+        "counters": [{"name": name, "labels": dict(labels), "value": v} for name, labels, v in counters],
+        "histograms": [{"name": name, "labels": dict(labels), **h.summary()} for name, labels, h in histograms],
+    }
+
+
+def _escape(v: str) -> str:
+    return v.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _prom_labels(labels: Labels, extra: Optional[tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    body = ",".join(f'{k}="{_escape(v)}"' for k, v in items)
+    return "{" + body + "}"
+
+
+def prometheus_text() -> str:
+    counters, histograms = _series()
+    lines: list[str] = []
+    typed: set[str] = set()
+    for name, labels, v in counters:
+        full = PREFIX + name
+        if full not in typed:
+            lines.append(f"# TYPE {full} counter")
+            typed.add(full)
+        lines.append(f"{full}{_prom_labels(labels)} {int(v) if float(v).is_integer() else v}")
+    for name, labels, h in histograms:
+        full = PREFIX + name
+        if full not in typed:
+            lines.append(f"# TYPE {full} histogram")
+            typed.add(full)
+        cumulative = 0
+        for i, n in enumerate(h.buckets):
+            cumulative += n
+            le = f"{LATENCY_BUCKETS[i]:g}" if i < len(LATENCY_BUCKETS) else "+Inf"
+            lines.append(f"{full}_bucket{_prom_labels(labels, ('le', le))} {cumulative}")
+        lines.append(f"{full}_sum{_prom_labels(labels)} {h.sum:.6f}")
+        lines.append(f"{full}_count{_prom_labels(labels)} {h.count}")
+    lines.append(f"# TYPE {PREFIX}uptime_seconds gauge")
+    lines.append(f"{PREFIX}uptime_seconds {time.time() - _started:.3f}")
+    return "\n".join(lines) + "\n"
+
+
+def export_once(fmt: str, path: Optional[Path]) -> None:
+    if fmt == "prometheus":
+        if path is None:
+            return
+        # Write-then-rename so a textfile collector never sees a partial file.
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(prometheus_text(), encoding="utf-8")
+        os.replace(tmp, path)
+    elif fmt == "jsonl":
+        line = json.dumps({"ts": round(time.time(), 3), **snapshot()}, ensure_ascii=False)
+        if path is None:
+            # stdout carries JSON-RPC in stdio mode.
+            print(line, file=sys.stderr, flush=True)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            with path.open("a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+_exporter: Optional[threading.Thread] = None
+_exporter_settings: Optional[tuple[str, Optional[Path], float]] = None
+_exporter_changed = threading.Event()
+_exporter_lock = threading.Lock()
+
+
+def start_exporter(fmt: str, path: Optional[Path], interval_s: float) -> None:
+    # Called at start-up and again on every config reload: a running exporter switches to the
+    # new settings at once, and stops when metrics_export is turned off.
+    global _exporter, _exporter_settings
+    with _exporter_lock:
+        _exporter_settings = (fmt, path, interval_s) if fmt in ("prometheus", "jsonl") else None
+        _exporter_changed.set()
+        if _exporter_settings is None or _exporter is not None:
+            return
+        _exporter = threading.Thread(target=_export_loop, daemon=True, name="pcap-mcp-metrics")
+        _exporter.start()
+
+
+def _export_loop() -> None:
+    global _exporter
+    while True:
+        with _exporter_lock:
+            settings = _exporter_settings
+            _exporter_changed.clear()
+            if settings is None:
+                _exporter = None
+                return
+        fmt, path, interval_s = settings
+        if _exporter_changed.wait(max(1.0, interval_s)):
+            continue
+        try:
+            export_once(fmt, path)
+        except Exception:
+            continue
@@ -0,0 +1,629 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+import random
+import time
+from typing import Any, Iterator, Optional
+
+from . import metrics
+from .config import Config
+from .errors import PcapMcpError
+from .expert import settings_key
+from .identity import capture_identity, metadata_store
+from .proc import check_resources, popen_bytes, read_all_stderr, safe_kill, stdout_rows
+from .results import ResultWriter, new_result_path, open_result
+from .tshark_tools import dissector_args, raise_for_fields_stderr
+
+
+UE_STATES = ("initial", "context_setup", "active", "context_setup_failed", "releasing", "released", "reset", "superseded")
+PDU_STATES = ("nas_requested", "setup_requested", "active", "setup_failed", "nas_rejected", "releasing", "released")
+# Latency samples kept per statistic for percentiles; count/min/max/mean cover every sample.
+RESERVOIR = 4096
+
+# 3GPP TS 38.413 procedure codes.
+PROCEDURES = {
+    4: "DownlinkNASTransport",
+    9: "ErrorIndication",
+    10: "HandoverCancel",
+    11: "HandoverNotification",
+    12: "HandoverPreparation",
+    13: "HandoverResourceAllocation",
+    14: "InitialContextSetup",
+    15: "InitialUEMessage",
+    16: "LocationReportingControl",
+    18: "LocationReport",
+    19: "NASNonDeliveryIndication",
+    20: "NGReset",
+    21: "NGSetup",
+    24: "Paging",
+    25: "PathSwitchRequest",
+    26: "PDUSessionResourceModify",
+    27: "PDUSessionResourceModifyIndication",
+    28: "PDUSessionResourceRelease",
+    29: "PDUSessionResourceSetup",
+    30: "PDUSessionResourceNotify",
+    36: "RerouteNASRequest",
+    37: "RRCInactiveTransitionReport",
+    40: "UEContextModification",
+    41: "UEContextRelease",
+    42: "UEContextReleaseRequest",
+    43: "UERadioCapabilityCheck",
+    44: "UERadioCapabilityInfoIndication",
+    46: "UplinkNASTransport",
+    52: "SecondaryRATDataUsageReport",
+}
+_MESSAGE_KINDS = ("initiating", "successful", "unsuccessful")
+# Procedures after which a context continues on the target gNB.
+_HANDOVER_CODES = frozenset({11, 13, 25})
+# 3GPP TS 24.501 5GSM message types.
+_NAS_SM = {
+    0xC1: "PDUSessionEstablishmentRequest",
+    0xC2: "PDUSessionEstablishmentAccept",
+    0xC3: "PDUSessionEstablishmentReject",
+    0xC9: "PDUSessionModificationRequest",
+    0xCA: "PDUSessionModificationReject",
+    0xCB: "PDUSessionModificationCommand",
+    0xCC: "PDUSessionModificationComplete",
+    0xD1: "PDUSessionReleaseRequest",
+    0xD2: "PDUSessionReleaseReject",
+    0xD3: "PDUSessionReleaseCommand",
+    0xD4: "PDUSessionReleaseComplete",
+}
+_CAUSE_FIELDS = ("ngap.radioNetwork", "ngap.transport", "ngap.nas", "ngap.protocol", "ngap.misc")
+
+FIELDS = [
+    "frame.number",
+    "frame.time_epoch",
+    "ip.src",
+    "ip.dst",
+    "ipv6.src",
+    "ipv6.dst",
+    "ngap.procedureCode",
+    "ngap.NGAP_PDU",
+    "ngap.RAN_UE_NGAP_ID",
+    "ngap.AMF_UE_NGAP_ID",
+    "ngap.pDUSessionID",
+    "ngap.transportLayerAddressIPv4",
+    "ngap.gTP_TEID",
+    *_CAUSE_FIELDS,
+    "nas_5gs.sm.message_type",
+    "nas_5gs.pdu_session_id",
+    "nas_5gs.sm.5gsm_cause",
+    "e212.imsi",
+    "nas_5gs.mm.suci.scheme_output",
+]
+
+
+def _values(raw: str) -> list[str]:
+    return [x for x in raw.split("|") if x != ""] if raw else []
+
+
+def _int(raw: str) -> Optional[int]:
+    try:
+        return int(raw, 0)
+    except ValueError:
+        return None
+
+
+class _Stat:
+    """count/min/max/mean of every sample plus p50/p95 from a fixed-size reservoir."""
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self._sample: list[float] = []
+        self._rng = random.Random(0)
+
+    def add(self, v: float) -> None:
+        self.count += 1
+        self.total += v
+        self.min = v if self.min is None else min(self.min, v)
+        self.max = v if self.max is None else max(self.max, v)
+        if len(self._sample) < RESERVOIR:
+            self._sample.append(v)
+        else:
+            j = self._rng.randrange(self.count)
+            if j < RESERVOIR:
+                self._sample[j] = v
+
+    def summary(self) -> dict[str, Any]:
+        if not self.count:
+            return {"count": 0}
+        s = sorted(self._sample)
+        return {
+            "count": self.count,
+            "min_ms": round(self.min or 0.0, 3),
+            "p50_ms": round(s[len(s) // 2], 3),
+            "p95_ms": round(s[min(len(s) - 1, int(len(s) * 0.95))], 3),
+            "max_ms": round(self.max or 0.0, 3),
+            "mean_ms": round(self.total / self.count, 3),
+        }
+
+
+class NgapTracker:
+    """Streaming UE-context and PDU-session state machines over NGAP (+ NAS 5GSM) rows.
+
+    Only open contexts and sessions are held in memory; finished ones are handed to the
+    `ue_sink`/`pdu_sink` writers as soon as they close, so memory follows the number of
+    concurrently attached UEs rather than the length of the capture.
+
+    UE contexts are keyed by (NG association peers, RAN UE NGAP ID), with the AMF UE NGAP ID
+    as a secondary key so Xn/N2 handovers (PathSwitchRequest, HandoverResourceAllocation)
+    move the context to the target gNB. PDU sessions are keyed by (UE context, pDUSessionID).
+    """
+
+    def __init__(self, ue_sink: ResultWriter, pdu_sink: ResultWriter) -> None:
+        self.ue_sink = ue_sink
+        self.pdu_sink = pdu_sink
+        self.frames = 0
+        self._next_ue = 1
+        self._ues: dict[tuple[str, str], dict[str, Any]] = {}
+        self._by_amf: dict[str, tuple[str, str]] = {}
+        self._sessions: dict[tuple[int, int], dict[str, Any]] = {}
+        self.ue_states: dict[str, int] = {}
+        self.pdu_states: dict[str, int] = {}
+        self.procedures: dict[str, int] = {}
+        self.stats = {
+            "ue_context_setup": _Stat(),
+            "ue_lifetime": _Stat(),
+            "pdu_setup": _Stat(),
+            "pdu_modify": _Stat(),
+            "pdu_release": _Stat(),
+        }
+
+    # UE contexts
+
+    def _new_ue(self, key: tuple[str, str], frame: int, t: float, state: str) -> dict[str, Any]:
+        ue = {
+            "ue": self._next_ue,
+            "peers": key[0],
+            "ran_ue_ngap_id": key[1],
+            "amf_ue_ngap_id": "",
+            "imsi": "",
+            "suci": "",
+            "state": state,
+            "started_in_capture": state == "initial",
+            "first_frame": frame,
+            "last_frame": frame,
+            "start": t,
+            "end": t,
+            "context_setup_ms": None,
+            "release_cause": "",
+            "handovers": 0,
+            "pdu_sessions": [],
+            "procedures": {},
+            "_pending": {},
+        }
+        self._next_ue += 1
+        self._ues[key] = ue
+        return ue
+
+    def _ue(self, peers: str, ran: str, amf: str, frame: int, t: float, code: int) -> Optional[dict[str, Any]]:
+        # The context a message belongs to, created on first sight (a capture may start with
+        # the UE already attached).
+        if not ran and not amf:
+            return None
+        key = (peers, ran)
+        if code == 15 and key in self._ues:
+            self._close_ue(self._ues[key], "superseded")
+        ue = self._ues.get(key) if ran else None
+        if ue is None and amf and amf in self._by_amf:
+            old = self._by_amf[amf]
+            ue = self._ues.get(old)
+            if ue is not None and ran and old != key and code in _HANDOVER_CODES:
+                # Handover: the context continues on the target gNB under its new RAN UE NGAP ID.
+                del self._ues[old]
+                ue["peers"], ue["ran_ue_ngap_id"] = key
+                ue["handovers"] += 1
+                self._ues[key] = ue
+                self._by_amf[amf] = key
+        if ue is None:
+            if not ran:
+                return None
+            ue = self._new_ue(key, frame, t, "initial" if code == 15 else "active")
+        if amf and ue["amf_ue_ngap_id"] != amf:
+            self._by_amf.pop(ue["amf_ue_ngap_id"], None)
+            ue["amf_ue_ngap_id"] = amf
+            self._by_amf[amf] = (ue["peers"], ue["ran_ue_ngap_id"])
+        ue["last_frame"] = frame
+        ue["end"] = t
+        return ue
+
+    def _close_ue(self, ue: dict[str, Any], state: str) -> None:
+        ue["state"] = state
+        self._ues.pop((ue["peers"], ue["ran_ue_ngap_id"]), None)
+        if self._by_amf.get(ue["amf_ue_ngap_id"]) == (ue["peers"], ue["ran_ue_ngap_id"]):
+            del self._by_amf[ue["amf_ue_ngap_id"]]
+        for sid in ue["pdu_sessions"]:
+            s = self._sessions.get((ue["ue"], sid))
+            if s is not None:
+                ended = state in ("released", "reset") and s["state"] not in ("setup_failed", "nas_rejected")
+                self._close_session(s, "released" if ended else s["state"], ue["end"], ue["last_frame"])
+        self._emit_ue(ue)
+
+    def _emit_ue(self, ue: dict[str, Any]) -> None:
+        ue.pop("_pending", None)
+        duration = ue["end"] - ue["start"]
+        ue["duration_s"] = round(duration, 6)
+        if ue["state"] in ("released", "reset"):
+            self.stats["ue_lifetime"].add(duration * 1000.0)
+        self.ue_states[ue["state"]] = self.ue_states.get(ue["state"], 0) + 1
+        self.ue_sink.add(ue)
+
+    # PDU sessions
+
+    def _session(self, ue: dict[str, Any], sid: int, frame: int, t: float, state: str) -> dict[str, Any]:
+        key = (ue["ue"], sid)
+        s = self._sessions.get(key)
+        if s is None or s["state"] in ("released", "setup_failed", "nas_rejected"):
+            if s is not None:
+                self._emit_session(s)
+            s = self._sessions[key] = {
+                "ue": ue["ue"],
+                "amf_ue_ngap_id": ue["amf_ue_ngap_id"],
+                "pdu_session_id": sid,
+                "state": state,
+                "first_frame": frame,
+                "last_frame": frame,
+                "start": t,
+                "end": t,
+                "setup_ms": None,
+                "modifications": 0,
+                "modify_failures": 0,
+                "release_cause": "",
+                "failure_cause": "",
+                "ul_tunnel": None,
+                "dl_tunnel": None,
+                "nas": {},
+                "_pending": {},
+            }
+            if sid not in ue["pdu_sessions"]:
+                ue["pdu_sessions"].append(sid)
+        s["last_frame"] = frame
+        s["end"] = t
+        return s
+
+    def _close_session(self, s: dict[str, Any], state: str, t: float, frame: int) -> None:
+        s["state"] = state
+        s["end"] = max(s["end"], t)
+        s["last_frame"] = max(s["last_frame"], frame)
+        self._sessions.pop((s["ue"], s["pdu_session_id"]), None)
+        self._emit_session(s)
+
+    def _emit_session(self, s: dict[str, Any]) -> None:
+        s.pop("_pending", None)
+        s["duration_s"] = round(s["end"] - s["start"], 6)
+        self.pdu_states[s["state"]] = self.pdu_states.get(s["state"], 0) + 1
+        self.pdu_sink.add(s)
+
+    @staticmethod
+    def _answer(obj: dict[str, Any], proc: str, t: float) -> Optional[float]:
+        started = obj["_pending"].pop(proc, None)
+        return None if started is None else (t - started) * 1000.0
+
+    # Rows
+
+    def feed(self, row: dict[str, str]) -> None:
+        frame = _int(row.get("frame.number", "")) or 0
+        try:
+            t = float(row.get("frame.time_epoch") or 0.0)
+        except ValueError:
+            t = 0.0
+        self.frames += 1
+        src = row.get("ip.src") or row.get("ipv6.src") or ""
+        dst = row.get("ip.dst") or row.get("ipv6.dst") or ""
+        peers = "<->".join(sorted((src, dst)))
+
+        codes = [c for c in (_int(v) for v in _values(row.get("ngap.procedureCode", ""))) if c is not None]
+        kinds = [_int(v) for v in _values(row.get("ngap.NGAP_PDU", ""))]
+        rans = _values(row.get("ngap.RAN_UE_NGAP_ID", ""))
+        amfs = _values(row.get("ngap.AMF_UE_NGAP_ID", ""))
+        sids = [s for s in (_int(v) for v in _values(row.get("ngap.pDUSessionID", ""))) if s is not None]
+        causes = [f"{f.split('.', 1)[1]}={v}" for f in _CAUSE_FIELDS for v in _values(row.get(f, ""))]
+        tunnels = list(zip(_values(row.get("ngap.transportLayerAddressIPv4", "")), _values(row.get("ngap.gTP_TEID", ""))))
+
+        # SCTP may bundle several NGAP PDUs into one frame; the IDs are paired by position when
+        # every PDU carries them, otherwise the frame's first IDs apply to all of them.
+        bundled = len(codes) > 1
+        for i, code in enumerate(codes):
+            kind_idx = kinds[i] if i < len(kinds) and kinds[i] is not None else 0
+            kind = _MESSAGE_KINDS[kind_idx] if 0 <= kind_idx < len(_MESSAGE_KINDS) else "initiating"
+            ran = rans[i] if bundled and len(rans) == len(codes) else (rans[0] if rans else "")
+            amf = amfs[i] if bundled and len(amfs) == len(codes) else (amfs[0] if amfs else "")
+            self._message(
+                peers,
+                code,
+                kind,
+                ran,
+                amf,
+                frame,
+                t,
+                sids=[] if bundled else sids,
+                causes=[] if bundled else causes,
+                tunnels=[] if bundled else tunnels,
+                ran_list=rans,
+                row=row,
+            )
+
+    def _message(
+        self,
+        peers: str,
+        code: int,
+        kind: str,
+        ran: str,
+        amf: str,
+        frame: int,
+        t: float,
+        *,
+        sids: list[int],
+        causes: list[str],
+        tunnels: list[tuple[str, str]],
+        ran_list: list[str],
+        row: dict[str, str],
+    ) -> None:
+        proc = PROCEDURES.get(code, f"procedure_{code}")
+        name = f"{proc}.{kind}"
+        self.procedures[name] = self.procedures.get(name, 0) + 1
+
+        if code == 20:
+            # NGReset ends the listed contexts of the association, or all of them.
+            if kind == "initiating":
+                rans = set(ran_list)
+                for key in [k for k in self._ues if k[0] == peers and (not rans or k[1] in rans)]:
+                    ue = self._ues[key]
+                    ue["end"], ue["last_frame"], ue["release_cause"] = t, frame, ",".join(causes)
+                    self._close_ue(ue, "reset")
+            return
+
+        ue = self._ue(peers, ran, amf, frame, t, code)
+        if ue is None:
+            return
+        ue["procedures"][name] = ue["procedures"].get(name, 0) + 1
+        if not ue["imsi"]:
+            ue["imsi"] = row.get("e212.imsi", "").split("|")[0]
+        if not ue["suci"]:
+            ue["suci"] = row.get("nas_5gs.mm.suci.scheme_output", "").split("|")[0]
+
+        if code == 14:
+            if kind == "initiating":
+                ue["state"] = "context_setup"
+                ue["_pending"][proc] = t
+            else:
+                ms = self._answer(ue, proc, t)
+                if kind == "successful":
+                    ue["state"] = "active"
+                    if ms is not None:
+                        ue["context_setup_ms"] = round(ms, 3)
+                        self.stats["ue_context_setup"].add(ms)
+                else:
+                    ue["state"] = "context_setup_failed"
+                    ue["release_cause"] = ",".join(causes)
+        elif code == 42:
+            ue["release_cause"] = ",".join(causes)
+        elif code == 41:
+            if (peers, ran) != (ue["peers"], ue["ran_ue_ngap_id"]):
+                # Release of the source leg after a handover; the context itself lives on.
+                return
+            if kind == "initiating":
+                ue["state"] = "releasing"
+                ue["release_cause"] = ",".join(causes) or ue["release_cause"]
+            else:
+                self._close_ue(ue, "released")
+                return
+
+        self._pdu(ue, code, proc, kind, frame, t, sids=sids, causes=causes, tunnels=tunnels)
+        self._nas(ue, frame, t, row)
+
+    def _pdu(
+        self,
+        ue: dict[str, Any],
+        code: int,
+        proc: str,
+        kind: str,
+        frame: int,
+        t: float,
+        *,
+        sids: list[int],
+        causes: list[str],
+        tunnels: list[tuple[str, str]],
+    ) -> None:
+        if code not in (14, 26, 28, 29) or not sids:
+            return
+        # Responses list the successful items before the failed ones, and every failed item
+        # carries one cause, so the last len(causes) session IDs are the failed ones.
+        failed = set(sids[len(sids) - len(causes) :]) if kind != "initiating" and causes else set()
+        if kind == "unsuccessful":
+            failed = set(sids)
+        tunnel = {"ipv4": tunnels[0][0], "teid": tunnels[0][1]} if len(sids) == 1 and tunnels else None
+        for sid in sids:
+            if code in (14, 29):
+                if kind == "initiating":
+                    s = self._session(ue, sid, frame, t, "setup_requested")
+                    s["state"] = "setup_requested"
+                    s["_pending"]["setup"] = t
+                    s["ul_tunnel"] = tunnel or s["ul_tunnel"]
+                    continue
+                s = self._sessions.get((ue["ue"], sid))
+                if s is None:
+                    continue
+                ms = self._answer(s, "setup", t)
+                s["end"], s["last_frame"] = t, frame
+                if sid in failed:
+                    s["state"] = "setup_failed"
+                    s["failure_cause"] = ",".join(causes)
+                else:
+                    s["state"] = "active"
+                    s["dl_tunnel"] = tunnel or s["dl_tunnel"]
+                    if ms is not None:
+                        s["setup_ms"] = round(ms, 3)
+                        self.stats["pdu_setup"].add(ms)
+            elif code == 26:
+                s = self._session(ue, sid, frame, t, "active")
+                if kind == "initiating":
+                    s["_pending"]["modify"] = t
+                    continue
+                ms = self._answer(s, "modify", t)
+                if sid in failed:
+                    s["modify_failures"] += 1
+                else:
+                    s["modifications"] += 1
+                    if ms is not None:
+                        self.stats["pdu_modify"].add(ms)
+            else:
+                s = self._session(ue, sid, frame, t, "active")
+                if kind == "initiating":
+                    s["state"] = "releasing"
+                    s["release_cause"] = ",".join(causes)
+                    s["_pending"]["release"] = t
+                    continue
+                ms = self._answer(s, "release", t)
+                if ms is not None:
+                    self.stats["pdu_release"].add(ms)
+                self._close_session(s, "released", t, frame)
+
+    def _nas(self, ue: dict[str, Any], frame: int, t: float, row: dict[str, str]) -> None:
+        types = [_int(v) for v in _values(row.get("nas_5gs.sm.message_type", ""))]
+        sids = [_int(v) for v in _values(row.get("nas_5gs.pdu_session_id", ""))]
+        if not types or not sids or sids[0] is None:
+            return
+        sid = sids[0]
+        for mt in types:
+            name = _NAS_SM.get(mt or 0)
+            if name is None:
+                continue
+            s = self._sessions.get((ue["ue"], sid))
+            if s is None:
+                if mt != 0xC1:
+                    continue
+                s = self._session(ue, sid, frame, t, "nas_requested")
+            s["nas"][name] = s["nas"].get(name, 0) + 1
+            if mt == 0xC3:
+                cause = row.get("nas_5gs.sm.5gsm_cause", "").split("|")[0]
+                s["failure_cause"] = f"5gsm={cause}" if cause else s["failure_cause"]
+                if s["state"] == "nas_requested":
+                    s["state"] = "nas_rejected"
+
+    def finish(self) -> None:
+        # Contexts and sessions still open at the end of the capture keep their last state.
+        for s in list(self._sessions.values()):
+            self._emit_session(s)
+        self._sessions.clear()
+        for ue in list(self._ues.values()):
+            self._emit_ue(ue)
+        self._ues.clear()
+        self._by_amf.clear()
+
+
+def ngap_sessions(
+    cfg: Config,
+    *,
+    p: Path,
+    ue_path: Path,
+    pdu_path: Path,
+    decode_as: Optional[list[str]] = None,
+    preferences: Optional[list[str]] = None,
+    protocols: Optional[list[str]] = None,
+) -> dict[str, Any]:
+    # One tshark pass over the NGAP frames; rows are fed to the state machines as they arrive.
+    args: list[str] = [cfg.tshark_path]
+    args += dissector_args(decode_as, preferences, protocols)
+    args += ["-r", str(p), "-Y", "ngap", "-T", "fields", "-E", "separator=\t", "-E", "occurrence=a", "-E", "aggregator=|"]
+    for f in FIELDS:
+        args += ["-e", f]
+
+    ue_writer = ResultWriter(ue_path, fmt="ndjson", fields=[])
+    pdu_writer = ResultWriter(pdu_path, fmt="ndjson", fields=[])
+    tracker = NgapTracker(ue_writer, pdu_writer)
+    proc = popen_bytes(args, policy=cfg.resource_policies.get("export"))
+    started = time.time()
+    try:
+        if not proc.stdout:
+            raise PcapMcpError("INTERNAL_ERROR", "tshark produced no stdout")
+
+        for batch in stdout_rows(proc, columns=range(len(FIELDS))):
+            if cfg.export_timeout_s and (time.time() - started) > cfg.export_timeout_s:
+                raise PcapMcpError("TIMEOUT", "tshark export timed out")
+            for cols in batch:
+                if cols[0].isdigit():
+                    tracker.feed(dict(zip(FIELDS, cols)))
+
+        stderr = read_all_stderr(proc).strip()
+        proc.wait()
+        check_resources(proc, stderr)
+        raise_for_fields_stderr(cfg, stderr, fields=FIELDS, display_filter="ngap")
+        if proc.returncode not in (0, None) and not tracker.frames:
+            raise PcapMcpError("INTERNAL_ERROR", "tshark NGAP session scan failed", {"stderr": stderr})
+        tracker.finish()
+        scan_s = round(time.time() - started, 3)
+        ue_writer.close(pcap_path=str(p))
+        pdu_writer.close(pcap_path=str(p))
+    except BaseException:
+        ue_writer.abort()
+        pdu_writer.abort()
+        raise
+    finally:
+        if proc.poll() is None:
+            safe_kill(proc)
+
+    return {
+        "ngap_frames": tracker.frames,
+        "scan_s": scan_s,
+        "ue_contexts": sum(tracker.ue_states.values()),
+        "ue_states": tracker.ue_states,
+        "pdu_sessions": sum(tracker.pdu_states.values()),
+        "pdu_states": tracker.pdu_states,
+        "procedures": dict(sorted(tracker.procedures.items(), key=lambda kv: -kv[1])),
+        "latency": {k: v.summary() for k, v in tracker.stats.items()},
+        "ue_handle": ue_path.name,
+        "pdu_handle": pdu_path.name,
+    }
+
+
+def cached_ngap_sessions(
+    cfg: Config,
+    *,
+    p: Path,
+    decode_as: Optional[list[str]] = None,
+    preferences: Optional[list[str]] = None,
+    protocols: Optional[list[str]] = None,
+) -> dict[str, Any]:
+    # The summary is kept under one "ngap_sessions" metadata entry keyed by the dissector
+    # arguments; the per-UE and per-session records live in two result files next to it.
+    ident = capture_identity(p)
+    store = metadata_store(cfg)
+    key = settings_key(decode_as, preferences, protocols)
+    known = store.get(ident).get("ngap_sessions") or {}
+    value = known.get(key)
+    if value is not None:
+        try:
+            open_result(cfg, value["ue_handle"])
+            open_result(cfg, value["pdu_handle"])
+        except PcapMcpError:
+            value = None
+    metrics.cache_event("metadata.ngap_sessions", value is not None)
+    if value is not None:
+        return value
+    base = f"ngap.{ident.key}.{key}"
+    value = ngap_sessions(
+        cfg,
+        p=p,
+        ue_path=new_result_path(cfg, f"{base}.ue_sessions", "ndjson"),
+        pdu_path=new_result_path(cfg, f"{base}.pdu_sessions", "ndjson"),
+        decode_as=decode_as,
+        preferences=preferences,
+        protocols=protocols,
+    )
+    known = dict(store.get(ident).get("ngap_sessions") or {})
+    known[key] = value
+    store.update(ident, {"ngap_sessions": known})
+    return value
+
+
+def iter_records(cfg: Config, handle: str) -> Iterator[dict[str, Any]]:
+    path, _ = open_result(cfg, handle)
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
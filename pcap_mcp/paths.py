@@ -1,9 +1,46 @@
 from __future__ import annotations
 
 from pathlib import Path
+import threading
 
+from .catalog import get_catalog
 from .config import Config
 from .errors import PcapMcpError
+from .identity import capture_identity, metadata_store
+
+
+# Captures written by the server itself (e.g. subcaptures under output_dir) are readable
+# even though output_dir is usually not listed in allowed_pcap_dirs. Registrations are also
+# recorded in the metadata store under the capture identity, so they survive a restart and
+# lapse once the file is rewritten.
+_registered_captures: set[str] = set()
+_registered_lock = threading.Lock()
+
+
+def register_capture(cfg: Config, p: Path) -> None:
+    p = p.resolve()
+    with _registered_lock:
+        _registered_captures.add(str(p))
+    try:
+        metadata_store(cfg).update(capture_identity(p), {"registered_path": str(p)})
+    except OSError:
+        pass
+
+
+def _is_registered(cfg: Config, p: Path) -> bool:
+    with _registered_lock:
+        if str(p) in _registered_captures:
+            return True
+    if not _is_relative_to(p, cfg.output_dir) or not p.is_file():
+        return False
+    try:
+        registered = metadata_store(cfg).get(capture_identity(p)).get("registered_path") == str(p)
+    except OSError:
+        return False
+    if registered:
+        with _registered_lock:
+            _registered_captures.add(str(p))
+    return registered
 
 
 def _is_relative_to(path: Path, base: Path) -> bool:
@@ -17,9 +54,49 @@ def _is_relative_to(path: Path, base: Path) -> bool:
             return False
 
 
-def validate_pcap_path(cfg: Config, pcap_path: str) -> Path:
+def _catalog_match(cfg: Config, raw: Path) -> list[Path]:
+    cat = get_catalog(cfg)
+    matches = cat.lookup(str(raw))
+    if not matches:
+        # New files show up after an incremental rescan; unchanged directories are not re-listed,
+        # and repeated misses within MISS_REFRESH_INTERVAL_S reuse the last walk.
+        if cat.refresh_on_miss():
+            matches = cat.lookup(str(raw))
+    if matches and not raw.is_absolute():
+        cwd_entry = cat.lookup(str(Path.cwd() / raw))
+        matches = [*matches, *(m for m in cwd_entry if m not in matches)]
+    # Catalog entries are re-checked against allowed_pcap_dirs: a symlink (or a symlinked
+    # parent directory) may have been retargeted since the directory was listed.
+    resolved = [m.resolve() for m in matches]
+    return [m for m in resolved if m.is_file() and any(_is_relative_to(m, d) for d in cfg.allowed_pcap_dirs)]
+
+
+def validate_pcap_path(cfg: Config, pcap_path: str, *, remember: bool = True, catalog: bool = True) -> Path:
+    # Validated captures are remembered as recently used; start-up warm-up pre-indexes them.
+    # catalog=False resolves without the capture catalog (and so never triggers a directory walk).
+    p = _resolve_pcap_path(cfg, pcap_path, catalog=catalog)
+    if remember:
+        metadata_store(cfg).touch_recent(p)
+    return p
+
+
+def _resolve_pcap_path(cfg: Config, pcap_path: str, *, catalog: bool = True) -> Path:
     raw = Path(pcap_path).expanduser()
     allow_any_abs = bool(cfg.allow_any_pcap_path) and raw.is_absolute()
+
+    if raw.is_absolute() and _is_registered(cfg, raw.resolve()) and raw.is_file():
+        return raw.resolve()
+
+    catalog_matches = _catalog_match(cfg, raw) if catalog else []
+    if len(catalog_matches) == 1:
+        return catalog_matches[0]
+    if len(catalog_matches) > 1:
+        raise PcapMcpError(
+            "AMBIGUOUS_PCAP_PATH",
+            "multiple pcaps matched",
+            {"pcap_path": pcap_path, "matches": [str(x) for x in catalog_matches]},
+        )
+
     candidates: list[Path] = []
     if raw.is_absolute():
         candidates.append(raw.resolve())
@@ -27,6 +104,7 @@ def validate_pcap_path(cfg: Config, pcap_path: str) -> Path:
         candidates.append(raw.resolve())
         for d in cfg.allowed_pcap_dirs:
             candidates.append((d / raw).resolve())
+        candidates.append((cfg.output_dir / raw).resolve())
 
     matches: list[Path] = []
     for c in candidates:
@@ -38,7 +116,7 @@ def validate_pcap_path(cfg: Config, pcap_path: str) -> Path:
             matches.append(c)
             continue
 
-        if any(_is_relative_to(c, d) for d in cfg.allowed_pcap_dirs):
+        if any(_is_relative_to(c, d) for d in cfg.allowed_pcap_dirs) or _is_registered(cfg, c):
             matches.append(c)
 
     uniq: list[Path] = []
@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import mmap
+from pathlib import Path
+import struct
+from typing import Iterator, NamedTuple, Optional
+
+from .errors import PcapMcpError
+
+
+PCAP_MAGIC_USEC = 0xA1B2C3D4
+PCAP_MAGIC_NSEC = 0xA1B23C4D
+PCAPNG_SHB = 0x0A0D0D0A
+PCAPNG_BYTE_ORDER_MAGIC = 0x1A2B3C4D
+
+_PCAPNG_IDB = 0x00000001
+_PCAPNG_PB = 0x00000002
+_PCAPNG_SPB = 0x00000003
+_PCAPNG_EPB = 0x00000006
+
+_PCAP_GLOBAL_HEADER_LEN = 24
+_PCAP_RECORD_HEADER_LEN = 16
+
+
+class Record(NamedTuple):
+    offset: int
+    size: int
+    ts: Optional[float]
+    data_offset: int
+    caplen: int
+    interface: int
+
+
+def detect_format(p: Path) -> str:
+    try:
+        with p.open("rb") as f:
+            head = f.read(4)
+    except OSError:
+        return ""
+    if len(head) < 4:
+        return ""
+    for endian in ("<", ">"):
+        (magic,) = struct.unpack(endian + "I", head)
+        if magic in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+            return "pcap"
+        if magic == PCAPNG_SHB:
+            return "pcapng"
+    return ""
+
+
+def _tsresol_units(raw: int) -> int:
+    if raw & 0x80:
+        return 2 ** (raw & 0x7F)
+    return 10 ** (raw & 0x7F)
+
+
+class CaptureFile:
+    def __init__(self, p: Path) -> None:
+        self.path = p
+        self.format = detect_format(p)
+        if not self.format:
+            raise PcapMcpError("INVALID_ARGUMENT", "not a pcap/pcapng file", {"pcap_path": str(p)})
+
+        self._fh = p.open("rb")
+        size = p.stat().st_size
+        self._mm: Optional[mmap.mmap] = None
+        if size > 0:
+            self._mm = mmap.mmap(self._fh.fileno(), 0, access=mmap.ACCESS_READ)
+        self.buf = memoryview(self._mm) if self._mm is not None else memoryview(b"")
+        self.size = len(self.buf)
+
+        self.endian = "<"
+        self.linktypes: list[int] = []
+        self._ts_units: list[int] = []
+        self.sections = 0
+        self.preamble = b""
+        self.data_offset = 0
+        self.end_offset = 0
+        self.late_interfaces = False
+
+        try:
+            if self.format == "pcap":
+                self._init_pcap()
+            else:
+                self._init_pcapng()
+        except Exception:
+            self.close()
+            raise
+
+    def close(self) -> None:
+        try:
+            self.buf.release()
+        except Exception:
+            pass
+        if self._mm is not None:
+            try:
+                self._mm.close()
+            except Exception:
+                pass
+        try:
+            self._fh.close()
+        except Exception:
+            pass
+
+    def __enter__(self) -> "CaptureFile":
+        return self
+
+    def __exit__(self, *_exc: object) -> None:
+        self.close()
+
+    def _init_pcap(self) -> None:
+        if self.size < _PCAP_GLOBAL_HEADER_LEN:
+            raise PcapMcpError("INVALID_ARGUMENT", "truncated pcap header", {"pcap_path": str(self.path)})
+        (magic,) = struct.unpack_from("<I", self.buf, 0)
+        if magic in (PCAP_MAGIC_USEC, PCAP_MAGIC_NSEC):
+            self.endian = "<"
+        else:
+            self.endian = ">"
+            (magic,) = struct.unpack_from(">I", self.buf, 0)
+        linktype = struct.unpack_from(self.endian + "I", self.buf, 20)[0] & 0x0FFFFFFF
+        self.linktypes = [linktype]
+        self._ts_units = [1_000_000_000 if magic == PCAP_MAGIC_NSEC else 1_000_000]
+        self.sections = 1
+        self.preamble = bytes(self.buf[:_PCAP_GLOBAL_HEADER_LEN])
+        self.data_offset = _PCAP_GLOBAL_HEADER_LEN
+        self.end_offset = _PCAP_GLOBAL_HEADER_LEN
+
+    def _init_pcapng(self) -> None:
+        if self.size < 28:
+            raise PcapMcpError("INVALID_ARGUMENT", "truncated pcapng header", {"pcap_path": str(self.path)})
+        off = 0
+        while off + 12 <= self.size:
+            btype, blen = self._block_header(off)
+            if blen < 12 or off + blen > self.size:
+                break
+            if btype in (_PCAPNG_EPB, _PCAPNG_PB, _PCAPNG_SPB):
+                break
+            self._apply_block(off, btype, blen)
+            off += blen
+        self.preamble = bytes(self.buf[:off])
+        self.data_offset = off
+        self.end_offset = off
+
+    def _block_header(self, off: int) -> tuple[int, int]:
+        (btype,) = struct.unpack_from(self.endian + "I", self.buf, off)
+        if btype == PCAPNG_SHB:
+            (bom,) = struct.unpack_from("<I", self.buf, off + 8)
+            self.endian = "<" if bom == PCAPNG_BYTE_ORDER_MAGIC else ">"
+        (blen,) = struct.unpack_from(self.endian + "I", self.buf, off + 4)
+        return btype, blen
+
+    def _apply_block(self, off: int, btype: int, blen: int) -> None:
+        if btype == PCAPNG_SHB:
+            self.sections += 1
+            self.linktypes = []
+            self._ts_units = []
+        elif btype == _PCAPNG_IDB:
+            (linktype,) = struct.unpack_from(self.endian + "H", self.buf, off + 8)
+            units = 1_000_000
+            opt = off + 16
+            end = off + blen - 4
+            while opt + 4 <= end:
+                code, olen = struct.unpack_from(self.endian + "HH", self.buf, opt)
+                if code == 0:
+                    break
+                if code == 9 and olen >= 1:
+                    units = _tsresol_units(self.buf[opt + 4])
+                opt += 4 + ((olen + 3) & ~3)
+            self.linktypes.append(linktype)
+            self._ts_units.append(units)
+
+    def linktype_for(self, interface: int) -> int:
+        if 0 <= interface < len(self.linktypes):
+            return self.linktypes[interface]
+        return -1
+
+    def iter_records(self, start: Optional[int] = None) -> Iterator[Record]:
+        # end_offset always points just past the last complete block, so a file that is
+        # still being written can be resumed from there once more bytes arrive.
+        off = self.data_offset if start is None else int(start)
+        if self.format == "pcap":
+            yield from self._iter_pcap(off)
+        else:
+            yield from self._iter_pcapng(off)
+
+    def _iter_pcap(self, off: int) -> Iterator[Record]:
+        buf = self.buf
+        size = self.size
+        hdr = struct.Struct(self.endian + "IIII")
+        units = self._ts_units[0]
+        while off + _PCAP_RECORD_HEADER_LEN <= size:
+            ts_sec, ts_frac, caplen, _origlen = hdr.unpack_from(buf, off)
+            rec_size = _PCAP_RECORD_HEADER_LEN + caplen
+            if off + rec_size > size:
+                break
+            yield Record(off, rec_size, ts_sec + ts_frac / units, off + _PCAP_RECORD_HEADER_LEN, caplen, 0)
+            off += rec_size
+            self.end_offset = off
+
+    def _iter_pcapng(self, off: int) -> Iterator[Record]:
+        buf = self.buf
+        size = self.size
+        while off + 12 <= size:
+            btype, blen = self._block_header(off)
+            if blen < 12 or off + blen > size:
+                break
+            e = self.endian
+            if btype == _PCAPNG_EPB:
+                iface, ts_hi, ts_lo, caplen = struct.unpack_from(e + "IIII", buf, off + 8)
+                units = self._ts_units[iface] if iface < len(self._ts_units) else 1_000_000
+                yield Record(off, blen, ((ts_hi << 32) | ts_lo) / units, off + 28, caplen, iface)
+            elif btype == _PCAPNG_PB:
+                iface, _drops, ts_hi, ts_lo, caplen = struct.unpack_from(e + "HHIII", buf, off + 8)
+                units = self._ts_units[iface] if iface < len(self._ts_units) else 1_000_000
+                yield Record(off, blen, ((ts_hi << 32) | ts_lo) / units, off + 28, caplen, iface)
+            elif btype == _PCAPNG_SPB:
+                (origlen,) = struct.unpack_from(e + "I", buf, off + 8)
+                yield Record(off, blen, None, off + 12, min(origlen, blen - 16), 0)
+            else:
+                if btype in (PCAPNG_SHB, _PCAPNG_IDB):
+                    self.late_interfaces = True
+                self._apply_block(off, btype, blen)
+            off += blen
+            self.end_offset = off
+
+
+def first_last_timestamps(p: Path) -> tuple[Optional[float], Optional[float], int]:
+    first: Optional[float] = None
+    last: Optional[float] = None
+    count = 0
+    with CaptureFile(p) as cf:
+        for rec in cf.iter_records():
+            count += 1
+            if rec.ts is None:
+                continue
+            if first is None:
+                first = rec.ts
+            last = rec.ts
+    return first, last, count
@@ -1,8 +1,26 @@
 from __future__ import annotations
 
+import csv
 from dataclasses import dataclass
+import os
+from pathlib import Path
+import shutil
+import signal
 import subprocess
-from typing import Iterable, Optional
+import threading
+import time
+from typing import IO, Iterable, Iterator, Optional, Sequence, Union
+
+from . import metrics, profiling
+from .config import ResourcePolicy
+from .errors import PcapMcpError
+
+_RSS_SAMPLE_INTERVAL_S = 0.2
+_TERMINATE_GRACE_S = 1.0
+_IONICE_CLASSES = {"best-effort": "2", "idle": "3"}
+# stdout_rows(): bytes per readinto() and rows per batch handed to the caller.
+STDOUT_CHUNK_BYTES = 1 << 20
+ROW_BATCH = 1024
 
 
 @dataclass(frozen=True)
@@ -12,11 +30,134 @@ class ProcResult:
     stderr: str
 
 
+class RssWatchdog(threading.Thread):
+    def __init__(self, p: subprocess.Popen[str], policy: ResourcePolicy) -> None:
+        super().__init__(daemon=True, name=f"pcap-mcp-rss-{p.pid}")
+        self.proc = p
+        self.policy = policy
+        self.limit_kb = int(policy.max_rss_mb) * 1024
+        self.peak_kb = 0
+        self.exceeded = False
+
+    def run(self) -> None:
+        status = Path(f"/proc/{self.proc.pid}/status")
+        while self.proc.returncode is None:
+            rss_kb = _read_rss_kb(status)
+            if rss_kb is None:
+                return
+            self.peak_kb = max(self.peak_kb, rss_kb)
+            if rss_kb > self.limit_kb:
+                self.exceeded = True
+                _terminate(self.proc)
+                return
+            time.sleep(_RSS_SAMPLE_INTERVAL_S)
+
+
+def _read_rss_kb(status: Path) -> Optional[int]:
+    try:
+        for line in status.read_text().splitlines():
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    # Zombies have no VmRSS line.
+    return None
+
+
+def _terminate(p: subprocess.Popen[str]) -> None:
+    try:
+        p.terminate()
+        p.wait(timeout=_TERMINATE_GRACE_S)
+    except subprocess.TimeoutExpired:
+        safe_kill(p)
+    except Exception:
+        return
+
+
+def _policy_args(args: list[str], policy: Optional[ResourcePolicy]) -> list[str]:
+    # Limits are applied by exec'ing through nice/ionice/prlimit (each execs the next, so
+    # tshark keeps the pid and its exit status) rather than in a preexec_fn, which is not
+    # safe to run in a forked child of a multi-threaded server. Missing wrappers are skipped.
+    if policy is None:
+        return list(args)
+    out = list(args)
+    if policy.session_reset > 0 and out:
+        # Policies are applied to tshark invocations: -M resets dissection state every N frames.
+        out = [out[0], "-M", str(int(policy.session_reset)), *out[1:]]
+    limits: list[str] = []
+    if policy.max_address_space_mb > 0:
+        limits.append(f"--as={int(policy.max_address_space_mb) * 1024 * 1024}")
+    if policy.max_cpu_s > 0:
+        # SIGXCPU at the soft limit, SIGKILL shortly after.
+        limits.append(f"--cpu={int(policy.max_cpu_s)}:{int(policy.max_cpu_s) + 5}")
+    prlimit = shutil.which("prlimit") if limits else None
+    if prlimit:
+        out = [prlimit, *limits, *out]
+    io_class = _IONICE_CLASSES.get(policy.ionice_class)
+    if io_class:
+        ionice = shutil.which("ionice")
+        if ionice:
+            out = [ionice, "-c", io_class, *out]
+    if policy.nice:
+        nice = shutil.which("nice")
+        if nice:
+            out = [nice, "-n", str(int(policy.nice)), *out]
+    return out
+
+
+def check_resources(p: subprocess.Popen[str], stderr: str = "") -> None:
+    policy: Optional[ResourcePolicy] = getattr(p, "resource_policy", None)
+    if policy is None:
+        return
+    watchdog: Optional[RssWatchdog] = getattr(p, "rss_watchdog", None)
+    if watchdog is not None and watchdog.exceeded:
+        raise PcapMcpError(
+            "RESOURCE_EXHAUSTED",
+            "tshark exceeded the memory limit and was stopped",
+            {
+                "policy": policy.name,
+                "limit": "rss",
+                "max_rss_mb": policy.max_rss_mb,
+                "peak_rss_mb": watchdog.peak_kb // 1024,
+                "hint": "narrow the time window / display_filter, or use a protocol-pruned profile",
+            },
+        )
+    # Only SIGXCPU is attributed to the CPU limit: a SIGKILL may come from the OOM killer or
+    # from anyone else, and tshark does not ignore SIGXCPU, so the hard limit is not reached.
+    if policy.max_cpu_s and p.returncode == -signal.SIGXCPU:
+        raise PcapMcpError(
+            "RESOURCE_EXHAUSTED",
+            "tshark exceeded the CPU time limit",
+            {"policy": policy.name, "limit": "cpu", "max_cpu_s": policy.max_cpu_s},
+        )
+    err = (stderr or "").lower()
+    if policy.max_address_space_mb and ("out of memory" in err or "failed to allocate" in err):
+        raise PcapMcpError(
+            "RESOURCE_EXHAUSTED",
+            "tshark ran out of address space",
+            {"policy": policy.name, "limit": "address_space", "max_address_space_mb": policy.max_address_space_mb},
+        )
+
+
 def run_checked(
     args: list[str],
     *,
     timeout_s: Optional[float],
+    stdin_chunks: Optional[Iterable[bytes]] = None,
+    policy: Optional[ResourcePolicy] = None,
 ) -> ProcResult:
+    if stdin_chunks is not None or policy is not None:
+        p = popen_lines(args, stdin_chunks=stdin_chunks, policy=policy)
+        try:
+            stdout, stderr = p.communicate(timeout=timeout_s)
+        except subprocess.TimeoutExpired:
+            safe_kill(p)
+            p.communicate()
+            raise
+        check_resources(p, stderr or "")
+        return ProcResult(p.returncode, stdout or "", stderr or "")
+
+    t0 = time.perf_counter()
     cp = subprocess.run(
         args,
         stdout=subprocess.PIPE,
@@ -25,32 +166,243 @@ def run_checked(
         timeout=timeout_s,
         check=False,
     )
+    finished = time.perf_counter()
+    binary = _binary(args)
+    tool = metrics.current_tool.get()
+    metrics.inc("subprocess_spawns_total", binary=binary, tool=tool)
+    metrics.observe("subprocess_run_seconds", finished - t0, binary=binary, tool=tool)
+    _record_output(binary, tool, len(cp.stdout or ""), (cp.stdout or "").count("\n"))
+    rec = profiling.track_subprocess(args, t0, t0)
+    if rec is not None:
+        profiling.mark(rec, "exit_s", finished)
+        rec.update(returncode=cp.returncode, rows=(cp.stdout or "").count("\n"), bytes=len(cp.stdout or ""))
     return ProcResult(cp.returncode, cp.stdout, cp.stderr)
 
 
-def popen_lines(
+def _binary(args: list[str]) -> str:
+    return os.path.basename(str(args[0])) if args else ""
+
+
+def _record_output(binary: str, tool: str, nbytes: int, rows: int) -> None:
+    metrics.inc("bytes_parsed_total", nbytes, binary=binary, tool=tool)
+    metrics.inc("rows_parsed_total", rows, binary=binary, tool=tool)
+
+
+def _popen(
     args: list[str],
-) -> subprocess.Popen[str]:
-    return subprocess.Popen(
-        args,
+    *,
+    stdin_chunks: Optional[Iterable[bytes]],
+    policy: Optional[ResourcePolicy],
+    text: bool,
+) -> subprocess.Popen:
+    t0 = time.perf_counter()
+    argv = _policy_args(args, policy)
+    p = subprocess.Popen(
+        argv,
+        stdin=subprocess.PIPE if stdin_chunks is not None else None,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
-        text=True,
-        bufsize=1,
+        text=text,
+        bufsize=1 if text else 0,
     )
+    spawned = time.perf_counter()
+    binary = _binary(args)
+    p.spawned_at = spawned  # type: ignore[attr-defined]
+    p.metrics_binary = binary  # type: ignore[attr-defined]
+    tool = metrics.current_tool.get()
+    metrics.inc("subprocess_spawns_total", binary=binary, tool=tool)
+    metrics.observe("subprocess_spawn_seconds", spawned - t0, binary=binary, tool=tool)
+    rec = profiling.track_subprocess(argv, t0, spawned)
+    if rec is not None:
+        p.profile_record = rec  # type: ignore[attr-defined]
+        profiling.watch_exit(rec, p)
+    if policy is not None:
+        p.resource_policy = policy  # type: ignore[attr-defined]
+        if policy.max_rss_mb > 0 and Path(f"/proc/{p.pid}").exists():
+            watchdog = RssWatchdog(p, policy)
+            p.rss_watchdog = watchdog  # type: ignore[attr-defined]
+            watchdog.start()
+    if stdin_chunks is not None and p.stdin:
+        # The feeder thread owns the pipe from here on; communicate() must not touch it.
+        sink = p.stdin
+        p.stdin = None
+        t = threading.Thread(target=_feed_stdin, args=(sink, stdin_chunks), daemon=True)
+        t.start()
+    return p
+
+
+def popen_lines(
+    args: list[str],
+    *,
+    stdin_chunks: Optional[Iterable[bytes]] = None,
+    policy: Optional[ResourcePolicy] = None,
+) -> subprocess.Popen[str]:
+    return _popen(args, stdin_chunks=stdin_chunks, policy=policy, text=True)
+
+
+def popen_bytes(
+    args: list[str],
+    *,
+    stdin_chunks: Optional[Iterable[bytes]] = None,
+    policy: Optional[ResourcePolicy] = None,
+) -> subprocess.Popen[bytes]:
+    # Unbuffered binary pipes, for stdout_rows().
+    return _popen(args, stdin_chunks=stdin_chunks, policy=policy, text=False)
+
+
+def stdout_lines(p: subprocess.Popen[str]) -> Iterator[str]:
+    # Iterates p.stdout while counting rows/bytes and the time to the first line. Totals
+    # are recorded once, when the iterator is exhausted or dropped.
+    if not p.stdout:
+        return
+    binary = getattr(p, "metrics_binary", "")
+    tool = metrics.current_tool.get()
+    rec = getattr(p, "profile_record", None)
+    rows = 0
+    nbytes = 0
+    try:
+        for line in p.stdout:
+            if not rows:
+                now = time.perf_counter()
+                metrics.observe("first_byte_seconds", now - getattr(p, "spawned_at", now), binary=binary, tool=tool)
+                profiling.mark(rec, "first_byte_s", now)
+            rows += 1
+            nbytes += len(line)
+            yield line
+    finally:
+        _record_output(binary, tool, nbytes, rows)
+        if rec is not None:
+            profiling.mark(rec, "last_byte_s")
+            rec.update(rows=rows, bytes=nbytes)
+
+
+def _split_lines(lines: list[str], columns: Union[int, Sequence[int], None], quoted: bool) -> list:
+    # Lines are split no further than the last wanted column.
+    if isinstance(columns, int):
+        if columns == 0 and not quoted:
+            return [ln.split("\t", 1)[0] for ln in lines]
+        return [r[0] for r in _split_lines(lines, (columns,), quoted)]
+    if quoted:
+        # `-E quote=d` does not escape quotes inside values, so a value ending in `"` leaves
+        # the reader inside a quoted field and it would swallow the next line. Lines are
+        # parsed as one batch, and one at a time whenever that batch merged any of them.
+        rows = list(csv.reader(lines, delimiter="\t", quotechar='"'))
+        if len(rows) != len(lines):
+            rows = [next(csv.reader([ln], delimiter="\t", quotechar='"')) for ln in lines]
+        if columns is None:
+            return rows
+        return [[r[i] if i < len(r) else "" for i in columns] for r in rows]
+    if columns is None:
+        return [ln.split("\t") for ln in lines]
+    maxsplit = max(columns, default=-1) + 1
+    out: list[list[str]] = []
+    for ln in lines:
+        parts = ln.split("\t", maxsplit)
+        n = len(parts)
+        out.append([parts[i] if i < n else "" for i in columns])
+    return out
+
+
+def stdout_rows(
+    p: subprocess.Popen[bytes],
+    *,
+    columns: Union[int, Sequence[int], None] = None,
+    quoted: bool = False,
+    header: bool = False,
+    skip: int = 0,
+    chunk_size: int = STDOUT_CHUNK_BYTES,
+    batch_rows: int = ROW_BATCH,
+) -> Iterator[list]:
+    # Batches of tab-separated rows from a popen_bytes() process. stdout is read with
+    # readinto() into one reusable buffer and each chunk is decoded once, up to its last
+    # newline (cheaper than decoding field by field, even for a single column). Empty lines
+    # are dropped, then:
+    # - `header`: the first line comes alone as the first batch, whatever `skip` is
+    # - `skip`: this many rows are dropped before being split
+    # - `columns`: only these are kept (all when None); an int gives plain values, not rows
+    # - `quoted`: values are unwrapped from `-E quote=d`
+    # Rows/bytes and the time to the first byte are recorded like stdout_lines().
+    if not p.stdout:
+        return
+    binary = getattr(p, "metrics_binary", "")
+    tool = metrics.current_tool.get()
+    rec = getattr(p, "profile_record", None)
+    buf = bytearray(chunk_size)
+    view = memoryview(buf)
+    tail = b""
+    rows = 0
+    nbytes = 0
+    try:
+        while True:
+            n = p.stdout.readinto(view)  # type: ignore[attr-defined]
+            if n:
+                if not nbytes:
+                    now = time.perf_counter()
+                    metrics.observe("first_byte_seconds", now - getattr(p, "spawned_at", now), binary=binary, tool=tool)
+                    profiling.mark(rec, "first_byte_s", now)
+                nbytes += n
+                data = tail + view[:n]
+                cut = data.rfind(b"\n") + 1
+                if not cut:
+                    tail = data
+                    continue
+                tail = data[cut:]
+                data = data[:cut]
+            elif tail:
+                data, tail = tail, b""
+            else:
+                break
+            text = data.decode("utf-8", "replace")
+            if "\r" in text:
+                text = text.replace("\r\n", "\n")
+            lines = list(filter(None, text.split("\n")))
+            rows += len(lines)
+            if header and lines:
+                header = False
+                yield _split_lines(lines[:1], None, quoted)
+                lines = lines[1:]
+            if skip:
+                dropped = min(skip, len(lines))
+                skip -= dropped
+                lines = lines[dropped:]
+            # Single-column output (e.g. `-e frame.number`) needs no split at all.
+            plain = columns == 0 and not quoted and "\t" not in text
+            for i in range(0, len(lines), batch_rows):
+                yield lines[i : i + batch_rows] if plain else _split_lines(lines[i : i + batch_rows], columns, quoted)
+    finally:
+        _record_output(binary, tool, nbytes, rows)
+        if rec is not None:
+            profiling.mark(rec, "last_byte_s")
+            rec.update(rows=rows, bytes=nbytes)
+
+
+def _feed_stdin(sink: IO, chunks: Iterable[bytes]) -> None:
+    try:
+        raw = getattr(sink, "buffer", sink)
+        for chunk in chunks:
+            raw.write(chunk)
+    except Exception:
+        pass
+    finally:
+        try:
+            sink.close()
+        except Exception:
+            pass
 
 
 def safe_kill(p: subprocess.Popen[str]) -> None:
     try:
+        p.killed_by_caller = True  # type: ignore[attr-defined]
         p.kill()
     except Exception:
         return
 
 
-def read_all_stderr(p: subprocess.Popen[str]) -> str:
+def read_all_stderr(p: subprocess.Popen) -> str:
     if not p.stderr:
         return ""
     try:
-        return p.stderr.read() or ""
+        out = p.stderr.read() or ""
     except Exception:
         return ""
+    return out.decode("utf-8", "replace") if isinstance(out, bytes) else out
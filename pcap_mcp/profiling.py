@@ -0,0 +1,226 @@
+from __future__ import annotations
+
+import contextvars
+import cProfile
+from datetime import datetime
+import inspect
+import io
+import json
+import os
+from pathlib import Path
+import pstats
+import subprocess
+import threading
+import time
+import tracemalloc
+from typing import Any, Callable, Optional
+import zipfile
+
+import pydantic_core
+
+
+_TOP_FUNCTIONS = 60
+_TOP_ALLOCATIONS = 40
+_MAX_ARG_CHARS = 2000
+_EXIT_WAIT_S = 1.0
+
+
+class CallTrace:
+    def __init__(self, tool: str) -> None:
+        self.tool = tool
+        self.t0 = time.perf_counter()
+        self.subprocesses: list[dict[str, Any]] = []
+        self.lock = threading.Lock()
+
+    def rel(self, t: float) -> float:
+        return round(t - self.t0, 6)
+
+
+_active: contextvars.ContextVar[Optional[CallTrace]] = contextvars.ContextVar("pcap_mcp_call_trace", default=None)
+# tracemalloc is process-wide, so only one call is profiled at a time (allocations made by
+# other threads during that call are counted too). cProfile.enable() only hooks the calling
+# thread: work a tool hands to other threads (multi-capture fan-out, stdin feeders, prefetch)
+# is absent from the pstats and shows up only in the per-subprocess timings.
+_profile_lock = threading.Lock()
+
+
+def track_subprocess(args: list[str], started: float, spawned: float) -> Optional[dict[str, Any]]:
+    trace = _active.get()
+    if trace is None:
+        return None
+    rec: dict[str, Any] = {
+        "argv": [str(a) for a in args],
+        "spawn_start_s": trace.rel(started),
+        "spawned_s": trace.rel(spawned),
+        "first_byte_s": None,
+        "last_byte_s": None,
+        "exit_s": None,
+        "returncode": None,
+        "rows": 0,
+        "bytes": 0,
+    }
+    rec["_trace"] = trace
+    with trace.lock:
+        trace.subprocesses.append(rec)
+    return rec
+
+
+def mark(rec: Optional[dict[str, Any]], key: str, t: Optional[float] = None) -> None:
+    if rec is None:
+        return
+    rec[key] = rec["_trace"].rel(time.perf_counter() if t is None else t)
+
+
+def watch_exit(rec: Optional[dict[str, Any]], p: subprocess.Popen[str]) -> None:
+    # Waits for the child without reaping it (WNOWAIT), so Popen.wait() still owns the status.
+    if rec is None:
+        return
+
+    def run() -> None:
+        try:
+            os.waitid(os.P_PID, p.pid, os.WEXITED | os.WNOWAIT)
+        except (ChildProcessError, OSError, AttributeError):
+            pass
+        mark(rec, "exit_s")
+
+    t = threading.Thread(target=run, daemon=True, name=f"pcap-mcp-exit-{p.pid}")
+    rec["_proc"] = p
+    rec["_watcher"] = t
+    t.start()
+
+
+def _short_repr(v: Any) -> Any:
+    s = repr(v)
+    return s if len(s) <= _MAX_ARG_CHARS else s[:_MAX_ARG_CHARS] + "..."
+
+
+def _bind_arguments(fn: Callable[..., Any], args: tuple[Any, ...], kwargs: dict[str, Any]) -> dict[str, Any]:
+    try:
+        return dict(inspect.signature(fn).bind_partial(*args, **kwargs).arguments)
+    except (TypeError, ValueError):
+        return {"args": args, **kwargs}
+
+
+def _write_bundle(
+    out_dir: Path,
+    trace: CallTrace,
+    *,
+    arguments: dict[str, Any],
+    wall_s: float,
+    profiler: Optional[cProfile.Profile],
+    snapshot: Optional[tracemalloc.Snapshot],
+    traced_peak: int,
+    result: Any,
+    error: Optional[BaseException],
+) -> Path:
+    out_dir.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+    path = out_dir / f"{stamp}_{trace.tool}.zip"
+
+    call: dict[str, Any] = {
+        "tool": trace.tool,
+        "arguments": {k: _short_repr(v) for k, v in arguments.items()},
+        "wall_s": round(wall_s, 6),
+        "error": str(error) if error is not None else None,
+        "python_tracemalloc_peak_bytes": traced_peak,
+    }
+    if result is not None:
+        # FastMCP serializes the tool result the same way before sending it.
+        t = time.perf_counter()
+        encoded = pydantic_core.to_json(result, fallback=str, indent=2)
+        call["serialization_s"] = round(time.perf_counter() - t, 6)
+        call["result_json_bytes"] = len(encoded)
+
+    with trace.lock:
+        watchers = [rec["_watcher"] for rec in trace.subprocesses if "_watcher" in rec]
+    for t in watchers:
+        t.join(timeout=_EXIT_WAIT_S)
+    subprocesses = []
+    with trace.lock:
+        for rec in trace.subprocesses:
+            if "_proc" in rec:
+                rec["returncode"] = rec["_proc"].returncode
+            subprocesses.append({k: v for k, v in rec.items() if not k.startswith("_")})
+    call["subprocess_wall_s"] = round(
+        sum((r["exit_s"] or r["last_byte_s"] or 0.0) - r["spawn_start_s"] for r in subprocesses), 6
+    )
+
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("call.json", json.dumps(call, ensure_ascii=False, indent=2))
+        zf.writestr("subprocesses.json", json.dumps(subprocesses, ensure_ascii=False, indent=2))
+        if profiler is not None:
+            buf = io.StringIO()
+            stats = pstats.Stats(profiler, stream=buf)
+            stats.sort_stats("cumulative").print_stats(_TOP_FUNCTIONS)
+            buf.write("\n")
+            stats.sort_stats("tottime").print_stats(_TOP_FUNCTIONS)
+            zf.writestr("cprofile.txt", buf.getvalue())
+            tmp = path.with_suffix(".pstats.tmp")
+            try:
+                profiler.dump_stats(str(tmp))
+                zf.write(tmp, "cprofile.pstats")
+            finally:
+                tmp.unlink(missing_ok=True)
+        if snapshot is not None:
+            lines = [f"peak traced memory: {traced_peak} bytes", ""]
+            for stat in snapshot.statistics("lineno")[:_TOP_ALLOCATIONS]:
+                lines.append(str(stat))
+            zf.writestr("tracemalloc.txt", "\n".join(lines) + "\n")
+    return path
+
+
+def profiled_call(
+    out_dir: Path,
+    tool: str,
+    fn: Callable[..., Any],
+    args: tuple[Any, ...],
+    kwargs: dict[str, Any],
+) -> tuple[Any, Optional[Path], Optional[BaseException]]:
+    # Returns (result, bundle_path, error); the caller decides how to surface the bundle.
+    if not _profile_lock.acquire(blocking=False):
+        try:
+            return fn(*args, **kwargs), None, None
+        except BaseException as e:
+            return None, None, e
+
+    trace = CallTrace(tool)
+    token = _active.set(trace)
+    started_tracemalloc = not tracemalloc.is_tracing()
+    if started_tracemalloc:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    profiler = cProfile.Profile()
+    result: Any = None
+    error: Optional[BaseException] = None
+    try:
+        profiler.enable()
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            error = e
+        finally:
+            profiler.disable()
+        wall_s = time.perf_counter() - trace.t0
+        snapshot = tracemalloc.take_snapshot()
+        _current, traced_peak = tracemalloc.get_traced_memory()
+    finally:
+        if started_tracemalloc:
+            tracemalloc.stop()
+        _active.reset(token)
+        _profile_lock.release()
+
+    try:
+        bundle = _write_bundle(
+            out_dir,
+            trace,
+            arguments=_bind_arguments(fn, args, kwargs),
+            wall_s=wall_s,
+            profiler=profiler,
+            snapshot=snapshot,
+            traced_peak=traced_peak,
+            result=result,
+            error=error,
+        )
+    except OSError:
+        bundle = None
+    return result, bundle, error
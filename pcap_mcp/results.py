@@ -0,0 +1,147 @@
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Any, Optional, TextIO
+
+from .config import Config
+from .errors import PcapMcpError
+
+
+RESULT_FORMATS = ("ndjson", "columnar")
+# Rows per group: the manifest records the byte offset of every group, so a page is read by
+# seeking to one group instead of scanning the file.
+ROW_GROUP = 1000
+
+_EXTENSIONS = {"ndjson": ".ndjson", "columnar": ".columns.ndjson"}
+
+
+def results_dir(cfg: Config) -> Path:
+    return cfg.output_dir / "results"
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"))
+
+
+class ResultWriter:
+    """Streams rows to `<name>` in `fmt` with one row group buffered at most.
+
+    - ndjson: one JSON object per row
+    - columnar: one line per row group, `{"row": first_row, "columns": [[values of field 0], ...]}`
+    """
+
+    def __init__(self, path: Path, *, fmt: str, fields: list[str]) -> None:
+        if fmt not in RESULT_FORMATS:
+            raise PcapMcpError("INVALID_ARGUMENT", "unknown output_format", {"output_format": fmt, "available": list(RESULT_FORMATS)})
+        self.path = path
+        self.fmt = fmt
+        self.fields = fields
+        self.rows = 0
+        self.groups: list[list[int]] = []
+        self._pending: list[dict[str, Any]] = []
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._f: Optional[TextIO] = path.open("w", encoding="utf-8")
+
+    def add(self, row: dict[str, Any]) -> None:
+        assert self._f is not None
+        if self.rows % ROW_GROUP == 0:
+            self._flush_group()
+            self.groups.append([self.rows, self._f.tell()])
+        self.rows += 1
+        if self.fmt == "ndjson":
+            self._f.write(_dumps(row) + "\n")
+        else:
+            self._pending.append(row)
+
+    def _flush_group(self) -> None:
+        if not self._pending or self._f is None:
+            return
+        first = self.rows - len(self._pending)
+        columns = [[r.get(f, "") for r in self._pending] for f in self.fields]
+        self._f.write(_dumps({"row": first, "columns": columns}) + "\n")
+        self._pending = []
+
+    def close(self, **extra: Any) -> dict[str, Any]:
+        # Writes the manifest last, so a result without one is incomplete.
+        if self._f is None:
+            raise RuntimeError("result already closed")
+        self._flush_group()
+        self._f.close()
+        self._f = None
+        manifest = {
+            "format": self.fmt,
+            "fields": self.fields,
+            "rows": self.rows,
+            "row_group": ROW_GROUP,
+            "groups": self.groups,
+            "bytes": self.path.stat().st_size,
+            **extra,
+        }
+        tmp = _manifest_path(self.path).with_name(f"{_manifest_path(self.path).name}.{os.getpid()}.tmp")
+        tmp.write_text(_dumps(manifest), encoding="utf-8")
+        os.replace(tmp, _manifest_path(self.path))
+        return manifest
+
+    def abort(self) -> None:
+        if self._f is not None:
+            self._f.close()
+            self._f = None
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+
+
+def _manifest_path(path: Path) -> Path:
+    return path.with_name(path.name + ".manifest.json")
+
+
+def new_result_path(cfg: Config, base: str, fmt: str) -> Path:
+    return (results_dir(cfg) / f"{base}{_EXTENSIONS.get(fmt, '.ndjson')}").resolve()
+
+
+def open_result(cfg: Config, handle: str) -> tuple[Path, dict[str, Any]]:
+    name = (handle or "").strip()
+    root = results_dir(cfg).resolve()
+    path = (root / name).resolve()
+    if not name or path.parent != root:
+        raise PcapMcpError("INVALID_ARGUMENT", "invalid result handle", {"handle": handle})
+    try:
+        manifest = json.loads(_manifest_path(path).read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        raise PcapMcpError("FILE_NOT_FOUND", "result not found or incomplete", {"handle": handle})
+    return path, manifest
+
+
+def read_rows(path: Path, manifest: dict[str, Any], *, offset: int, limit: int) -> list[dict[str, Any]]:
+    if offset < 0 or limit < 0:
+        raise PcapMcpError("INVALID_ARGUMENT", "limit/offset must be non-negative")
+    groups = manifest.get("groups") or []
+    if limit == 0 or offset >= int(manifest.get("rows") or 0) or not groups:
+        return []
+    gi = min(offset // int(manifest.get("row_group") or ROW_GROUP), len(groups) - 1)
+    row, byte_offset = groups[gi]
+    fields = list(manifest.get("fields") or [])
+    out: list[dict[str, Any]] = []
+    with path.open("r", encoding="utf-8") as f:
+        f.seek(byte_offset)
+        for line in f:
+            if manifest.get("format") == "columnar":
+                group = json.loads(line)
+                columns = group.get("columns") or []
+                n = len(columns[0]) if columns else 0
+                start = max(0, offset - int(group.get("row") or row))
+                for i in range(start, n):
+                    out.append({f: columns[j][i] for j, f in enumerate(fields)})
+                    if len(out) >= limit:
+                        return out
+                row = int(group.get("row") or row) + n
+                continue
+            if row >= offset:
+                out.append(json.loads(line))
+                if len(out) >= limit:
+                    break
+            row += 1
+    return out
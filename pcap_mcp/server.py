@@ -2,32 +2,105 @@ from __future__ import annotations
 
 import csv
 from datetime import datetime
+import functools
+import inspect
+import json
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Callable, Optional
 
-from mcp.server.fastmcp import FastMCP
+import anyio
+from mcp.server.fastmcp import Context, FastMCP
 
-from .config import load_config
+from . import metrics
+from .capture_set import load_capture_set, member_summary, set_timeline as _set_timeline
+from .config import expand_protocols, load_config
+from .encoding import encode_rows
 from .errors import PcapMcpError
 from .paths import validate_pcap_path
+from .pcapfile import detect_format
+from .profiling import profiled_call
+from .results import RESULT_FORMATS, ResultWriter, new_result_path, open_result, read_rows
+from .catalog import entry_format, entry_summary, get_catalog
+from .decodeas import cached_decode_as_scan, expand_auto
+from .conversations import SORT_KEYS, STAT_KINDS, STAT_PROTOCOLS, cached_conversation_stats, top_rows
+from .detailcache import cached_frame_detail_json, cached_frame_details, prefetch_frame_details
+from .expert import SEVERITIES, cached_expert_summary
+from .fanout import ResultCallback, fan_out, resolve_captures
+from .identity import cached_metadata, capture_identity, sha256_status
+from .merge import DEFAULT_CORRELATE_FIELDS, MAX_MERGE_CAPTURES, estimate_offsets, merged_timeline
+from .ngap import PDU_STATES, UE_STATES, cached_ngap_sessions, iter_records as ngap_records
+from .jsontree import collapse as collapse_tree, project as project_tree, resolve_pointer
+from .subcapture import extract_subcapture as _extract_subcapture
+from .tail import tail as _tail
+from .timeindex import CaptureSlice, filter_allows_slicing, resolve_time_window, slice_for_window
+from .timewin import and_filters, parse_time_bound, time_window_filter
 from .tshark_tools import (
     capinfos_basic,
     follow_filter_for_frame as _follow_filter_for_frame,
     frames_by_filter as _frames_by_filter,
-    frame_detail as _frame_detail,
     has_any_packet,
     list_fields as _list_fields,
     packet_list_export as _packet_list_export,
     text_search as _text_search,
     timeline as _timeline,
-    tshark_version,
+    timeline_export as _timeline_export,
+    validate_display_filter,
 )
+from .warmup import cached_field_table, cached_tshark_version, start_warmup
 
 
 cfg = load_config()
 app = FastMCP("pcap-mcp")
 
 
+def _tool(name: str) -> Callable[[Callable[..., dict[str, Any]]], Callable[..., dict[str, Any]]]:
+    def register(fn: Callable[..., dict[str, Any]]) -> Callable[..., dict[str, Any]]:
+        if inspect.iscoroutinefunction(fn):
+            # Async tools (progress-reporting fan-outs) only get call metrics; cProfile and
+            # tracemalloc cannot attribute work spread over the event loop and worker threads.
+            @functools.wraps(fn)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> dict[str, Any]:
+                with metrics.tool_call(name):
+                    return await fn(*args, **kwargs)
+
+            async_wrapper.__signature__ = inspect.signature(fn, eval_str=True)  # type: ignore[attr-defined]
+            return app.tool(name=name)(async_wrapper)
+
+        @functools.wraps(fn)
+        def wrapper(*args: Any, profile_call: bool = False, **kwargs: Any) -> dict[str, Any]:
+            with metrics.tool_call(name):
+                if not (profile_call or name in cfg.profile_tools or "*" in cfg.profile_tools):
+                    return fn(*args, **kwargs)
+                return _profiled(name, fn, args, kwargs)
+
+        # Every tool accepts `profile_call` in addition to its own parameters.
+        sig = inspect.signature(fn, eval_str=True)
+        extra = inspect.Parameter("profile_call", inspect.Parameter.KEYWORD_ONLY, default=False, annotation=bool)
+        wrapper.__signature__ = sig.replace(parameters=[*sig.parameters.values(), extra])  # type: ignore[attr-defined]
+
+        # FastMCP calls sync tools on the event loop; run them in a worker thread so one
+        # long tshark call does not stall other requests (or other clients of the HTTP daemon).
+        @functools.wraps(fn)
+        async def threaded(*args: Any, **kwargs: Any) -> dict[str, Any]:
+            return await anyio.to_thread.run_sync(functools.partial(wrapper, *args, **kwargs))
+
+        threaded.__signature__ = wrapper.__signature__  # type: ignore[attr-defined]
+        app.tool(name=name)(threaded)
+        return wrapper
+
+    return register
+
+
+def _profiled(name: str, fn: Callable[..., dict[str, Any]], args: tuple[Any, ...], kwargs: dict[str, Any]) -> dict[str, Any]:
+    result, bundle, error = profiled_call(cfg.output_dir / "profiles", name, fn, args, kwargs)
+    bundle_path = str(bundle) if bundle is not None else None
+    if error is not None:
+        if isinstance(error, PcapMcpError) and bundle_path:
+            error.details = {**(error.details or {}), "profile_bundle": bundle_path}
+        raise error
+    return {**result, "profile_bundle": bundle_path}
+
+
 def _ok(payload: dict[str, Any]) -> dict[str, Any]:
     return payload
 
@@ -54,10 +127,70 @@ def _available_profile_names() -> list[str]:
     return sorted(cfg.profiles.keys())
 
 
-def _get_profile(name: str) -> Optional[Any]:
-    if not name:
-        return None
-    return cfg.profiles.get(name)
+def _resolve_profile(
+    profile: Optional[str],
+    display_filter: str,
+    decode_as: Optional[list[str]],
+    *,
+    apply_filter: bool = True,
+    p: Optional[Path] = None,
+) -> tuple[str, list[str], list[str], list[str]]:
+    compiled = cfg.compiled_profiles.get(profile or "")
+    if compiled is None:
+        raise PcapMcpError(
+            "INVALID_ARGUMENT",
+            "unknown profile",
+            {"profile": profile, "available": _available_profile_names()},
+        )
+
+    effective_display_filter = (display_filter or "").strip()
+    if apply_filter:
+        effective_display_filter = compiled.compose_filter(effective_display_filter)
+    validate_display_filter(cfg, effective_display_filter)
+
+    if decode_as:
+        effective_decode_as = _dedupe_strs([*compiled.decode_as, *expand_auto(cfg, p, decode_as)])
+        effective_protocols = []
+        if compiled.protocols:
+            # Decode-as targets must stay enabled in a pruned profile.
+            effective_protocols = list(expand_protocols(compiled.protocols, effective_decode_as))
+    else:
+        effective_decode_as = list(compiled.decode_as)
+        effective_protocols = list(compiled.protocols)
+    return effective_display_filter, effective_decode_as, list(compiled.preferences), effective_protocols
+
+
+def _apply_time_window(
+    p: Path,
+    display_filter: str,
+    *,
+    time_from: Optional[str],
+    time_to: Optional[str],
+    around_frame: Optional[int],
+    around_seconds: float,
+    slice_capture: bool,
+    fields: Optional[list[str]] = None,
+) -> tuple[str, Optional[CaptureSlice], Optional[dict[str, Any]]]:
+    window = resolve_time_window(
+        cfg,
+        p,
+        time_from=time_from,
+        time_to=time_to,
+        around_frame=around_frame,
+        around_seconds=around_seconds,
+    )
+    if window is None:
+        return display_filter, None, None
+
+    t_from, t_to = window
+    info: dict[str, Any] = {"time_from_epoch": t_from, "time_to_epoch": t_to, "sliced": False}
+    if slice_capture and filter_allows_slicing(display_filter, fields or ()):
+        capture_slice = slice_for_window(cfg, p, t_from, t_to)
+        if capture_slice is not None:
+            info["sliced"] = True
+            info["slice"] = capture_slice.describe()
+            return display_filter, capture_slice, info
+    return and_filters(display_filter, time_window_filter(t_from, t_to)), None, info
 
 
 def _config_snapshot() -> dict[str, Any]:
@@ -70,7 +203,10 @@ def _config_snapshot() -> dict[str, Any]:
         "max_timeline_rows": cfg.max_timeline_rows,
         "max_detail_bytes": cfg.max_detail_bytes,
         "export_timeout_s": cfg.export_timeout_s,
+        "capture_set_workers": cfg.capture_set_workers,
+        "time_index_stride": cfg.time_index_stride,
         "output_dir": str(cfg.output_dir),
+        "metadata_dir": str(cfg.metadata_dir),
         "time_offset_hours": cfg.time_offset_hours,
         "global_decode_as": list(cfg.global_decode_as),
         "global_preferences": list(cfg.global_preferences),
@@ -79,6 +215,8 @@ def _config_snapshot() -> dict[str, Any]:
                 "display_filter": prof.display_filter,
                 "decode_as": list(prof.decode_as),
                 "preferences": list(prof.preferences),
+                "protocols": list(prof.protocols),
+                "argv": list(cfg.compiled_profiles[name].argv),
             }
             for name, prof in cfg.profiles.items()
         },
@@ -86,10 +224,32 @@ def _config_snapshot() -> dict[str, Any]:
             name: [{"name": col_name, "field": field} for col_name, field in cols]
             for name, cols in cfg.packet_list_columns.items()
         },
+        "resource_policies": {
+            name: {
+                "nice": pol.nice,
+                "ionice_class": pol.ionice_class,
+                "max_rss_mb": pol.max_rss_mb,
+                "max_address_space_mb": pol.max_address_space_mb,
+                "max_cpu_s": pol.max_cpu_s,
+                "session_reset": pol.session_reset,
+            }
+            for name, pol in cfg.resource_policies.items()
+        },
+        "metrics_export": cfg.metrics_export,
+        "metrics_export_path": str(cfg.metrics_export_path) if cfg.metrics_export_path else None,
+        "metrics_export_interval_s": cfg.metrics_export_interval_s,
+        "profile_tools": list(cfg.profile_tools),
+        "detail_cache_mb": cfg.detail_cache_mb,
+        "detail_prefetch_frames": cfg.detail_prefetch_frames,
+        "http_listen": cfg.http_listen,
+        "http_client_concurrency": cfg.http_client_concurrency,
+        "http_queue_timeout_s": cfg.http_queue_timeout_s,
+        "http_drain_timeout_s": cfg.http_drain_timeout_s,
+        "warmup_recent_captures": cfg.warmup_recent_captures,
     }
 
 
-@app.tool(name="pcap_config_get")
+@_tool("pcap_config_get")
 def pcap_config_get() -> dict[str, Any]:
     """获取当前 MCP Server 的配置快照。
 
@@ -102,7 +262,7 @@ def pcap_config_get() -> dict[str, Any]:
         raise
 
 
-@app.tool(name="pcap_config_reload")
+@_tool("pcap_config_reload")
 def pcap_config_reload() -> dict[str, Any]:
     """热加载配置。
 
@@ -111,13 +271,37 @@ def pcap_config_reload() -> dict[str, Any]:
     try:
         global cfg
         cfg = load_config()
+        start_warmup(cfg)
+        metrics.start_exporter(cfg.metrics_export, cfg.metrics_export_path, cfg.metrics_export_interval_s)
         return _ok({"reloaded": True, **_config_snapshot()})
     except Exception as e:
         _handle_error(e)
         raise
 
 
-@app.tool(name="pcap_list_fields")
+@_tool("pcap_stats")
+def pcap_stats(format: str = "json") -> dict[str, Any]:
+    """查看服务自身的运行指标（进程启动以来累计）。
+
+    - 每个工具：调用次数、错误码分布、耗时分位数（p50/p90/p99/max）
+    - 子进程：tshark/capinfos 启动次数、启动耗时、首字节耗时（first_byte_seconds）
+    - 解析量：读取的行数/字节数（rows_parsed_total/bytes_parsed_total）
+    - 缓存命中/未命中（display_filter、time_index、metadata.*、dissector_argv 等）与线程池排队等待
+    - `format="prometheus"` 返回 Prometheus 文本格式；周期性导出见配置 `metrics_export`
+    """
+    try:
+        fmt = (format or "json").strip().lower()
+        if fmt == "json":
+            return _ok(metrics.snapshot())
+        if fmt == "prometheus":
+            return _ok({"format": "prometheus", "text": metrics.prometheus_text()})
+        raise PcapMcpError("INVALID_ARGUMENT", "format must be json or prometheus", {"format": format})
+    except Exception as e:
+        _handle_error(e)
+        raise
+
+
+@_tool("pcap_list_fields")
 def pcap_list_fields(
     query: str = "",
     is_regex: bool = False,
@@ -137,6 +321,7 @@ def pcap_list_fields(
             case_sensitive=bool(case_sensitive),
             limit=int(limit),
             include_protocols=bool(include_protocols),
+            fields_text=cached_field_table(cfg),
         )
         return _ok(res)
     except Exception as e:
@@ -144,7 +329,7 @@ def pcap_list_fields(
         raise
 
 
-@app.tool(name="pcap_follow")
+@_tool("pcap_follow")
 def pcap_follow(
     pcap_path: str,
     frame_number: int,
@@ -166,30 +351,9 @@ def pcap_follow(
     try:
         p = validate_pcap_path(cfg, pcap_path)
 
-        effective_base_filter = (display_filter or "").strip()
-        profile_decode_as: list[str] = []
-        profile_preferences: list[str] = []
-
-        if profile:
-            prof = _get_profile(profile)
-            if not prof:
-                raise PcapMcpError(
-                    "INVALID_ARGUMENT",
-                    "unknown profile",
-                    {"profile": profile, "available": _available_profile_names()},
-                )
-
-            if (prof.display_filter or "").strip():
-                if effective_base_filter:
-                    effective_base_filter = f"({prof.display_filter}) && ({effective_base_filter})"
-                else:
-                    effective_base_filter = prof.display_filter
-
-            profile_decode_as = list(prof.decode_as)
-            profile_preferences = list(prof.preferences)
-
-        effective_decode_as = _dedupe_strs([*cfg.global_decode_as, *profile_decode_as, *(decode_as or [])])
-        effective_preferences = _dedupe_strs([*cfg.global_preferences, *profile_preferences])
+        effective_base_filter, effective_decode_as, effective_preferences, effective_protocols = _resolve_profile(
+            profile, display_filter, decode_as, p=p
+        )
 
         follow = _follow_filter_for_frame(
             cfg,
@@ -197,6 +361,7 @@ def pcap_follow(
             frame_number=int(frame_number),
             decode_as=effective_decode_as,
             preferences=effective_preferences,
+            protocols=effective_protocols,
         )
 
         follow_filter = (follow.get("display_filter") or "").strip()
@@ -213,9 +378,18 @@ def pcap_follow(
             display_filter=effective_display_filter,
             decode_as=effective_decode_as,
             preferences=effective_preferences,
+            protocols=effective_protocols,
             limit=int(limit),
             offset=int(offset),
         )
+        prefetch_frame_details(
+            cfg,
+            p=p,
+            frame_numbers=frames,
+            decode_as=effective_decode_as,
+            preferences=effective_preferences,
+            protocols=effective_protocols,
+        )
 
         return _ok(
             {
@@ -239,33 +413,371 @@ def pcap_follow(
 
 
 
-@app.tool(name="pcap_info")
-def pcap_info(pcap_path: str) -> dict[str, Any]:
+@_tool("pcap_catalog")
+def pcap_catalog(
+    query: str = "",
+    format: Optional[str] = None,
+    limit: int = 200,
+    offset: int = 0,
+    rescan: bool = True,
+    compute_missing: bool = False,
+) -> dict[str, Any]:
+    """列出 allowed_pcap_dirs 下的全部抓包（目录索引）。
+
+    - 目录索引增量维护：只有 mtime 变化的目录才会重新列举
+    - 只按扩展名收录（.pcap/.pcapng/.cap/.ntar/.dmp，含滚动编号后缀），格式在查找/列出时才读取文件头判断
+    - 遍历深度与目录数有上限（跳过隐藏目录），超出时 `truncated=true`
+    - 返回路径、大小、格式；包数、时间范围、已检测协议来自缓存的元数据（`pcap_info` 调用后即可见）
+    - `query` 为路径子串过滤，`format` 可选 `pcap|pcapng`
+    - `compute_missing=true` 时对本页中尚无元数据的抓包执行 capinfos 并缓存（较慢）
+    """
+    try:
+        if limit <= 0 or offset < 0:
+            raise PcapMcpError("INVALID_ARGUMENT", "limit must be > 0 and offset non-negative")
+        fmt = (format or "").strip().lower()
+        if fmt and fmt not in ("pcap", "pcapng"):
+            raise PcapMcpError("INVALID_ARGUMENT", "format must be pcap|pcapng")
+
+        cat = get_catalog(cfg)
+        rescanned = cat.refresh() if rescan else 0
+        q = (query or "").strip().lower()
+        entries = [e for e in cat.entries() if (not q or q in str(e.path).lower()) and (not fmt or entry_format(e) == fmt)]
+
+        items: list[dict[str, Any]] = []
+        for e in entries[offset : offset + int(limit)]:
+            if compute_missing:
+                cached_metadata(cfg, e.path, "capinfos", lambda e=e: capinfos_basic(cfg, e.path))
+            item = entry_summary(cfg, e)
+            if item is not None:
+                items.append(item)
+
+        return _ok(
+            {
+                "allowed_pcap_dirs": [str(d) for d in cfg.allowed_pcap_dirs],
+                "directories": len(cat.dirs),
+                "directories_rescanned": rescanned,
+                "truncated": cat.truncated,
+                "total": len(entries),
+                "limit": int(limit),
+                "offset": int(offset),
+                "items": items,
+            }
+        )
+    except Exception as e:
+        _handle_error(e)
+        raise
+
+
+@_tool("pcap_info")
+def pcap_info(pcap_path: str, compute_sha256: bool = False) -> dict[str, Any]:
     """抓包摘要信息。
 
     返回抓包的包数、起止时间、持续时间、tshark 版本，以及常见协议是否出现（快速判断抓包点）。
+
+    - capinfos 结果按抓包标识（设备/inode/大小/mtime + 头尾采样哈希）持久缓存，重复调用不再重新扫描
+    - 默认不计算整文件 SHA256；`compute_sha256=true` 时在后台计算，`sha256_status` 为 `pending` 时稍后再查
     """
     try:
         p = validate_pcap_path(cfg, pcap_path)
-        info = capinfos_basic(cfg, p)
-        info["tshark_version"] = tshark_version(cfg)
-        info["has_protocols"] = {
-            "sctp": has_any_packet(cfg, p, "sctp"),
-            "s1ap": has_any_packet(cfg, p, "s1ap"),
-            "ngap": has_any_packet(cfg, p, "ngap"),
-            "nas_eps": has_any_packet(cfg, p, "nas-eps"),
-            "nas_5gs": has_any_packet(cfg, p, "nas-5gs"),
-            "pfcp": has_any_packet(cfg, p, "pfcp"),
-            "gtpv2": has_any_packet(cfg, p, "gtpv2"),
-            "gtp": has_any_packet(cfg, p, "gtp"),
-        }
+        info = dict(cached_metadata(cfg, p, "capinfos", lambda: capinfos_basic(cfg, p)))
+        info["pcap_path"] = str(p)
+        info["capture_id"] = capture_identity(p).key
+        info.update(sha256_status(cfg, p, request=bool(compute_sha256)))
+        info["tshark_version"] = cached_tshark_version(cfg)
+        info["has_protocols"] = cached_metadata(
+            cfg,
+            p,
+            "has_protocols",
+            lambda: {
+                "sctp": has_any_packet(cfg, p, "sctp"),
+                "s1ap": has_any_packet(cfg, p, "s1ap"),
+                "ngap": has_any_packet(cfg, p, "ngap"),
+                "nas_eps": has_any_packet(cfg, p, "nas-eps"),
+                "nas_5gs": has_any_packet(cfg, p, "nas-5gs"),
+                "pfcp": has_any_packet(cfg, p, "pfcp"),
+                "gtpv2": has_any_packet(cfg, p, "gtpv2"),
+                "gtp": has_any_packet(cfg, p, "gtp"),
+            },
+        )
         return _ok(info)
     except Exception as e:
         _handle_error(e)
         raise
 
 
-@app.tool(name="pcap_text_search")
+@_tool("pcap_conversations")
+def pcap_conversations(
+    pcap_path: str,
+    kind: str = "conversations",
+    protocols: Optional[list[str]] = None,
+    sort_by: str = "bytes",
+    limit: int = 20,
+    address: str = "",
+) -> dict[str, Any]:
+    """会话 / 端点统计（tshark `-z conv,*` / `-z endpoints,*`）。
+
+    用于快速摸清抓包里“谁和谁在通信、流量多大”，无需用 `pcap_timeline` 手工拼会话。
+
+    - `kind`：`conversations`（会话，双向字节/包数、起始时间、持续时间、速率）或 `endpoints`（端点，收发字节/包数）
+    - `protocols`：`ip|ipv6|tcp|udp|sctp`，默认全部
+    - `sort_by`：`bytes|packets|duration|bytes_per_s|packets_per_s|rel_start`，返回每个协议的前 `limit` 条
+    - `address`：只保留地址包含该子串的行
+    - 全部统计表一次 tshark 扫描得到，按抓包标识持久缓存；较新 tshark 以 kB/MB 打印的字节数标记 `bytes_approximate`
+    """
+    try:
+        p = validate_pcap_path(cfg, pcap_path)
+        if kind not in STAT_KINDS:
+            raise PcapMcpError("INVALID_ARGUMENT", "kind must be conversations|endpoints")
+        if sort_by not in SORT_KEYS:
+            raise PcapMcpError("INVALID_ARGUMENT", "unknown sort_by", {"sort_by": sort_by, "available": list(SORT_KEYS)})
+        if limit <= 0:
+            raise PcapMcpError("INVALID_ARGUMENT", "limit must be > 0")
+        protos = [x.strip().lower() for x in (protocols or STAT_PROTOCOLS) if x.strip()]
+        unknown = [x for x in protos if x not in STAT_PROTOCOLS]
+        if unknown:
+            raise PcapMcpError("INVALID_ARGUMENT", "unknown protocols", {"protocols": unknown, "available": list(STAT_PROTOCOLS)})
+
+        stats = cached_conversation_stats(cfg, p)
+        return _ok(
+            {
+                "pcap_path": str(p),
+                "kind": kind,
+                "sort_by": sort_by,
+                "limit": int(limit),
+                "address": address or "",
+                "tables": top_rows(stats, kind=kind, protocols=protos, sort_by=sort_by, limit=int(limit), address=address),
+            }
+        )
+    except Exception as e:
+        _handle_error(e)
+        raise
+
+
+@_tool("pcap_decode_as_scan")
+def pcap_decode_as_scan(pcap_path: str, profile: Optional[str] = None) -> dict[str, Any]:
+    """自动发现非标准端口上的协议，给出 decode_as 建议（一次扫描，不启动 tshark）。
+
+    SBI HTTP2 等跑在非标准端口时，无需反复换 `decode_as` 重跑整条时间线。
+
+    - 按端口对检查 TCP/UDP/SCTP 载荷开头：HTTP/2 连接前言与帧头、Diameter 头、SIP 起始行、PFCP 头、GTPv1/GTPv2 头
+    - 每个端口对归属到服务端端口（见到 SYN 时取其目的端口，否则取较小端口）
+    - `decode_as`：tshark 默认不会解码的建议项；`detections[].configured` 表示 `profile`（含 `global_decode_as`）已包含该项
+    - 结果按抓包标识持久缓存；其他工具传 `decode_as=["auto"]` 即自动套用本抓包的建议
+    """
+    try:
+        p = validate_pcap_path(cfg, pcap_path)
+        compiled = cfg.compiled_profiles.get(profile or "")
+        if compiled is None:
+            raise PcapMcpError(
+                "INVALID_ARGUMENT",
+                "unknown profile",
+                {"profile": profile, "available": _available_profile_names()},
+            )
+        scan = cached_decode_as_scan(cfg, p)
+        configured = {d.replace(" ", "") for d in compiled.decode_as}
+        return _ok(
+            {
+                "pcap_path": str(p),
+                "profile": profile or "",
+                **scan,
+                "detections": [{**d, "configured": d["decode_as"] in configured} for d in scan["detections"]],
+            }
+        )
+    except Exception as e:
+        _handle_error(e)
+        raise
+
+
+@_tool("pcap_expert_summary")
+def pcap_expert_summary(
+    pcap_path: str,
+    profile: Optional[str] = None,
+    decode_as: Optional[list[str]] = None,
+    min_severity: str = "note",
+    group: Optional[str] = None,
+    protocol: Optional[str] = None,
+    limit: int = 100,
+    frames_per_entry: int = 5,
+) -> dict[str, Any]:
+    """专家信息（Expert Info）分诊：一次 tshark 扫描汇总畸形包、重传、重组失败、协议告警等。
+
+    - 按（严重级别, 分组, 协议, 消息）聚合，返回次数与前 `frames_per_entry` 个帧号（可直接交给 `pcap_frame_detail`）
+    - `min_severity`：`error|warning|note|chat|comment`，只返回不低于该级别的条目；`by_severity` 始终给出全部级别计数
+    - `group`（如 `Malformed`、`Sequence`、`Reassemble`）/ `protocol`（如 `TCP`、`NGAP`）：不区分大小写的精确过滤
+    - 结果按抓包标识 + 解码参数（profile/decode_as/首选项）持久缓存
+    """
+    try:
+        p = validate_pcap_path(cfg, pcap_path)
+        if min_severity not in SEVERITIES:
+            raise PcapMcpError("INVALID_ARGUMENT", "min_severity must be error|warning|note|chat|comment")
+        if limit <= 0:
+            raise PcapMcpError("INVALID_ARGUMENT", "limit must be > 0")
+        if not 0 <= frames_per_entry <= 10:
+            raise PcapMcpError("INVALID_ARGUMENT", "frames_per_entry must be between 0 and 10")
+
+        _, effective_decode_as, effective_preferences, effective_protocols = _resolve_profile(profile, "", decode_as, p=p)
+        summary = cached_expert_summary(
+            cfg,
+            p=p,
+            decode_as=effective_decode_as,
+            preferences=effective_preferences,
+            protocols=effective_protocols,
+        )
+
+        allowed = SEVERITIES[: SEVERITIES.index(min_severity) + 1]
+        entries = [
+            {**e, "first_frames": e["first_frames"][: int(frames_per_entry)]}
+            for e in summary["entries"]
+            if e["severity"] in allowed
+            and (not group or e["group"].lower() == group.strip().lower())
+            and (not protocol or (e["protocol"] or "").lower() == protocol.strip().lower())
+        ]
+        return _ok(
+            {
+                "pcap_path": str(p),
+                "profile": profile or "",
+                "decode_as": effective_decode_as,
+                "preferences": effective_preferences,
+                "frames_with_expert_info": summary["frames_with_expert_info"],
+                "by_severity": summary["by_severity"],
+                "entries_total": len(entries),
+                "entries": entries[: int(limit)],
+            }
+        )
+    except Exception as e:
+        _handle_error(e)
+        raise
+
+
+def _ngap_summary(pcap_path: str, profile: Optional[str], decode_as: Optional[list[str]]) -> tuple[Path, dict[str, Any]]:
+    p = validate_pcap_path(cfg, pcap_path)
+    _, effective_decode_as, effective_preferences, effective_protocols = _resolve_profile(profile, "", decode_as, p=p)
+    summary = cached_ngap_sessions(
+        cfg,
+        p=p,
+        decode_as=effective_decode_as,
+        preferences=effective_preferences,
+        protocols=effective_protocols,
+    )
+    return p, summary
+
+
+def _ngap_page(handle: str, match: Callable[[dict[str, Any]], bool], limit: int, offset: int) -> dict[str, Any]:
+    if limit <= 0 or limit > cfg.max_timeline_rows or offset < 0:
+        raise PcapMcpError(
+            "INVALID_ARGUMENT",
+            "limit must be between 1 and max_timeline_rows, offset non-negative",
+            {"limit": limit, "offset": offset, "max_timeline_rows": cfg.max_timeline_rows},
+        )
+    items: list[dict[str, Any]] = []
+    matched = 0
+    for rec in ngap_records(cfg, handle):
+        if not match(rec):
+            continue
+        if offset <= matched < offset + limit:
+            items.append(rec)
+        matched += 1
+    out: dict[str, Any] = {"handle": handle, "count": matched, "offset": offset, "limit": limit, "items": items}
+    if offset + len(items) < matched:
+        out["next_offset"] = offset + len(items)
+    return out
+
+
+@_tool("pcap_ngap_ue_sessions")
+def pcap_ngap_ue_sessions(
+    pcap_path: str,
+    profile: Optional[str] = None,
+    decode_as: Optional[list[str]] = None,
+    state: Optional[str] = None,
+    ran_ue_ngap_id: Optional[str] = None,
+    amf_ue_ngap_id: Optional[str] = None,
+    imsi: Optional[str] = None,
+    limit: int = 100,
+    offset: int = 0,
+) -> dict[str, Any]:
+    """按 UE 上下文聚合 NGAP 会话（一次 tshark 扫描 + 流式状态机）。
+
+    - 每个 UE 上下文（NG 关联 + RAN UE NGAP ID，切换后随 AMF UE NGAP ID 迁移到目标 gNB）一条记录：起止帧/时间、状态、InitialContextSetup 耗时、释放原因、出现过的 procedure 计数、PDU 会话 ID、IMSI/SUCI
+    - `state`：`initial|context_setup|active|context_setup_failed|releasing|released|reset|superseded`；`ran_ue_ngap_id`/`amf_ue_ngap_id`/`imsi` 精确过滤
+    - 返回全局汇总（各状态计数、procedure 计数、建立时延分位数）；记录按抓包标识 + 解码参数缓存在结果文件中，`handle` 也可交给 `pcap_result_read` 分页
+    - 与 `pcap_ngap_pdu_sessions` 共用同一次扫描
+    """
+    try:
+        if state is not None and state not in UE_STATES:
+            raise PcapMcpError("INVALID_ARGUMENT", "unknown state", {"state": state, "available": list(UE_STATES)})
+        p, summary = _ngap_summary(pcap_path, profile, decode_as)
+
+        def match(rec: dict[str, Any]) -> bool:
+            return (
+                (state is None or rec.get("state") == state)
+                and (not ran_ue_ngap_id or rec.get("ran_ue_ngap_id") == str(ran_ue_ngap_id))
+                and (not amf_ue_ngap_id or rec.get("amf_ue_ngap_id") == str(amf_ue_ngap_id))
+                and (not imsi or rec.get("imsi") == imsi)
+            )
+
+        return _ok(
+            {
+                "pcap_path": str(p),
+                "profile": profile or "",
+                "ngap_frames": summary["ngap_frames"],
+                "ue_contexts": summary["ue_contexts"],
+                "ue_states": summary["ue_states"],
+                "procedures": summary["procedures"],
+                "latency": {k: summary["latency"][k] for k in ("ue_context_setup", "ue_lifetime")},
+                **_ngap_page(summary["ue_handle"], match, int(limit), int(offset)),
+            }
+        )
+    except Exception as e:
+        _handle_error(e)
+        raise
+
+
+@_tool("pcap_ngap_pdu_sessions")
+def pcap_ngap_pdu_sessions(
+    pcap_path: str,
+    profile: Optional[str] = None,
+    decode_as: Optional[list[str]] = None,
+    state: Optional[str] = None,
+    pdu_session_id: Optional[int] = None,
+    ue: Optional[int] = None,
+    limit: int = 100,
+    offset: int = 0,
+) -> dict[str, Any]:
+    """按 PDU 会话聚合 NGAP/NAS 信令（Setup / Modify / Release 及耗时）。
+
+    - 每个（UE 上下文, pDUSessionID）一条记录：状态、Setup 耗时、修改/修改失败次数、失败/释放原因、上下行 N3 隧道（IPv4 + TEID，仅单会话消息）、NAS 5GSM 消息计数
+    - `state`：`nas_requested|setup_requested|active|setup_failed|nas_rejected|releasing|released`；`ue` 为 `pcap_ngap_ue_sessions` 返回的 UE 编号
+    - 返回 Setup/Modify/Release 时延分位数；与 `pcap_ngap_ue_sessions` 共用同一次扫描与缓存
+    """
+    try:
+        if state is not None and state not in PDU_STATES:
+            raise PcapMcpError("INVALID_ARGUMENT", "unknown state", {"state": state, "available": list(PDU_STATES)})
+        p, summary = _ngap_summary(pcap_path, profile, decode_as)
+
+        def match(rec: dict[str, Any]) -> bool:
+            return (
+                (state is None or rec.get("state") == state)
+                and (pdu_session_id is None or rec.get("pdu_session_id") == int(pdu_session_id))
+                and (ue is None or rec.get("ue") == int(ue))
+            )
+
+        return _ok(
+            {
+                "pcap_path": str(p),
+                "profile": profile or "",
+                "ngap_frames": summary["ngap_frames"],
+                "pdu_sessions": summary["pdu_sessions"],
+                "pdu_states": summary["pdu_states"],
+                "latency": {k: summary["latency"][k] for k in ("pdu_setup", "pdu_modify", "pdu_release")},
+                **_ngap_page(summary["pdu_handle"], match, int(limit), int(offset)),
+            }
+        )
+    except Exception as e:
+        _handle_error(e)
+        raise
+
+
+@_tool("pcap_text_search")
 def pcap_text_search(
     pcap_path: str,
     display_filter: str,
@@ -281,40 +793,38 @@ def pcap_text_search(
     snippet_context_chars: int = 240,
     max_bytes: Optional[int] = None,
     decode_as: Optional[list[str]] = None,
+    time_from: Optional[str] = None,
+    time_to: Optional[str] = None,
+    around_frame: Optional[int] = None,
+    around_seconds: float = 5.0,
+    slice_capture: bool = True,
 ) -> dict[str, Any]:
     """在指定过滤条件的帧集合中进行文本搜索。
 
     典型用途：
     - 搜索 `/npcf`、`sm-policies`、`Semantic errors in packet filter` 等关键字
     - 将命中帧号回填给 `pcap_frame_detail` 做进一步下钻
+    - 时间窗：`time_from`/`time_to`（epoch 秒或 `YYYY-MM-DD HH:MM:SS[.ffffff]`，按 `time_offset_hours` 解释），
+      或 `around_frame` ± `around_seconds`；借助稀疏时间戳索引只把该时间段的字节切片交给 tshark
+      （`slice_capture=false` 则改为整文件 + 时间过滤，保留窗口之前的重组/HPACK 上下文；
+      过滤器或字段用到 `frame.time_relative`/`frame.time_delta*`/`tcp.stream`/`udp.stream` 等依赖整文件的值时自动改用时间过滤）
     """
     try:
         p = validate_pcap_path(cfg, pcap_path)
 
-        effective_display_filter = (display_filter or "").strip()
-        profile_decode_as: list[str] = []
-        profile_preferences: list[str] = []
-
-        if profile:
-            prof = _get_profile(profile)
-            if not prof:
-                raise PcapMcpError(
-                    "INVALID_ARGUMENT",
-                    "unknown profile",
-                    {"profile": profile, "available": _available_profile_names()},
-                )
-
-            if (prof.display_filter or "").strip():
-                if effective_display_filter:
-                    effective_display_filter = f"({prof.display_filter}) && ({effective_display_filter})"
-                else:
-                    effective_display_filter = prof.display_filter
-
-            profile_decode_as = list(prof.decode_as)
-            profile_preferences = list(prof.preferences)
+        effective_display_filter, effective_decode_as, effective_preferences, effective_protocols = _resolve_profile(
+            profile, display_filter, decode_as, p=p
+        )
 
-        effective_decode_as = _dedupe_strs([*cfg.global_decode_as, *profile_decode_as, *(decode_as or [])])
-        effective_preferences = _dedupe_strs([*cfg.global_preferences, *profile_preferences])
+        effective_display_filter, capture_slice, time_window = _apply_time_window(
+            p,
+            effective_display_filter,
+            time_from=time_from,
+            time_to=time_to,
+            around_frame=around_frame,
+            around_seconds=around_seconds,
+            slice_capture=bool(slice_capture),
+        )
         effective_max_bytes = int(max_bytes) if max_bytes is not None else cfg.max_detail_bytes
 
         res = _text_search(
@@ -328,11 +838,13 @@ def pcap_text_search(
             restrict_layers=bool(restrict_layers),
             decode_as=effective_decode_as,
             preferences=effective_preferences,
+            protocols=effective_protocols,
             limit=int(limit),
             offset=int(offset),
             max_matches=int(max_matches),
             max_bytes=int(effective_max_bytes),
             snippet_context_chars=int(snippet_context_chars),
+            capture_slice=capture_slice,
         )
 
         return _ok(
@@ -341,6 +853,7 @@ def pcap_text_search(
                 "profile": profile or "",
                 "decode_as": effective_decode_as,
                 "preferences": effective_preferences,
+                "time_window": time_window,
                 **res,
             }
         )
@@ -349,7 +862,7 @@ def pcap_text_search(
         raise
 
 
-@app.tool(name="pcap_timeline")
+@_tool("pcap_timeline")
 def pcap_timeline(
     pcap_path: str,
     display_filter: str,
@@ -359,48 +872,56 @@ def pcap_timeline(
     offset: int = 0,
     sort_by: Optional[str] = None,
     decode_as: Optional[list[str]] = None,
+    time_from: Optional[str] = None,
+    time_to: Optional[str] = None,
+    around_frame: Optional[int] = None,
+    around_seconds: float = 5.0,
+    slice_capture: bool = True,
+    encoding: str = "rows",
+    max_bytes: Optional[int] = None,
 ) -> dict[str, Any]:
     """抽取指定字段形成时间线（类似 Wireshark 自定义列/表格）。
 
     用于对齐多协议时序：例如 SIP / NGAP / NAS / PFCP / HTTP2 / Diameter。
+
+    - 时间窗：`time_from`/`time_to`（epoch 秒或 `YYYY-MM-DD HH:MM:SS[.ffffff]`，按 `time_offset_hours` 解释），
+      或 `around_frame` ± `around_seconds`；借助稀疏时间戳索引只把该时间段的字节切片交给 tshark
+      （`slice_capture=false` 则改为整文件 + 时间过滤，保留窗口之前的重组/HPACK 上下文；
+      过滤器或字段用到 `frame.time_relative`/`frame.time_delta*`/`tcp.stream`/`udp.stream` 等依赖整文件的值时自动改用时间过滤）
+    - `encoding="compact"`：字段名只出现一次（`columns`），`rows` 为按列位置的数组；
+      重复值多的列做字典编码（`dictionaries[col][idx]`），帧号单独以 `frame_runs` 游程编码（`[起始帧号, 连续个数]`）
+    - `max_bytes`：按紧凑 JSON 估算行数据部分（`rows`/`columns`/`dictionaries` 等）的大小，不含响应中的其他字段；
+      超出时自动减少行数并返回 `next_offset` 供翻页；单行已超出时仍返回该行，保证翻页前进
     """
     try:
         _ = sort_by
         p = validate_pcap_path(cfg, pcap_path)
 
-        effective_display_filter = (display_filter or "").strip()
-        profile_decode_as: list[str] = []
-        profile_preferences: list[str] = []
-
-        if profile:
-            prof = _get_profile(profile)
-            if not prof:
-                raise PcapMcpError(
-                    "INVALID_ARGUMENT",
-                    "unknown profile",
-                    {"profile": profile, "available": _available_profile_names()},
-                )
-
-            if (prof.display_filter or "").strip():
-                if effective_display_filter:
-                    effective_display_filter = f"({prof.display_filter}) && ({effective_display_filter})"
-                else:
-                    effective_display_filter = prof.display_filter
-
-            profile_decode_as = list(prof.decode_as)
-            profile_preferences = list(prof.preferences)
+        effective_display_filter, effective_decode_as, effective_preferences, effective_protocols = _resolve_profile(
+            profile, display_filter, decode_as, p=p
+        )
 
-        effective_decode_as = _dedupe_strs([*cfg.global_decode_as, *profile_decode_as, *(decode_as or [])])
-        effective_preferences = _dedupe_strs([*cfg.global_preferences, *profile_preferences])
+        effective_display_filter, capture_slice, time_window = _apply_time_window(
+            p,
+            effective_display_filter,
+            time_from=time_from,
+            time_to=time_to,
+            around_frame=around_frame,
+            around_seconds=around_seconds,
+            slice_capture=bool(slice_capture),
+            fields=fields,
+        )
         res = _timeline(
             cfg,
             p=p,
             display_filter=effective_display_filter,
             decode_as=effective_decode_as,
             preferences=effective_preferences,
+            protocols=effective_protocols,
             fields=fields,
             limit=limit,
             offset=offset,
+            capture_slice=capture_slice,
         )
         return _ok(
             {
@@ -412,7 +933,8 @@ def pcap_timeline(
                 "fields": fields,
                 "limit": limit,
                 "offset": offset,
-                "rows": res.rows,
+                "time_window": time_window,
+                **encode_rows(res.rows, encoding=encoding, max_bytes=max_bytes, offset=offset),
                 "warnings": res.warnings,
             }
         )
@@ -421,54 +943,93 @@ def pcap_timeline(
         raise
 
 
-@app.tool(name="pcap_frames_by_filter")
-def pcap_frames_by_filter(
+@_tool("pcap_timeline_export")
+def pcap_timeline_export(
     pcap_path: str,
     display_filter: str,
-    limit: int = 500,
-    offset: int = 0,
+    fields: list[str],
     profile: Optional[str] = None,
+    output_format: str = "ndjson",
+    max_rows: int = 0,
+    sample_rows: int = 20,
+    output_basename: Optional[str] = None,
     decode_as: Optional[list[str]] = None,
+    time_from: Optional[str] = None,
+    time_to: Optional[str] = None,
+    around_frame: Optional[int] = None,
+    around_seconds: float = 5.0,
+    slice_capture: bool = True,
 ) -> dict[str, Any]:
-    """按 Wireshark Display Filter 筛选并返回 frame.number 列表（分页）。
+    """流式导出时间线到文件（不受 `max_timeline_rows` 限制）。
 
-    常用于：先定位错误帧/关键帧号，再用 `pcap_frame_detail` 下钻。
+    字段与 `pcap_timeline` 相同，但逐行写入 `output_dir/results/` 下的文件，内存占用与行数无关；适合百万行级字段抽取。
+
+    - `output_format`：`ndjson`（每行一个 JSON 对象）或 `columnar`（每 1000 行一组，每行 `{"row": 起始行, "columns": [[字段0的值...], ...]}`）
+    - `max_rows`：最多写入行数（0 表示不限），超出时 `truncated=true`
+    - 返回 `handle`、`rows`、文件大小与前 `sample_rows` 行样本；用 `pcap_result_read(handle, offset, limit)` 按行区间读取
+    - 旁路清单文件（`<文件>.manifest.json`）记录每组的起始行与字节偏移，外部工具也可按字节区间读取
+    - 时间窗参数与 `pcap_timeline` 相同；以 `export` 资源策略与 `export_timeout_s` 运行
     """
     try:
         p = validate_pcap_path(cfg, pcap_path)
+        fmt = (output_format or "").strip().lower()
+        if fmt not in RESULT_FORMATS:
+            raise PcapMcpError("INVALID_ARGUMENT", "unknown output_format", {"output_format": output_format, "available": list(RESULT_FORMATS)})
+        effective_fields = _dedupe_strs(fields)
+        if not effective_fields:
+            raise PcapMcpError("INVALID_ARGUMENT", "fields is empty")
+        if max_rows < 0 or sample_rows < 0:
+            raise PcapMcpError("INVALID_ARGUMENT", "max_rows/sample_rows must be non-negative")
+
+        effective_display_filter, effective_decode_as, effective_preferences, effective_protocols = _resolve_profile(
+            profile, display_filter, decode_as, p=p
+        )
+        effective_display_filter, capture_slice, time_window = _apply_time_window(
+            p,
+            effective_display_filter,
+            time_from=time_from,
+            time_to=time_to,
+            around_frame=around_frame,
+            around_seconds=around_seconds,
+            slice_capture=bool(slice_capture),
+            fields=effective_fields,
+        )
 
-        effective_display_filter = (display_filter or "").strip()
-        profile_decode_as: list[str] = []
-        profile_preferences: list[str] = []
-
-        if profile:
-            prof = _get_profile(profile)
-            if not prof:
-                raise PcapMcpError(
-                    "INVALID_ARGUMENT",
-                    "unknown profile",
-                    {"profile": profile, "available": _available_profile_names()},
-                )
+        safe_base = (output_basename or "").strip() or p.stem
+        safe_base = "".join(ch if (ch.isalnum() or ch in ("-", "_", ".")) else "_" for ch in safe_base)
+        ts = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+        out_path = new_result_path(cfg, f"{safe_base}.timeline.{ts}", fmt)
 
-            if (prof.display_filter or "").strip():
-                if effective_display_filter:
-                    effective_display_filter = f"({prof.display_filter}) && ({effective_display_filter})"
-                else:
-                    effective_display_filter = prof.display_filter
+        writer = ResultWriter(out_path, fmt=fmt, fields=effective_fields)
+        sample: list[dict[str, Any]] = []
+        keep = min(int(sample_rows), 200)
 
-            profile_decode_as = list(prof.decode_as)
-            profile_preferences = list(prof.preferences)
+        def sink(row: dict[str, Any]) -> None:
+            writer.add(row)
+            if len(sample) < keep:
+                sample.append(row)
 
-        effective_decode_as = _dedupe_strs([*cfg.global_decode_as, *profile_decode_as, *(decode_as or [])])
-        effective_preferences = _dedupe_strs([*cfg.global_preferences, *profile_preferences])
-        frames = _frames_by_filter(
-            cfg,
-            p=p,
+        try:
+            res = _timeline_export(
+                cfg,
+                p=p,
+                display_filter=effective_display_filter,
+                decode_as=effective_decode_as,
+                preferences=effective_preferences,
+                protocols=effective_protocols,
+                fields=effective_fields,
+                sink=sink,
+                max_rows=int(max_rows),
+                capture_slice=capture_slice,
+            )
+        except BaseException:
+            writer.abort()
+            raise
+        manifest = writer.close(
+            pcap_path=str(p),
             display_filter=effective_display_filter,
             decode_as=effective_decode_as,
-            preferences=effective_preferences,
-            limit=limit,
-            offset=offset,
+            truncated=res["truncated"],
         )
         return _ok(
             {
@@ -477,9 +1038,54 @@ def pcap_frames_by_filter(
                 "display_filter": effective_display_filter,
                 "decode_as": effective_decode_as,
                 "preferences": effective_preferences,
+                "fields": effective_fields,
+                "time_window": time_window,
+                "handle": out_path.name,
+                "output_path": str(out_path),
+                "output_format": fmt,
+                "rows": manifest["rows"],
+                "bytes": manifest["bytes"],
+                "truncated": res["truncated"],
+                "sample": sample,
+            }
+        )
+    except Exception as e:
+        _handle_error(e)
+        raise
+
+
+@_tool("pcap_result_read")
+def pcap_result_read(
+    handle: str,
+    offset: int = 0,
+    limit: int = 200,
+    encoding: str = "rows",
+    max_bytes: Optional[int] = None,
+) -> dict[str, Any]:
+    """按行区间读取 `pcap_timeline_export` 的结果文件。
+
+    - `handle`：导出返回的文件名（位于 `output_dir/results/`）
+    - 借助清单中的分组字节偏移直接定位，不从头扫描；`limit` 上限为 `max_timeline_rows`
+    - `encoding`/`max_bytes` 与 `pcap_timeline` 相同
+    """
+    try:
+        if limit > cfg.max_timeline_rows:
+            raise PcapMcpError(
+                "INVALID_ARGUMENT",
+                "limit exceeds max_timeline_rows",
+                {"limit": limit, "max_timeline_rows": cfg.max_timeline_rows},
+            )
+        path, manifest = open_result(cfg, handle)
+        rows = read_rows(path, manifest, offset=int(offset), limit=int(limit))
+        return _ok(
+            {
+                "handle": path.name,
+                "output_format": manifest.get("format"),
+                "fields": manifest.get("fields"),
+                "rows_total": manifest.get("rows"),
                 "limit": limit,
                 "offset": offset,
-                "frames": frames,
+                **encode_rows(rows, encoding=encoding, max_bytes=max_bytes, offset=offset),
             }
         )
     except Exception as e:
@@ -487,31 +1093,163 @@ def pcap_frames_by_filter(
         raise
 
 
-@app.tool(name="pcap_frame_detail")
-def pcap_frame_detail(
+@_tool("pcap_frames_by_filter")
+def pcap_frames_by_filter(
     pcap_path: str,
-    frame_numbers: list[int],
-    layers: Optional[list[str]] = None,
-    restrict_layers: bool = True,
+    display_filter: str,
+    limit: int = 500,
+    offset: int = 0,
     profile: Optional[str] = None,
-    verbosity: str = "summary",
-    max_bytes: Optional[int] = None,
     decode_as: Optional[list[str]] = None,
+    time_from: Optional[str] = None,
+    time_to: Optional[str] = None,
+    around_frame: Optional[int] = None,
+    around_seconds: float = 5.0,
+    slice_capture: bool = True,
 ) -> dict[str, Any]:
-    """对指定帧做协议树下钻（tshark -V）。
+    """按 Wireshark Display Filter 筛选并返回 frame.number 列表（分页）。
 
-    - `restrict_layers=true` 且 `layers` 非空：只输出指定协议层（更聚焦）
-    - `restrict_layers=false`：输出完整协议树（更接近 Wireshark 全量下钻）
-    - `verbosity=full`：额外输出十六进制（tshark -x），便于更深排查
-    - `max_bytes`：输出截断保护
+    常用于：先定位错误帧/关键帧号，再用 `pcap_frame_detail` 下钻。
+
+    - 时间窗：`time_from`/`time_to`（epoch 秒或 `YYYY-MM-DD HH:MM:SS[.ffffff]`，按 `time_offset_hours` 解释），
+      或 `around_frame` ± `around_seconds`；借助稀疏时间戳索引只把该时间段的字节切片交给 tshark
+      （`slice_capture=false` 则改为整文件 + 时间过滤，保留窗口之前的重组/HPACK 上下文；
+      过滤器或字段用到 `frame.time_relative`/`frame.time_delta*`/`tcp.stream`/`udp.stream` 等依赖整文件的值时自动改用时间过滤）
     """
     try:
         p = validate_pcap_path(cfg, pcap_path)
 
-        if not frame_numbers:
-            raise PcapMcpError("INVALID_ARGUMENT", "frame_numbers is empty")
+        effective_display_filter, effective_decode_as, effective_preferences, effective_protocols = _resolve_profile(
+            profile, display_filter, decode_as, p=p
+        )
 
-        if len(frame_numbers) > 50:
+        effective_display_filter, capture_slice, time_window = _apply_time_window(
+            p,
+            effective_display_filter,
+            time_from=time_from,
+            time_to=time_to,
+            around_frame=around_frame,
+            around_seconds=around_seconds,
+            slice_capture=bool(slice_capture),
+        )
+        frames = _frames_by_filter(
+            cfg,
+            p=p,
+            display_filter=effective_display_filter,
+            decode_as=effective_decode_as,
+            preferences=effective_preferences,
+            protocols=effective_protocols,
+            limit=limit,
+            offset=offset,
+            capture_slice=capture_slice,
+        )
+        prefetch_frame_details(
+            cfg,
+            p=p,
+            frame_numbers=frames,
+            decode_as=effective_decode_as,
+            preferences=effective_preferences,
+            protocols=effective_protocols,
+        )
+        return _ok(
+            {
+                "pcap_path": str(p),
+                "profile": profile or "",
+                "display_filter": effective_display_filter,
+                "decode_as": effective_decode_as,
+                "preferences": effective_preferences,
+                "limit": limit,
+                "offset": offset,
+                "time_window": time_window,
+                "frames": frames,
+            }
+        )
+    except Exception as e:
+        _handle_error(e)
+        raise
+
+
+def _frame_detail_structured(
+    p: Path,
+    frame_number: int,
+    *,
+    layers: Optional[list[str]],
+    restrict_layers: bool,
+    verbosity: str,
+    decode_as: list[str],
+    preferences: list[str],
+    protocols: list[str],
+    max_bytes: int,
+    fields: Optional[list[str]],
+    expand: Optional[list[str]],
+    depth: int,
+) -> dict[str, Any]:
+    tree, truncated, repaired, cached = cached_frame_detail_json(
+        cfg,
+        p=p,
+        frame_number=frame_number,
+        layers=layers,
+        restrict_layers=restrict_layers,
+        verbosity=verbosity,
+        decode_as=decode_as,
+        preferences=preferences,
+        protocols=protocols,
+        max_bytes=max_bytes,
+    )
+    out: dict[str, Any] = {"frame_number": frame_number, "truncated": truncated, "repaired": repaired, "cached": cached}
+    if fields:
+        matches, limited = project_tree(tree, fields)
+        out["matches"] = matches
+        out["matches_truncated"] = limited
+    if expand:
+        subtrees: dict[str, Any] = {}
+        for ptr in expand:
+            node = resolve_pointer(tree, ptr)
+            subtrees[ptr] = collapse_tree(node, depth, ptr) if node is not None else None
+        out["subtrees"] = subtrees
+    if not fields and not expand:
+        out["layers"] = collapse_tree(tree, depth)
+    return out
+
+
+@_tool("pcap_frame_detail")
+def pcap_frame_detail(
+    pcap_path: str,
+    frame_numbers: list[int],
+    layers: Optional[list[str]] = None,
+    restrict_layers: bool = True,
+    profile: Optional[str] = None,
+    verbosity: str = "summary",
+    max_bytes: Optional[int] = None,
+    decode_as: Optional[list[str]] = None,
+    format: str = "text",
+    fields: Optional[list[str]] = None,
+    expand: Optional[list[str]] = None,
+    depth: int = 3,
+) -> dict[str, Any]:
+    """对指定帧做协议树下钻（tshark -V）。
+
+    - `restrict_layers=true` 且 `layers` 非空：只输出指定协议层（更聚焦）
+    - `restrict_layers=false`：输出完整协议树（更接近 Wireshark 全量下钻）
+    - `verbosity=full`：额外输出十六进制（tshark -x），便于更深排查
+    - `max_bytes`：输出截断保护
+    - `format=json`：结构化协议树（tshark -T json，`layers` 通过 -J 过滤）；读到 `max_bytes` 即停止 tshark，
+      并修复被截断的 JSON（`repaired=true`）
+      - `fields`：字段路径投影，如 `ngap.*.RAN_UE_NGAP_ID`、`nas_5gs.mm.*`（单独的 `*` 匹配任意层级），
+        返回 `matches`（字段名、JSON Pointer、值）
+      - 未给 `fields`/`expand` 时返回 `layers`，超过 `depth` 的子树折叠为 `{"_collapsed": true, "_pointer": ...}`
+      - `expand`：按 JSON Pointer（如 `/ngap/ngap.NGAP_PDU_tree`）展开折叠的子树，返回 `subtrees`
+    - 渲染结果按（抓包标识, 帧号, 层, verbosity, decode_as, 首选项）缓存（`detail_cache_mb`），命中时 `cached=true`；
+      同一次调用中未命中缓存的帧在一次 tshark 中一起渲染；
+      `pcap_frames_by_filter`/`pcap_follow` 返回后会在后台低优先级预取前 `detail_prefetch_frames` 帧的默认视图
+    """
+    try:
+        p = validate_pcap_path(cfg, pcap_path)
+
+        if not frame_numbers:
+            raise PcapMcpError("INVALID_ARGUMENT", "frame_numbers is empty")
+
+        if len(frame_numbers) > 50:
             raise PcapMcpError("INVALID_ARGUMENT", "too many frame_numbers", {"max": 50})
 
         if verbosity not in ("summary", "full"):
@@ -519,42 +1257,52 @@ def pcap_frame_detail(
 
         effective_max_bytes = int(max_bytes) if max_bytes is not None else cfg.max_detail_bytes
 
-        profile_decode_as: list[str] = []
-        profile_preferences: list[str] = []
-        if profile:
-            prof = _get_profile(profile)
-            if not prof:
-                raise PcapMcpError(
-                    "INVALID_ARGUMENT",
-                    "unknown profile",
-                    {"profile": profile, "available": _available_profile_names()},
-                )
-            profile_decode_as = list(prof.decode_as)
-            profile_preferences = list(prof.preferences)
+        if format not in ("text", "json"):
+            raise PcapMcpError("INVALID_ARGUMENT", "format must be text|json")
 
-        effective_decode_as = _dedupe_strs([*cfg.global_decode_as, *profile_decode_as, *(decode_as or [])])
-        effective_preferences = _dedupe_strs([*cfg.global_preferences, *profile_preferences])
+        _, effective_decode_as, effective_preferences, effective_protocols = _resolve_profile(profile, "", decode_as, p=p)
 
         frames_out: list[dict[str, Any]] = []
-        for n in frame_numbers:
-            text, truncated = _frame_detail(
+        if format == "json":
+            for n in frame_numbers:
+                frames_out.append(
+                    _frame_detail_structured(
+                        p,
+                        int(n),
+                        layers=layers,
+                        restrict_layers=bool(restrict_layers),
+                        verbosity=str(verbosity),
+                        decode_as=effective_decode_as,
+                        preferences=effective_preferences,
+                        protocols=effective_protocols,
+                        max_bytes=effective_max_bytes,
+                        fields=fields,
+                        expand=expand,
+                        depth=int(depth),
+                    )
+                )
+        else:
+            details = cached_frame_details(
                 cfg,
                 p=p,
-                frame_number=int(n),
+                frame_numbers=[int(n) for n in frame_numbers],
                 layers=layers,
                 restrict_layers=bool(restrict_layers),
                 verbosity=str(verbosity),
                 decode_as=effective_decode_as,
                 preferences=effective_preferences,
+                protocols=effective_protocols,
                 max_bytes=effective_max_bytes,
             )
-            frames_out.append(
-                {
-                    "frame_number": int(n),
-                    "text": text,
-                    "truncated": truncated,
-                }
-            )
+            for n, (text, truncated, cached) in zip(frame_numbers, details):
+                frames_out.append(
+                    {
+                        "frame_number": int(n),
+                        "text": text,
+                        "truncated": truncated,
+                        "cached": cached,
+                    }
+                )
 
         return _ok(
             {
@@ -564,6 +1312,7 @@ def pcap_frame_detail(
                 "restrict_layers": bool(restrict_layers),
                 "profile": profile or "",
                 "verbosity": verbosity,
+                "format": format,
                 "max_bytes": effective_max_bytes,
                 "decode_as": effective_decode_as,
                 "preferences": effective_preferences,
@@ -575,7 +1324,7 @@ def pcap_frame_detail(
         raise
 
 
-@app.tool(name="pcap_packet_list")
+@_tool("pcap_packet_list")
 def pcap_packet_list(
     pcap_path: str,
     display_filter: str = "",
@@ -586,40 +1335,29 @@ def pcap_packet_list(
     decode_as: Optional[list[str]] = None,
     output_basename: Optional[str] = None,
     preview_rows: int = 50,
+    time_from: Optional[str] = None,
+    time_to: Optional[str] = None,
+    around_frame: Optional[int] = None,
+    around_seconds: float = 5.0,
+    slice_capture: bool = True,
 ) -> dict[str, Any]:
     """导出 Wireshark 风格 Packet List（TSV 文件）。
 
     - 完整结果写入 `output_dir` 下的 TSV 文件
     - 返回文件路径、写入行数、以及少量 `preview_rows` 预览
     - 可通过 `columns_profile`/`extra_columns` 增加 Diameter/HTTP2/SIP 跟踪字段
+    - 时间窗：`time_from`/`time_to`（epoch 秒或 `YYYY-MM-DD HH:MM:SS[.ffffff]`，按 `time_offset_hours` 解释），
+      或 `around_frame` ± `around_seconds`；借助稀疏时间戳索引只把该时间段的字节切片交给 tshark
+      （`slice_capture=false` 则改为整文件 + 时间过滤，保留窗口之前的重组/HPACK 上下文；
+      过滤器或字段用到 `frame.time_relative`/`frame.time_delta*`/`tcp.stream`/`udp.stream` 等依赖整文件的值时自动改用时间过滤）
     """
     try:
         p = validate_pcap_path(cfg, pcap_path)
 
-        effective_display_filter = (display_filter or "").strip()
-        profile_decode_as: list[str] = []
-        profile_preferences: list[str] = []
-
-        if profile:
-            prof = _get_profile(profile)
-            if not prof:
-                raise PcapMcpError(
-                    "INVALID_ARGUMENT",
-                    "unknown profile",
-                    {"profile": profile, "available": _available_profile_names()},
-                )
-
-            if (prof.display_filter or "").strip():
-                if effective_display_filter:
-                    effective_display_filter = f"({prof.display_filter}) && ({effective_display_filter})"
-                else:
-                    effective_display_filter = prof.display_filter
-
-            profile_decode_as = list(prof.decode_as)
-            profile_preferences = list(prof.preferences)
+        effective_display_filter, effective_decode_as, effective_preferences, effective_protocols = _resolve_profile(
+            profile, display_filter, decode_as, p=p
+        )
 
-        effective_decode_as = _dedupe_strs([*cfg.global_decode_as, *profile_decode_as, *(decode_as or [])])
-        effective_preferences = _dedupe_strs([*cfg.global_preferences, *profile_preferences])
         if len(effective_decode_as) > 50:
             raise PcapMcpError("INVALID_ARGUMENT", "too many decode_as entries", {"max": 50})
 
@@ -647,6 +1385,17 @@ def pcap_packet_list(
                     continue
                 req_extra_cols.append((n, f))
 
+        effective_display_filter, capture_slice, time_window = _apply_time_window(
+            p,
+            effective_display_filter,
+            time_from=time_from,
+            time_to=time_to,
+            around_frame=around_frame,
+            around_seconds=around_seconds,
+            slice_capture=bool(slice_capture),
+            fields=[f for _n, f in [*cfg_extra_cols, *req_extra_cols]],
+        )
+
         safe_base = (output_basename or "").strip()
         if not safe_base:
             safe_base = p.stem
@@ -660,9 +1409,11 @@ def pcap_packet_list(
             display_filter=effective_display_filter,
             decode_as=effective_decode_as,
             preferences=effective_preferences,
+            protocols=effective_protocols,
             output_path=out_path,
             extra_columns=[*cfg_extra_cols, *req_extra_cols],
             include_default_columns=bool(include_default_columns),
+            capture_slice=capture_slice,
         )
 
         effective_preview_rows = int(preview_rows)
@@ -692,6 +1443,7 @@ def pcap_packet_list(
                 "columns_profile": columns_profile or "",
                 "include_default_columns": bool(include_default_columns),
                 "display_filter": effective_display_filter,
+                "time_window": time_window,
                 "decode_as": effective_decode_as,
                 "preferences": effective_preferences,
                 "output_path": str(out_path),
@@ -706,5 +1458,547 @@ def pcap_packet_list(
         raise
 
 
+@_tool("pcap_extract_subcapture")
+def pcap_extract_subcapture(
+    pcap_path: str,
+    display_filter: str = "",
+    frame_numbers: Optional[list[int]] = None,
+    follow_frame: Optional[int] = None,
+    profile: Optional[str] = None,
+    time_from: Optional[str] = None,
+    time_to: Optional[str] = None,
+    around_frame: Optional[int] = None,
+    around_seconds: float = 5.0,
+    output_format: Optional[str] = None,
+    output_basename: Optional[str] = None,
+    decode_as: Optional[list[str]] = None,
+) -> dict[str, Any]:
+    """导出子抓包（pcap/pcapng），便于复现与分享。
+
+    选择方式（可组合）：`display_filter`、`frame_numbers`、`follow_frame`（按该帧的 HTTP2/Diameter/SIP 会话）、
+    时间窗（`time_from`/`time_to` 或 `around_frame` ± `around_seconds`）。
+
+    - 帧已知（仅 `frame_numbers` 或仅时间窗）时直接从源文件按帧索引拷贝原始记录，不做任何解码
+    - 需要解码才能判定的条件（过滤器/follow）才回退到 `tshark -w`
+    - 输出写入 `output_dir`，并登记为允许访问的抓包，可直接作为其他工具的 `pcap_path`
+    - `output_format` 默认与源文件一致；`profile` 的 display_filter 只作用于过滤器/follow 方式
+    """
+    try:
+        p = validate_pcap_path(cfg, pcap_path)
+
+        effective_display_filter, effective_decode_as, effective_preferences, effective_protocols = _resolve_profile(
+            profile,
+            display_filter,
+            decode_as,
+            apply_filter=bool((display_filter or "").strip()) or follow_frame is not None,
+            p=p,
+        )
+
+        follow: dict[str, str] = {}
+        if follow_frame is not None:
+            follow = _follow_filter_for_frame(
+                cfg,
+                p=p,
+                frame_number=int(follow_frame),
+                decode_as=effective_decode_as,
+                preferences=effective_preferences,
+                protocols=effective_protocols,
+            )
+            effective_display_filter = and_filters(effective_display_filter, follow.get("display_filter") or "")
+
+        window = resolve_time_window(
+            cfg,
+            p,
+            time_from=time_from,
+            time_to=time_to,
+            around_frame=around_frame,
+            around_seconds=around_seconds,
+        )
+
+        safe_base = (output_basename or "").strip()
+        if not safe_base:
+            safe_base = p.stem
+        safe_base = "".join(ch if (ch.isalnum() or ch in ("-", "_", ".")) else "_" for ch in safe_base)
+        ts = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
+        fmt = (output_format or "").strip().lower() or detect_format(p) or "pcap"
+        out_path = (cfg.output_dir / f"{safe_base}.subcapture.{ts}.{fmt}").resolve()
+
+        res = _extract_subcapture(
+            cfg,
+            p=p,
+            display_filter=effective_display_filter,
+            frame_numbers=frame_numbers,
+            window=window,
+            decode_as=effective_decode_as,
+            preferences=effective_preferences,
+            protocols=effective_protocols,
+            output_format=(output_format or "").strip().lower() or None,
+            output_path=out_path,
+        )
+
+        return _ok(
+            {
+                "pcap_path": str(p),
+                "profile": profile or "",
+                "display_filter": effective_display_filter,
+                "decode_as": effective_decode_as,
+                "preferences": effective_preferences,
+                "follow_type": follow.get("follow_type") or "",
+                "follow_key": follow.get("follow_key") or "",
+                "time_window": {"time_from_epoch": window[0], "time_to_epoch": window[1]} if window else None,
+                **res,
+            }
+        )
+    except Exception as e:
+        _handle_error(e)
+        raise
+
+
+@_tool("pcap_tail")
+def pcap_tail(
+    pcap_path: str,
+    fields: Optional[list[str]] = None,
+    display_filter: str = "",
+    profile: Optional[str] = None,
+    cursor: str = "default",
+    since_frame: Optional[int] = None,
+    limit: int = 200,
+    include_sessions: bool = True,
+    decode_as: Optional[list[str]] = None,
+) -> dict[str, Any]:
+    """跟踪仍在写入中的抓包（tail 模式），只处理上次调用之后新增的帧。
+
+    - 帧/时间索引从上次已索引的字节偏移增量扩展；末尾未写完的记录会被忽略，待写完后再处理
+    - `cursor` 为服务端记住的游标名（默认 `default`），也可直接传 `since_frame`
+    - 返回 `next_since_frame`；`has_more=true` 表示受 `limit` 限制，下一次调用继续
+    - `include_sessions=true` 时增量维护 HTTP2 streamid / Diameter Session-Id / SIP Call-ID 会话索引，
+      返回本次有更新的会话
+    - 增量部分单独交给 tshark 解码，跨越增量边界的重组/HPACK 上下文不会保留
+    """
+    try:
+        p = validate_pcap_path(cfg, pcap_path)
+
+        effective_display_filter, effective_decode_as, effective_preferences, effective_protocols = _resolve_profile(
+            profile, display_filter, decode_as, p=p
+        )
+        effective_fields = list(fields or ["frame.number", "frame.time_epoch", "_ws.col.Protocol", "_ws.col.Info"])
+
+        res = _tail(
+            cfg,
+            p=p,
+            cursor=(cursor or "default").strip() or "default",
+            since_frame=since_frame,
+            display_filter=effective_display_filter,
+            decode_as=effective_decode_as,
+            preferences=effective_preferences,
+            protocols=effective_protocols,
+            fields=effective_fields,
+            limit=int(limit),
+            include_sessions=bool(include_sessions),
+        )
+        return _ok(
+            {
+                "pcap_path": str(p),
+                "profile": profile or "",
+                "display_filter": effective_display_filter,
+                "decode_as": effective_decode_as,
+                "preferences": effective_preferences,
+                "fields": effective_fields,
+                "limit": int(limit),
+                **res,
+            }
+        )
+    except Exception as e:
+        _handle_error(e)
+        raise
+
+
+@_tool("pcap_set_info")
+def pcap_set_info(capture_set: str) -> dict[str, Any]:
+    """查看抓包集合（轮转/分片的多文件抓包）的成员与时间范围。
+
+    `capture_set` 可以是目录或 glob（例如 `probe1/ring_*.pcapng`），必须位于 `allowed_pcap_dirs` 内。
+    每个文件的首/末包时间只索引一次（按文件大小/mtime 缓存），成员按时间排序并分配全局帧号区间。
+    """
+    try:
+        cs = load_capture_set(cfg, capture_set)
+        return _ok(
+            {
+                "capture_set": capture_set,
+                "member_count": len(cs.members),
+                "packet_count": cs.packet_count,
+                "time_start_epoch": min((m.first_ts for m in cs.members if m.first_ts is not None), default=None),
+                "time_end_epoch": max((m.last_ts for m in cs.members if m.last_ts is not None), default=None),
+                "members": [member_summary(m, base) for m, base in zip(cs.members, cs.frame_bases)],
+            }
+        )
+    except Exception as e:
+        _handle_error(e)
+        raise
+
+
+def _set_timeline_query(
+    capture_set: str,
+    display_filter: str,
+    fields: list[str],
+    *,
+    profile: Optional[str],
+    time_from: Optional[str],
+    time_to: Optional[str],
+    limit: int,
+    offset: int,
+    decode_as: Optional[list[str]],
+) -> dict[str, Any]:
+    # Shared by pcap_set_timeline and pcap_set_frames_by_filter; calling the wrapped tool
+    # instead would record one client call twice in the tool metrics.
+    cs = load_capture_set(cfg, capture_set)
+
+    effective_display_filter, effective_decode_as, effective_preferences, effective_protocols = _resolve_profile(
+        profile, display_filter, decode_as
+    )
+    res = _set_timeline(
+        cfg,
+        cs=cs,
+        display_filter=effective_display_filter,
+        decode_as=effective_decode_as,
+        preferences=effective_preferences,
+        protocols=effective_protocols,
+        fields=fields,
+        limit=int(limit),
+        offset=int(offset),
+        time_from=parse_time_bound(cfg, time_from, name="time_from"),
+        time_to=parse_time_bound(cfg, time_to, name="time_to"),
+    )
+    return {
+        "capture_set": capture_set,
+        "profile": profile or "",
+        "decode_as": effective_decode_as,
+        "preferences": effective_preferences,
+        "fields": fields,
+        "limit": int(limit),
+        "offset": int(offset),
+        **res,
+    }
+
+
+@_tool("pcap_set_timeline")
+def pcap_set_timeline(
+    capture_set: str,
+    display_filter: str,
+    fields: list[str],
+    profile: Optional[str] = None,
+    time_from: Optional[str] = None,
+    time_to: Optional[str] = None,
+    limit: int = 200,
+    offset: int = 0,
+    decode_as: Optional[list[str]] = None,
+    encoding: str = "rows",
+    max_bytes: Optional[int] = None,
+) -> dict[str, Any]:
+    """在抓包集合上抽取字段时间线（多文件视为一个逻辑抓包）。
+
+    - 只打开与 `time_from`/`time_to` 有时间重叠的文件，并行执行
+    - 结果按时间戳归并，`frame_number` 为集合内全局帧号，`capture`/`capture_frame_number` 指回原文件
+    - 时间可用 epoch 秒或 `YYYY-MM-DD HH:MM:SS[.ffffff]`（按 `time_offset_hours` 解释）
+    - `encoding`/`max_bytes` 同 `pcap_timeline`
+    """
+    try:
+        res = _set_timeline_query(
+            capture_set,
+            display_filter,
+            fields,
+            profile=profile,
+            time_from=time_from,
+            time_to=time_to,
+            limit=limit,
+            offset=offset,
+            decode_as=decode_as,
+        )
+        res.update(encode_rows(res.pop("rows"), encoding=encoding, max_bytes=max_bytes, offset=int(offset)))
+        return _ok(res)
+    except Exception as e:
+        _handle_error(e)
+        raise
+
+
+@_tool("pcap_set_frames_by_filter")
+def pcap_set_frames_by_filter(
+    capture_set: str,
+    display_filter: str,
+    profile: Optional[str] = None,
+    time_from: Optional[str] = None,
+    time_to: Optional[str] = None,
+    limit: int = 500,
+    offset: int = 0,
+    decode_as: Optional[list[str]] = None,
+) -> dict[str, Any]:
+    """在抓包集合上按 Display Filter 筛选帧，返回全局帧号及其所在文件（按时间归并）。"""
+    try:
+        res = _set_timeline_query(
+            capture_set,
+            display_filter,
+            [],
+            profile=profile,
+            time_from=time_from,
+            time_to=time_to,
+            limit=limit,
+            offset=offset,
+            decode_as=decode_as,
+        )
+        rows = res.pop("rows")
+        res.pop("fields", None)
+        res["frames"] = [r["frame_number"] for r in rows]
+        res["frame_locations"] = [
+            {"frame_number": r["frame_number"], "capture": r["capture"], "capture_frame_number": r["capture_frame_number"]}
+            for r in rows
+        ]
+        return _ok(res)
+    except Exception as e:
+        _handle_error(e)
+        raise
+
+
+@_tool("pcap_merged_timeline")
+def pcap_merged_timeline(
+    captures: list[str],
+    display_filter: str,
+    fields: list[str],
+    profile: Optional[str] = None,
+    decode_as: Optional[list[str]] = None,
+    labels: Optional[list[str]] = None,
+    offsets_s: Optional[dict[str, float]] = None,
+    estimate_offsets_from: Optional[list[str]] = None,
+    correlate_filter: str = "",
+    time_from: Optional[str] = None,
+    time_to: Optional[str] = None,
+    limit: int = 200,
+    offset: int = 0,
+    encoding: str = "rows",
+    max_bytes: Optional[int] = None,
+) -> dict[str, Any]:
+    """多探针（多抓包点）合并时间线：各抓包分别抽取字段，按校正后的时间戳 k 路归并（不生成合并 pcap）。
+
+    - `captures`：各探针的抓包（如 N2、N4、SBI），`labels` 可给每个抓包起名（默认文件名）
+    - `offsets_s`：每个抓包的时钟偏差（秒，加到该抓包时间戳上），键为 `captures` 中的写法或解析后的路径
+    - `estimate_offsets_from`：用同时出现在多个抓包中的报文估计偏差，值为关联字段（如 `["sip.Call-ID", "sip.CSeq"]`；
+      传空列表则用 `ip.src/ip.dst/ip.id/ip.len` 匹配同一个 IP 包）。以第一个抓包（或 `offsets_s` 中给定的抓包）为基准，
+      取各关联报文时间差的中位数，结果含探针间单向传输时延，见 `offset_estimates`
+    - `correlate_filter`：估计偏差时额外的过滤器
+    - 每行带 `capture`/`label`/`capture_frame_number`、校正后 `time_epoch` 与原始 `raw_time_epoch`；
+      `time_from`/`time_to` 按校正后时间解释；`encoding`/`max_bytes` 同 `pcap_timeline`
+    """
+    try:
+        if not captures:
+            raise PcapMcpError("INVALID_ARGUMENT", "captures is empty")
+        if len(captures) > MAX_MERGE_CAPTURES:
+            raise PcapMcpError("INVALID_ARGUMENT", "too many captures", {"max": MAX_MERGE_CAPTURES})
+        paths = [validate_pcap_path(cfg, c) for c in captures]
+        if labels is not None and len(labels) != len(paths):
+            raise PcapMcpError("INVALID_ARGUMENT", "labels must have one entry per capture")
+        effective_labels = list(labels) if labels is not None else [p.name for p in paths]
+
+        known: dict[int, float] = {}
+        for key, value in (offsets_s or {}).items():
+            idx = [i for i, (c, p) in enumerate(zip(captures, paths)) if key in (c, str(p))]
+            if not idx:
+                raise PcapMcpError("INVALID_ARGUMENT", "offsets_s key does not name a capture", {"key": key})
+            for i in idx:
+                known[i] = float(value)
+
+        effective_display_filter, effective_decode_as, effective_preferences, effective_protocols = _resolve_profile(
+            profile, display_filter, decode_as
+        )
+        sources = {i: "given" for i in known}
+        estimates: list[dict[str, Any]] = []
+        if estimate_offsets_from is not None and len(paths) > 1:
+            if not known:
+                sources[0] = "reference"
+            known, estimates = estimate_offsets(
+                cfg,
+                paths,
+                known,
+                fields=_dedupe_strs(estimate_offsets_from) or list(DEFAULT_CORRELATE_FIELDS),
+                display_filter=correlate_filter,
+                decode_as=effective_decode_as,
+                preferences=effective_preferences,
+                protocols=effective_protocols,
+            )
+            sources.update({i: "estimated" for i in known if i not in sources})
+
+        res = merged_timeline(
+            cfg,
+            paths=paths,
+            offsets=known,
+            labels=effective_labels,
+            display_filter=effective_display_filter,
+            decode_as=effective_decode_as,
+            preferences=effective_preferences,
+            protocols=effective_protocols,
+            fields=_dedupe_strs(fields),
+            limit=int(limit),
+            offset=int(offset),
+            time_from=parse_time_bound(cfg, time_from, name="time_from"),
+            time_to=parse_time_bound(cfg, time_to, name="time_to"),
+        )
+        res.update(encode_rows(res.pop("rows"), encoding=encoding, max_bytes=max_bytes, offset=int(offset)))
+        return _ok(
+            {
+                "profile": profile or "",
+                "display_filter": effective_display_filter,
+                "decode_as": effective_decode_as,
+                "preferences": effective_preferences,
+                "fields": fields,
+                "limit": int(limit),
+                "offset": int(offset),
+                "captures": [
+                    {
+                        "pcap_path": str(p),
+                        "label": effective_labels[i],
+                        "offset_s": known.get(i, 0.0),
+                        "offset_source": sources.get(i, "none"),
+                    }
+                    for i, p in enumerate(paths)
+                ],
+                "offset_estimates": estimates,
+                **res,
+            }
+        )
+    except Exception as e:
+        _handle_error(e)
+        raise
+
+
+def _fanout_progress(ctx: Optional[Context]) -> ResultCallback:
+    async def report(result: dict[str, Any], done: int, total: int) -> None:
+        if ctx is None:
+            return
+        summary = {k: result[k] for k in ("pcap_path", "matched", "count", "error") if k in result}
+        await ctx.report_progress(done, total, json.dumps(summary, ensure_ascii=False))
+
+    return report
+
+
+@_tool("pcap_fanout_frames_by_filter")
+async def pcap_fanout_frames_by_filter(
+    captures: list[str],
+    display_filter: str,
+    profile: Optional[str] = None,
+    decode_as: Optional[list[str]] = None,
+    limit: int = 100,
+    stop_after_matches: Optional[int] = None,
+    ctx: Optional[Context] = None,
+) -> dict[str, Any]:
+    """对多个抓包并行执行同一个 Display Filter（“这 30 个抓包里哪些有 Diameter Result-Code 5030？”）。
+
+    - `captures`：抓包路径、目录或 glob 的列表（均须位于 `allowed_pcap_dirs` 内）
+    - 最多 `capture_set_workers` 个 tshark 并行；每个抓包完成即发送一条 MCP 进度通知（message 为该抓包的 JSON 摘要）
+    - 每个抓包最多返回 `limit` 个帧号；`stop_after_matches=N`：已有 N 个抓包命中即停止，未开始的抓包列在 `captures_not_completed`
+    - 单个抓包失败只记录在该抓包的 `error` 中，不影响其他抓包
+    """
+    try:
+        paths = resolve_captures(cfg, captures)
+        effective_display_filter, effective_decode_as, effective_preferences, effective_protocols = _resolve_profile(
+            profile, display_filter, decode_as
+        )
+
+        def query(p: Path) -> dict[str, Any]:
+            frames = _frames_by_filter(
+                cfg,
+                p=p,
+                display_filter=effective_display_filter,
+                decode_as=effective_decode_as,
+                preferences=effective_preferences,
+                protocols=effective_protocols,
+                limit=int(limit),
+                offset=0,
+            )
+            return {"matched": bool(frames), "count": len(frames), "frames": frames}
+
+        res = await fan_out(
+            cfg, paths, query, stop_after_matches=stop_after_matches, on_result=_fanout_progress(ctx)
+        )
+        return _ok(
+            {
+                "profile": profile or "",
+                "display_filter": effective_display_filter,
+                "decode_as": effective_decode_as,
+                "preferences": effective_preferences,
+                "limit": int(limit),
+                **res,
+            }
+        )
+    except Exception as e:
+        _handle_error(e)
+        raise
+
+
+@_tool("pcap_fanout_timeline")
+async def pcap_fanout_timeline(
+    captures: list[str],
+    display_filter: str,
+    fields: list[str],
+    profile: Optional[str] = None,
+    decode_as: Optional[list[str]] = None,
+    limit: int = 200,
+    stop_after_matches: Optional[int] = None,
+    encoding: str = "rows",
+    ctx: Optional[Context] = None,
+) -> dict[str, Any]:
+    """对多个抓包并行抽取同一组字段（每个抓包各自一份时间线，按完成顺序返回）。
+
+    - `captures`/并行度/进度通知/`stop_after_matches` 同 `pcap_fanout_frames_by_filter`
+    - 每个抓包最多 `limit` 行；`encoding="compact"` 同 `pcap_timeline`
+    """
+    try:
+        paths = resolve_captures(cfg, captures)
+        effective_display_filter, effective_decode_as, effective_preferences, effective_protocols = _resolve_profile(
+            profile, display_filter, decode_as
+        )
+        effective_fields = _dedupe_strs(fields)
+        if not effective_fields:
+            raise PcapMcpError("INVALID_ARGUMENT", "fields is empty")
+        encode_rows([], encoding=encoding)
+
+        def query(p: Path) -> dict[str, Any]:
+            res = _timeline(
+                cfg,
+                p=p,
+                display_filter=effective_display_filter,
+                decode_as=effective_decode_as,
+                preferences=effective_preferences,
+                protocols=effective_protocols,
+                fields=effective_fields,
+                limit=int(limit),
+                offset=0,
+            )
+            return {
+                "matched": bool(res.rows),
+                "count": len(res.rows),
+                **encode_rows(res.rows, encoding=encoding),
+                "warnings": res.warnings,
+            }
+
+        res = await fan_out(
+            cfg, paths, query, stop_after_matches=stop_after_matches, on_result=_fanout_progress(ctx)
+        )
+        return _ok(
+            {
+                "profile": profile or "",
+                "display_filter": effective_display_filter,
+                "decode_as": effective_decode_as,
+                "preferences": effective_preferences,
+                "fields": effective_fields,
+                "limit": int(limit),
+                **res,
+            }
+        )
+    except Exception as e:
+        _handle_error(e)
+        raise
+
+
 def main() -> None:
+    # The JSON-RPC handshake must not wait for tshark; probes and pre-indexing run in the background.
+    start_warmup(cfg)
+    metrics.start_exporter(cfg.metrics_export, cfg.metrics_export_path, cfg.metrics_export_interval_s)
     app.run()
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any, Optional
+
+from .config import Config
+from .errors import PcapMcpError
+from .paths import register_capture
+from .pcapfile import CaptureFile
+from .timeindex import CaptureSlice, TimeIndex, filter_allows_slicing, get_time_index, slice_for_window
+from .timewin import and_filters, time_window_filter
+from .tshark_tools import write_filtered_capture
+
+
+MAX_SUBCAPTURE_FRAMES = 100000
+MAX_FILTER_FRAMES = 5000
+
+
+def copy_frames(idx: TimeIndex, frames: list[int], output_path: Path) -> int:
+    written = 0
+    with CaptureFile(idx.path) as cf, output_path.open("wb") as out:
+        out.write(idx.preamble)
+        it = None
+        next_frame = 0
+        for n in frames:
+            cp = (n - 1) // idx.stride
+            # Restart from the nearest checkpoint unless the wanted frame is within one
+            # stride of the current read position.
+            if it is None or next_frame > n or n - next_frame > idx.stride:
+                it = cf.iter_records(idx.cp_offsets[cp])
+                next_frame = cp * idx.stride + 1
+            for rec in it:
+                cur = next_frame
+                next_frame += 1
+                if cur == n:
+                    view = cf.buf[rec.offset : rec.offset + rec.size]
+                    try:
+                        out.write(view)
+                    finally:
+                        view.release()
+                    written += 1
+                    break
+    return written
+
+
+def copy_slice(capture_slice: CaptureSlice, output_path: Path) -> int:
+    with output_path.open("wb") as out:
+        for chunk in capture_slice.iter_chunks():
+            out.write(chunk)
+    return capture_slice.frame_count
+
+
+def _count_records(p: Path) -> int:
+    with CaptureFile(p) as cf:
+        return sum(1 for _rec in cf.iter_records())
+
+
+def extract_subcapture(
+    cfg: Config,
+    *,
+    p: Path,
+    display_filter: str,
+    frame_numbers: Optional[list[int]],
+    window: Optional[tuple[Optional[float], Optional[float]]],
+    decode_as: Optional[list[str]],
+    preferences: Optional[list[str]],
+    protocols: Optional[list[str]],
+    output_format: Optional[str],
+    output_path: Path,
+) -> dict[str, Any]:
+    idx = get_time_index(cfg, p)
+    fmt = (output_format or idx.format).strip().lower()
+    if fmt not in ("pcap", "pcapng"):
+        raise PcapMcpError("INVALID_ARGUMENT", "output_format must be pcap|pcapng")
+
+    frames = sorted({int(x) for x in (frame_numbers or [])})
+    if len(frames) > MAX_SUBCAPTURE_FRAMES:
+        raise PcapMcpError("INVALID_ARGUMENT", "too many frame_numbers", {"max": MAX_SUBCAPTURE_FRAMES})
+    if frames and (frames[0] <= 0 or frames[-1] > idx.packet_count):
+        raise PcapMcpError(
+            "INVALID_ARGUMENT",
+            "frame_numbers out of range",
+            {"min": frames[0], "max": frames[-1], "packet_count": idx.packet_count},
+        )
+    if not display_filter and not frames and window is None:
+        raise PcapMcpError("INVALID_ARGUMENT", "one of display_filter/frame_numbers/follow/time window is required")
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    method = ""
+    frames_written = 0
+
+    # Frames are known without dissection: copy the raw records behind the source preamble.
+    if not display_filter and idx.copyable and (bool(frames) != (window is not None)):
+        target = output_path if fmt == idx.format else output_path.with_name(output_path.name + ".raw")
+        if frames:
+            frames_written = copy_frames(idx, frames, target)
+            method = "zero_copy"
+        else:
+            capture_slice = slice_for_window(cfg, p, window[0], window[1]) if window else None
+            if capture_slice is not None:
+                frames_written = copy_slice(capture_slice, target)
+                method = "zero_copy"
+        if method and target != output_path:
+            try:
+                write_filtered_capture(cfg, p=target, display_filter="", output_path=output_path, output_format=fmt)
+            finally:
+                target.unlink(missing_ok=True)
+            method = "zero_copy+convert"
+
+    if not method:
+        if len(frames) > MAX_FILTER_FRAMES:
+            raise PcapMcpError(
+                "INVALID_ARGUMENT",
+                "too many frame_numbers for filter-based extraction",
+                {"max": MAX_FILTER_FRAMES},
+            )
+        frames_filter = f"frame.number in {{{' '.join(str(n) for n in frames)}}}" if frames else ""
+        effective_filter = and_filters(display_filter, frames_filter)
+        capture_slice = None
+        if window is not None and filter_allows_slicing(effective_filter):
+            capture_slice = slice_for_window(cfg, p, window[0], window[1])
+        if window is not None and capture_slice is None:
+            effective_filter = and_filters(effective_filter, time_window_filter(window[0], window[1]))
+
+        write_filtered_capture(
+            cfg,
+            p=p,
+            display_filter=effective_filter,
+            decode_as=decode_as,
+            preferences=preferences,
+            protocols=protocols,
+            output_path=output_path,
+            output_format=fmt,
+            capture_slice=capture_slice,
+        )
+        frames_written = _count_records(output_path)
+        method = "tshark"
+
+    register_capture(cfg, output_path)
+    try:
+        file_size = output_path.stat().st_size
+    except Exception:
+        file_size = None
+
+    return {
+        "output_path": str(output_path),
+        "output_format": fmt,
+        "source_format": idx.format,
+        "method": method,
+        "frames_written": frames_written,
+        "file_size_bytes": file_size,
+        "registered": True,
+    }
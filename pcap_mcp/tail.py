@@ -0,0 +1,276 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from pathlib import Path
+import threading
+from typing import Any, Optional
+
+from .config import Config
+from .errors import PcapMcpError
+from .timeindex import CaptureSlice, TimeIndex, filter_allows_slicing, get_time_index, locate_frame
+from .timewin import and_filters
+from .tshark_tools import timeline
+
+
+SESSION_KEY_FIELDS = ("http2.streamid", "diameter.Session-Id", "sip.Call-ID")
+MAX_TAIL_SESSIONS = 50000
+MAX_TAIL_CURSORS = 64
+# Tail state of the least recently tailed captures is dropped beyond this many.
+MAX_TAIL_STATES = 32
+
+
+@dataclass
+class TailSession:
+    follow_type: str
+    follow_key: str
+    first_frame: int
+    last_frame: int
+    frames: int
+    first_ts: Optional[float]
+    last_ts: Optional[float]
+
+    def to_dict(self) -> dict[str, Any]:
+        return {
+            "follow_type": self.follow_type,
+            "follow_key": self.follow_key,
+            "first_frame": self.first_frame,
+            "last_frame": self.last_frame,
+            "frames": self.frames,
+            "first_ts": self.first_ts,
+            "last_ts": self.last_ts,
+        }
+
+
+@dataclass
+class TailState:
+    path: Path
+    cursors: dict[str, int] = field(default_factory=dict)
+    sessions: dict[tuple[str, str], TailSession] = field(default_factory=dict)
+    sessions_frame: int = 0
+    sessions_settings: tuple[tuple[str, ...], ...] = ((), (), ())
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+_states: OrderedDict[str, TailState] = OrderedDict()
+_states_lock = threading.Lock()
+
+
+def get_tail_state(p: Path) -> TailState:
+    with _states_lock:
+        st = _states.get(str(p))
+        if st is None:
+            st = TailState(path=p)
+            _states[str(p)] = st
+        _states.move_to_end(str(p))
+        while len(_states) > MAX_TAIL_STATES:
+            _states.popitem(last=False)
+        return st
+
+
+def _delta_slice(idx: TimeIndex, since_frame: int) -> Optional[CaptureSlice]:
+    if not idx.copyable:
+        return None
+    return CaptureSlice(
+        path=idx.path,
+        preamble=idx.preamble,
+        start=locate_frame(idx, since_frame + 1),
+        end=idx.end_offset,
+        first_frame=since_frame + 1,
+        frame_count=max(0, idx.packet_count - since_frame),
+    )
+
+
+def _delta_rows(
+    cfg: Config,
+    *,
+    idx: TimeIndex,
+    since_frame: int,
+    display_filter: str,
+    decode_as: Optional[list[str]],
+    preferences: Optional[list[str]],
+    protocols: Optional[list[str]],
+    fields: list[str],
+    limit: int,
+) -> tuple[list[dict[str, Any]], list[str], int]:
+    # Returns (rows, warnings, last frame covered). When the row limit is hit the cursor
+    # only advances to the last returned frame so the rest is picked up by the next call.
+    if since_frame >= idx.packet_count:
+        return [], [], idx.packet_count
+    if limit <= 0:
+        return [], [], since_frame
+
+    query_fields = ["frame.number", *[f for f in fields if f != "frame.number"]]
+    # A filter or field that depends on whole-file numbering (frame.number, tcp.stream,
+    # frame.time_relative, ...) would see the slice's own numbering; those read the whole file.
+    capture_slice = _delta_slice(idx, since_frame) if filter_allows_slicing(display_filter, query_fields) else None
+    effective_filter = display_filter
+    if capture_slice is None:
+        effective_filter = and_filters(display_filter, f"frame.number > {since_frame}")
+
+    res = timeline(
+        cfg,
+        p=idx.path,
+        display_filter=effective_filter,
+        decode_as=decode_as,
+        preferences=preferences,
+        protocols=protocols,
+        fields=query_fields,
+        limit=limit,
+        offset=0,
+        capture_slice=capture_slice,
+    )
+    covered = idx.packet_count
+    if len(res.rows) >= limit and res.rows:
+        try:
+            covered = int(str(res.rows[-1].get("frame.number") or covered))
+        except ValueError:
+            pass
+    return res.rows, list(res.warnings), covered
+
+
+def _as_values(v: Any) -> list[str]:
+    if isinstance(v, list):
+        return [str(x) for x in v if str(x)]
+    s = str(v or "")
+    return [s] if s else []
+
+
+def update_sessions(
+    cfg: Config,
+    state: TailState,
+    idx: TimeIndex,
+    *,
+    decode_as: Optional[list[str]],
+    preferences: Optional[list[str]],
+    protocols: Optional[list[str]],
+) -> tuple[list[TailSession], bool]:
+    settings = (tuple(decode_as or ()), tuple(preferences or ()), tuple(protocols or ()))
+    if settings != state.sessions_settings or state.sessions_frame > idx.packet_count:
+        state.sessions.clear()
+        state.sessions_frame = 0
+        state.sessions_settings = settings
+
+    rows, _warnings, covered = _delta_rows(
+        cfg,
+        idx=idx,
+        since_frame=state.sessions_frame,
+        display_filter=" || ".join(SESSION_KEY_FIELDS),
+        decode_as=decode_as,
+        preferences=preferences,
+        protocols=protocols,
+        fields=["frame.number", "frame.time_epoch", *SESSION_KEY_FIELDS],
+        limit=cfg.max_timeline_rows,
+    )
+
+    touched: dict[tuple[str, str], TailSession] = {}
+    for r in rows:
+        try:
+            frame = int(str(r.get("frame.number") or "0"))
+        except ValueError:
+            continue
+        try:
+            ts: Optional[float] = float(str(r.get("frame.time_epoch") or ""))
+        except ValueError:
+            ts = None
+        for key_field in SESSION_KEY_FIELDS:
+            for v in dict.fromkeys(_as_values(r.get(key_field))):
+                if key_field == "http2.streamid" and v == "0":
+                    continue
+                k = (key_field, v)
+                sess = state.sessions.get(k)
+                if sess is None:
+                    sess = TailSession(key_field, v, frame, frame, 0, ts, ts)
+                    state.sessions[k] = sess
+                sess.last_frame = frame
+                sess.last_ts = ts if ts is not None else sess.last_ts
+                sess.frames += 1
+                touched[k] = sess
+
+    state.sessions_frame = covered
+    if len(state.sessions) > MAX_TAIL_SESSIONS:
+        oldest = sorted(state.sessions.items(), key=lambda kv: kv[1].last_frame)
+        for k, _sess in oldest[: len(state.sessions) - MAX_TAIL_SESSIONS]:
+            del state.sessions[k]
+
+    return list(touched.values()), covered < idx.packet_count
+
+
+def tail(
+    cfg: Config,
+    *,
+    p: Path,
+    cursor: str,
+    since_frame: Optional[int],
+    display_filter: str,
+    decode_as: Optional[list[str]],
+    preferences: Optional[list[str]],
+    protocols: Optional[list[str]],
+    fields: list[str],
+    limit: int,
+    include_sessions: bool,
+    max_sessions: int = 100,
+) -> dict[str, Any]:
+    if limit < 0:
+        raise PcapMcpError("INVALID_ARGUMENT", "limit must be non-negative")
+    if limit > cfg.max_timeline_rows:
+        raise PcapMcpError(
+            "INVALID_ARGUMENT",
+            "limit exceeds max_timeline_rows",
+            {"limit": limit, "max_timeline_rows": cfg.max_timeline_rows},
+        )
+
+    state = get_tail_state(p)
+    with state.lock:
+        idx = get_time_index(cfg, p)
+
+        start = int(since_frame) if since_frame is not None else state.cursors.get(cursor, 0)
+        reset = False
+        if start < 0:
+            raise PcapMcpError("INVALID_ARGUMENT", "since_frame must be non-negative")
+        if start > idx.packet_count:
+            # The capture shrank (rotated or rewritten); start over.
+            start = 0
+            reset = True
+
+        rows, warnings, covered = _delta_rows(
+            cfg,
+            idx=idx,
+            since_frame=start,
+            display_filter=display_filter,
+            decode_as=decode_as,
+            preferences=preferences,
+            protocols=protocols,
+            fields=fields,
+            limit=limit,
+        )
+
+        if cursor not in state.cursors and len(state.cursors) >= MAX_TAIL_CURSORS:
+            state.cursors.pop(next(iter(state.cursors)))
+        state.cursors[cursor] = covered
+
+        out: dict[str, Any] = {
+            "packet_count": idx.packet_count,
+            "indexed_bytes": idx.end_offset,
+            "file_size_bytes": idx.size,
+            "partial_tail_bytes": max(0, idx.size - idx.end_offset),
+            "cursor": cursor,
+            "since_frame": start,
+            "next_since_frame": covered,
+            "has_more": covered < idx.packet_count,
+            "reset": reset,
+            "rows": rows,
+            "warnings": warnings,
+        }
+
+        if include_sessions:
+            touched, pending = update_sessions(
+                cfg, state, idx, decode_as=decode_as, preferences=preferences, protocols=protocols
+            )
+            touched.sort(key=lambda s: s.last_frame, reverse=True)
+            out["sessions_indexed_frame"] = state.sessions_frame
+            out["sessions_pending"] = pending
+            out["session_count"] = len(state.sessions)
+            out["sessions_updated"] = [s.to_dict() for s in touched[: max(0, int(max_sessions))]]
+
+        return out
@@ -0,0 +1,323 @@
+from __future__ import annotations
+
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+import threading
+from typing import Any, Iterable, Iterator, Optional
+
+from . import metrics
+from .config import Config
+from .errors import PcapMcpError
+from .identity import capture_identity
+from .pcapfile import CaptureFile
+from .timewin import parse_time_bound
+
+
+_SLICE_CHUNK_BYTES = 1 << 20
+# Least recently used indexes are dropped beyond this many captures.
+MAX_CACHED_TIME_INDEXES = 64
+
+# Values that depend on the first frame of the file, on the previous frame, or on how many
+# conversations came before (stream/association indexes) change when only a slice is read.
+_SLICE_UNSAFE_FIELD_TOKENS = (
+    "frame.time_relative",
+    "frame.time_delta",
+    "tcp.time_relative",
+    "tcp.time_delta",
+    "tcp.stream",
+    "udp.stream",
+    "sctp.assoc_index",
+)
+# Returned frame numbers are re-based onto the whole file, but a filter on them is not.
+_SLICE_UNSAFE_FILTER_TOKENS = ("frame.number", *_SLICE_UNSAFE_FIELD_TOKENS)
+
+
+@dataclass(frozen=True)
+class TimeIndex:
+    path: Path
+    size: int
+    mtime_ns: int
+    format: str
+    preamble: bytes
+    end_offset: int
+    packet_count: int
+    stride: int
+    cp_ts: array
+    cp_offsets: array
+    first_ts: Optional[float]
+    last_ts: Optional[float]
+    monotonic: bool
+    has_untimed: bool
+    copyable: bool
+    sliceable: bool
+
+
+@dataclass(frozen=True)
+class CaptureSlice:
+    path: Path
+    preamble: bytes
+    start: int
+    end: int
+    first_frame: int
+    frame_count: int
+
+    @property
+    def frame_base(self) -> int:
+        return self.first_frame - 1
+
+    def iter_chunks(self) -> Iterator[bytes]:
+        yield self.preamble
+        if self.end <= self.start:
+            return
+        with CaptureFile(self.path) as cf:
+            end = min(self.end, cf.size)
+            off = self.start
+            while off < end:
+                nxt = min(end, off + _SLICE_CHUNK_BYTES)
+                yield bytes(cf.buf[off:nxt])
+                off = nxt
+
+    def describe(self) -> dict[str, Any]:
+        return {
+            "first_frame": self.first_frame,
+            "frame_count": self.frame_count,
+            "byte_start": self.start,
+            "byte_end": self.end,
+        }
+
+
+_index_cache: OrderedDict[str, TimeIndex] = OrderedDict()
+_index_lock = threading.Lock()
+
+
+def build_time_index(p: Path, *, stride: int, resume: Optional[TimeIndex] = None) -> TimeIndex:
+    # With ``resume`` the walk continues from the previous index's end_offset, so a capture
+    # that is still being appended to is only ever read once.
+    stride = max(1, int(stride))
+    st = p.stat()
+
+    if resume is not None:
+        stride = resume.stride
+        cp_ts = array("d", resume.cp_ts)
+        cp_offsets = array("q", resume.cp_offsets)
+        count = resume.packet_count
+        first = resume.first_ts
+        last = resume.last_ts
+        monotonic = resume.monotonic
+        has_untimed = resume.has_untimed
+        start: Optional[int] = resume.end_offset
+    else:
+        cp_ts = array("d")
+        cp_offsets = array("q")
+        count = 0
+        first = None
+        last = None
+        monotonic = True
+        has_untimed = False
+        start = None
+
+    with CaptureFile(p) as cf:
+        if start is not None:
+            cf.end_offset = start
+        for rec in cf.iter_records(start):
+            ts = rec.ts
+            if ts is None:
+                has_untimed = True
+                ts = last if last is not None else 0.0
+            elif last is not None and ts < last:
+                monotonic = False
+            if count % stride == 0:
+                cp_ts.append(ts)
+                cp_offsets.append(rec.offset)
+            if first is None:
+                first = ts
+            last = ts if last is None or ts >= last else last
+            count += 1
+        # Records can be copied verbatim behind the preamble only if every interface they
+        # reference is described there.
+        copyable = cf.sections <= 1 and not cf.late_interfaces
+        if resume is not None:
+            copyable = copyable and resume.copyable
+        return TimeIndex(
+            path=p,
+            size=int(st.st_size),
+            mtime_ns=int(st.st_mtime_ns),
+            format=cf.format,
+            preamble=cf.preamble,
+            end_offset=cf.end_offset,
+            packet_count=count,
+            stride=stride,
+            cp_ts=cp_ts,
+            cp_offsets=cp_offsets,
+            first_ts=first,
+            last_ts=last,
+            monotonic=monotonic,
+            has_untimed=has_untimed,
+            copyable=copyable,
+            sliceable=copyable and monotonic and not has_untimed,
+        )
+
+
+def _can_resume(prev: TimeIndex, p: Path, size: int) -> bool:
+    # A file that only grew keeps its preamble and every complete record already indexed.
+    if size < prev.size or not prev.copyable or prev.packet_count == 0:
+        return False
+    try:
+        with CaptureFile(p) as cf:
+            if cf.preamble != prev.preamble:
+                return False
+            for rec in cf.iter_records(prev.cp_offsets[-1]):
+                return rec.ts == prev.cp_ts[-1]
+    except (OSError, PcapMcpError):
+        return False
+    return False
+
+
+def get_time_index(cfg: Config, p: Path) -> TimeIndex:
+    ident = capture_identity(p)
+    with _index_lock:
+        cached = _index_cache.get(ident.key)
+        if cached is not None:
+            _index_cache.move_to_end(ident.key)
+        previous = [v for v in _index_cache.values() if v.path == p]
+    metrics.cache_event("time_index", cached is not None)
+    if cached is not None:
+        return cached
+
+    resume = previous[-1] if previous and _can_resume(previous[-1], p, ident.size) else None
+    idx = build_time_index(p, stride=cfg.time_index_stride, resume=resume)
+    with _index_lock:
+        for k in [k for k, v in _index_cache.items() if v.path == p]:
+            del _index_cache[k]
+        _index_cache[ident.key] = idx
+        while len(_index_cache) > MAX_CACHED_TIME_INDEXES:
+            _index_cache.popitem(last=False)
+    return idx
+
+
+def locate_frame(idx: TimeIndex, frame_number: int) -> int:
+    n = int(frame_number)
+    if n > idx.packet_count:
+        return idx.end_offset
+    if n <= 0:
+        raise PcapMcpError("INVALID_ARGUMENT", "frame_number must be > 0")
+    offset, _frame = _scan_from_checkpoint(idx, (n - 1) // idx.stride, lambda _rec, frame: frame == n)
+    return offset
+
+
+def _scan_from_checkpoint(idx: TimeIndex, cp: int, pred: Any) -> tuple[int, int]:
+    frame = cp * idx.stride + 1
+    with CaptureFile(idx.path) as cf:
+        for rec in cf.iter_records(idx.cp_offsets[cp]):
+            if frame > idx.packet_count:
+                break
+            if pred(rec, frame):
+                return rec.offset, frame
+            frame += 1
+    return idx.end_offset, idx.packet_count + 1
+
+
+def locate_time(idx: TimeIndex, t: float, *, inclusive: bool) -> tuple[int, int]:
+    # Returns (byte offset, frame number) of the first record with ts >= t (inclusive)
+    # or ts > t (not inclusive); (end_offset, packet_count + 1) if there is none.
+    if idx.packet_count == 0:
+        return idx.end_offset, 1
+    k = bisect_left(idx.cp_ts, t) if inclusive else bisect_right(idx.cp_ts, t)
+    cp = max(0, k - 1)
+    if inclusive:
+        return _scan_from_checkpoint(idx, cp, lambda rec, _n: rec.ts is not None and rec.ts >= t)
+    return _scan_from_checkpoint(idx, cp, lambda rec, _n: rec.ts is not None and rec.ts > t)
+
+
+def frame_timestamp(idx: TimeIndex, frame_number: int) -> float:
+    n = int(frame_number)
+    if n <= 0 or n > idx.packet_count:
+        raise PcapMcpError(
+            "INVALID_ARGUMENT",
+            "frame_number out of range",
+            {"frame_number": n, "packet_count": idx.packet_count},
+        )
+    cp = (n - 1) // idx.stride
+    found: list[float] = []
+
+    def _pred(rec: Any, frame: int) -> bool:
+        if frame == n:
+            found.append(rec.ts if rec.ts is not None else 0.0)
+            return True
+        return False
+
+    _scan_from_checkpoint(idx, cp, _pred)
+    if not found:
+        raise PcapMcpError("NOT_FOUND", "frame not found in capture", {"frame_number": n})
+    return found[0]
+
+
+def resolve_time_window(
+    cfg: Config,
+    p: Path,
+    *,
+    time_from: Any = None,
+    time_to: Any = None,
+    around_frame: Optional[int] = None,
+    around_seconds: Optional[float] = None,
+) -> Optional[tuple[Optional[float], Optional[float]]]:
+    t_from = parse_time_bound(cfg, time_from, name="time_from")
+    t_to = parse_time_bound(cfg, time_to, name="time_to")
+
+    if around_frame is not None:
+        if t_from is not None or t_to is not None:
+            raise PcapMcpError("INVALID_ARGUMENT", "around_frame cannot be combined with time_from/time_to")
+        secs = float(around_seconds) if around_seconds is not None else 5.0
+        if secs < 0:
+            raise PcapMcpError("INVALID_ARGUMENT", "around_seconds must be non-negative")
+        center = frame_timestamp(get_time_index(cfg, p), int(around_frame))
+        return center - secs, center + secs
+
+    if t_from is None and t_to is None:
+        return None
+    if t_from is not None and t_to is not None and t_to < t_from:
+        raise PcapMcpError("INVALID_ARGUMENT", "time_to is before time_from", {"time_from": t_from, "time_to": t_to})
+    return t_from, t_to
+
+
+def filter_allows_slicing(display_filter: str, fields: Iterable[str] = ()) -> bool:
+    # False when the filter or a requested field would see slice-local numbering or timing;
+    # callers then fall back to a frame.time_epoch filter over the whole file.
+    f = display_filter or ""
+    if any(tok in f for tok in _SLICE_UNSAFE_FILTER_TOKENS):
+        return False
+    return not any(tok in (x or "") for x in fields for tok in _SLICE_UNSAFE_FIELD_TOKENS)
+
+
+def slice_for_window(
+    cfg: Config,
+    p: Path,
+    time_from: Optional[float],
+    time_to: Optional[float],
+) -> Optional[CaptureSlice]:
+    idx = get_time_index(cfg, p)
+    if not idx.sliceable:
+        return None
+
+    if time_from is None:
+        start, first_frame = (idx.cp_offsets[0] if idx.packet_count else idx.end_offset), 1
+    else:
+        start, first_frame = locate_time(idx, time_from, inclusive=True)
+    if time_to is None:
+        end, end_frame = idx.end_offset, idx.packet_count + 1
+    else:
+        end, end_frame = locate_time(idx, time_to, inclusive=False)
+
+    if end < start:
+        end, end_frame = start, first_frame
+    return CaptureSlice(
+        path=p,
+        preamble=idx.preamble,
+        start=start,
+        end=end,
+        first_frame=first_frame,
+        frame_count=end_frame - first_frame,
+    )
@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+from .config import Config
+from .errors import PcapMcpError
+
+
+def parse_time_bound(cfg: Config, value: Any, *, name: str = "time") -> Optional[float]:
+    # Accepts epoch seconds or a wall-clock string. Naive wall-clock strings are read in the
+    # same shifted clock that pcap_packet_list prints (local time + time_offset_hours).
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise PcapMcpError("INVALID_ARGUMENT", f"{name} must be epoch seconds or a datetime string")
+    if isinstance(value, (int, float)):
+        return float(value)
+
+    s = str(value).strip()
+    if not s:
+        return None
+    try:
+        return float(s)
+    except ValueError:
+        pass
+
+    try:
+        dt = datetime.fromisoformat(s.replace("Z", "+00:00") if s.endswith("Z") else s)
+    except ValueError:
+        raise PcapMcpError(
+            "INVALID_ARGUMENT",
+            f"invalid {name}",
+            {name: s, "expected": "epoch seconds or 'YYYY-MM-DD HH:MM:SS[.ffffff]'"},
+        )
+
+    if dt.tzinfo is not None:
+        return dt.timestamp()
+    return (dt - timedelta(hours=int(cfg.time_offset_hours or 0))).timestamp()
+
+
+def time_window_filter(time_from: Optional[float], time_to: Optional[float]) -> str:
+    parts: list[str] = []
+    if time_from is not None:
+        parts.append(f"frame.time_epoch >= {time_from:.9f}")
+    if time_to is not None:
+        parts.append(f"frame.time_epoch <= {time_to:.9f}")
+    return " && ".join(parts)
+
+
+def and_filters(*filters: str) -> str:
+    active = [f.strip() for f in filters if (f or "").strip()]
+    if not active:
+        return ""
+    if len(active) == 1:
+        return active[0]
+    return " && ".join(f"({f})" for f in active)
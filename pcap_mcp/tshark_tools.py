@@ -1,28 +1,126 @@
 from __future__ import annotations
 
+from collections import OrderedDict
 import csv
 from dataclasses import dataclass
+from functools import lru_cache
 from datetime import datetime, timedelta
 from pathlib import Path
 import re
+import struct
+import subprocess
+import threading
 import time
-from typing import Any, Optional
+from typing import Any, Callable, Optional
 
-from .config import Config
+from . import metrics
+from .config import Config, ResourcePolicy, dissector_argv
 from .errors import PcapMcpError
-from .proc import popen_lines, read_all_stderr, run_checked, safe_kill
+from .jsontree import parse_tshark_json
+from .proc import check_resources, popen_bytes, popen_lines, read_all_stderr, run_checked, safe_kill, stdout_lines, stdout_rows
+from .timeindex import CaptureSlice
 
 
-def _append_preferences(args: list[str], preferences: Optional[list[str]]) -> None:
-    if not preferences:
-        return
-    if len(preferences) > 100:
+@lru_cache(maxsize=256)
+def _dissector_argv(
+    decode_as: tuple[str, ...],
+    preferences: tuple[str, ...],
+    protocols: tuple[str, ...],
+) -> tuple[str, ...]:
+    return dissector_argv(decode_as, preferences, protocols)
+
+
+def _dissector_argv_cache_stats() -> list[tuple[str, dict[str, str], float]]:
+    info = _dissector_argv.cache_info()
+    return [
+        ("cache_hits_total", {"cache": "dissector_argv"}, info.hits),
+        ("cache_misses_total", {"cache": "dissector_argv"}, info.misses),
+    ]
+
+
+metrics.register_collector(_dissector_argv_cache_stats)
+
+
+def dissector_args(
+    decode_as: Optional[list[str]],
+    preferences: Optional[list[str]],
+    protocols: Optional[list[str]] = None,
+) -> list[str]:
+    # Profiles resolve to the same tuples on every call, so their argv is built once.
+    da = tuple(s for s in ((d or "").strip() for d in (decode_as or ())) if s)
+    prefs = tuple(s for s in ((x or "").strip() for x in (preferences or ())) if s)
+    protos = tuple(s for s in ((x or "").strip() for x in (protocols or ())) if s)
+    if len(decode_as or ()) > 50:
+        raise PcapMcpError("INVALID_ARGUMENT", "too many decode_as entries", {"max": 50})
+    if len(preferences or ()) > 100:
         raise PcapMcpError("INVALID_ARGUMENT", "too many preferences", {"max": 100})
-    for pref in preferences:
-        s = (pref or "").strip()
-        if not s:
-            continue
-        args += ["-o", s]
+    return list(_dissector_argv(da, prefs, protos))
+
+
+def _policy(cfg: Config, name: str) -> Optional[ResourcePolicy]:
+    return cfg.resource_policies.get(name)
+
+
+_EMPTY_PCAP = struct.pack("<IHHiIII", 0xA1B2C3D4, 2, 4, 0, 0, 65535, 1)
+_filter_checks: OrderedDict[tuple[str, str], str] = OrderedDict()
+_filter_checks_lock = threading.Lock()
+_MAX_FILTER_CHECKS = 1024
+
+
+def _empty_capture(cfg: Config) -> Path:
+    p = cfg.output_dir / ".empty.pcap"
+    try:
+        if p.read_bytes() == _EMPTY_PCAP:
+            return p
+    except OSError:
+        pass
+    cfg.output_dir.mkdir(parents=True, exist_ok=True)
+    p.write_bytes(_EMPTY_PCAP)
+    return p
+
+
+# tshark's exit status for a display filter that does not compile (WS_EXIT_INVALID_FILTER),
+# and the messages older/newer releases print for one.
+_EXIT_INVALID_FILTER = 4
+_INVALID_FILTER_MESSAGES = (
+    "display filter",
+    "neither a field nor a protocol",
+    "is not a valid protocol or protocol field",
+    "was unexpected in this context",
+)
+
+
+def validate_display_filter(cfg: Config, display_filter: str) -> None:
+    # Compiles the filter against an empty capture so a bad filter fails before any capture
+    # is read. Results (including the tshark error) are cached per filter string.
+    f = (display_filter or "").strip()
+    if not f:
+        return
+    key = (cfg.tshark_path, f)
+    with _filter_checks_lock:
+        err = _filter_checks.get(key)
+        if err is not None:
+            _filter_checks.move_to_end(key)
+    metrics.cache_event("display_filter", err is not None)
+    if err is None:
+        try:
+            r = run_checked([cfg.tshark_path, "-n", "-r", str(_empty_capture(cfg)), "-Y", f], timeout_s=cfg.default_timeout_s)
+        except (OSError, subprocess.TimeoutExpired):
+            return
+        stderr = r.stderr.strip()
+        if r.returncode == 0:
+            err = ""
+        elif r.returncode == _EXIT_INVALID_FILTER or any(m in stderr.lower() for m in _INVALID_FILTER_MESSAGES):
+            err = stderr or f"tshark exited with status {r.returncode}"
+        else:
+            # Not a filter problem (e.g. tshark itself failing); leave it to the real run.
+            return
+        with _filter_checks_lock:
+            _filter_checks[key] = err
+            while len(_filter_checks) > _MAX_FILTER_CHECKS:
+                _filter_checks.popitem(last=False)
+    if err:
+        raise PcapMcpError("INVALID_FILTER", "invalid display filter", {"stderr": err, "filter": f})
 
 
 def _quote_display_filter_string(s: str) -> str:
@@ -39,6 +137,7 @@ def frame_fields(
     fields: list[str],
     decode_as: Optional[list[str]] = None,
     preferences: Optional[list[str]] = None,
+    protocols: Optional[list[str]] = None,
 ) -> dict[str, str]:
     if frame_number <= 0:
         raise PcapMcpError("INVALID_ARGUMENT", "frame_number must be > 0")
@@ -46,16 +145,7 @@ def frame_fields(
         raise PcapMcpError("INVALID_ARGUMENT", "fields is empty")
 
     args: list[str] = [cfg.tshark_path]
-    if decode_as:
-        if len(decode_as) > 50:
-            raise PcapMcpError("INVALID_ARGUMENT", "too many decode_as entries", {"max": 50})
-        for d in decode_as:
-            s = (d or "").strip()
-            if not s:
-                continue
-            args += ["-d", s]
-
-    _append_preferences(args, preferences)
+    args += dissector_args(decode_as, preferences, protocols)
 
     args += [
         "-r",
@@ -79,7 +169,7 @@ def frame_fields(
             continue
         args += ["-e", key]
 
-    r = run_checked(args, timeout_s=cfg.default_timeout_s)
+    r = run_checked(args, timeout_s=cfg.default_timeout_s, policy=_policy(cfg, "interactive"))
     if r.returncode != 0:
         raise PcapMcpError("INTERNAL_ERROR", "tshark frame fields failed", {"stderr": r.stderr.strip()})
 
@@ -102,6 +192,7 @@ def follow_filter_for_frame(
     frame_number: int,
     decode_as: Optional[list[str]] = None,
     preferences: Optional[list[str]] = None,
+    protocols: Optional[list[str]] = None,
 ) -> dict[str, str]:
     vals = frame_fields(
         cfg,
@@ -110,6 +201,7 @@ def follow_filter_for_frame(
         fields=["http2.streamid", "diameter.Session-Id", "sip.Call-ID"],
         decode_as=decode_as,
         preferences=preferences,
+        protocols=protocols,
     )
 
     http2_streamid_raw = (vals.get("http2.streamid") or "").strip()
@@ -158,6 +250,13 @@ def tshark_version(cfg: Config) -> str:
     return first
 
 
+def field_table_text(cfg: Config) -> str:
+    r = run_checked([cfg.tshark_path, "-G", "fields"], timeout_s=cfg.default_timeout_s)
+    if r.returncode != 0:
+        raise PcapMcpError("INTERNAL_ERROR", "tshark -G fields failed", {"stderr": r.stderr.strip()})
+    return r.stdout
+
+
 def list_fields(
     cfg: Config,
     *,
@@ -166,6 +265,7 @@ def list_fields(
     case_sensitive: bool = False,
     limit: int = 200,
     include_protocols: bool = False,
+    fields_text: Optional[str] = None,
 ) -> dict[str, Any]:
     q = (query or "").strip()
     if limit <= 0:
@@ -178,12 +278,11 @@ def list_fields(
         flags = 0 if case_sensitive else re.IGNORECASE
         pat = re.compile(q, flags)
 
-    r = run_checked([cfg.tshark_path, "-G", "fields"], timeout_s=cfg.default_timeout_s)
-    if r.returncode != 0:
-        raise PcapMcpError("INTERNAL_ERROR", "tshark -G fields failed", {"stderr": r.stderr.strip()})
+    if fields_text is None:
+        fields_text = field_table_text(cfg)
 
     items: list[dict[str, Any]] = []
-    for line in r.stdout.splitlines():
+    for line in fields_text.splitlines():
         if not line:
             continue
 
@@ -228,7 +327,7 @@ def list_fields(
 
 def capinfos_basic(cfg: Config, p: Path) -> dict:
     r = run_checked(
-        [cfg.capinfos_path, "-M", "-c", "-a", "-e", "-u", "-H", str(p)],
+        [cfg.capinfos_path, "-M", "-c", "-a", "-e", "-u", str(p)],
         timeout_s=cfg.default_timeout_s,
     )
     if r.returncode != 0:
@@ -247,7 +346,6 @@ def capinfos_basic(cfg: Config, p: Path) -> dict:
         "duration": float(out.get("Capture duration", "0").split()[0] or "0"),
         "time_start": out.get("First packet time"),
         "time_end": out.get("Last packet time"),
-        "sha256": out.get("SHA256"),
     }
 
 
@@ -274,6 +372,50 @@ def _extract_snippet(text: str, start: int, end: int, *, context_chars: int = 24
     return text[a:b]
 
 
+def fields_row(parts: list[str], fields: list[str], frame_base: int = 0) -> dict[str, Any]:
+    # One `-T fields -E occurrence=a -E aggregator=|` row; multi-occurrence values become lists.
+    row: dict[str, Any] = dict(zip(fields, parts))
+    for key in fields[len(parts) :]:
+        row[key] = ""
+    for key in [k for k, v in row.items() if "|" in v]:
+        row[key] = [x for x in row[key].split("|") if x != ""]
+    if frame_base and "frame.number" in row:
+        raw = row["frame.number"]
+        if isinstance(raw, str) and raw.isdigit():
+            row["frame.number"] = str(int(raw) + frame_base)
+    return row
+
+
+def raise_for_fields_stderr(cfg: Config, stderr: str, *, fields: list[str], display_filter: str) -> None:
+    if not stderr:
+        return
+    if "Some fields aren't valid" in stderr:
+        invalid: list[str] = []
+        for ln in stderr.splitlines():
+            s = ln.strip()
+            if not s or s.lower().startswith("tshark:"):
+                continue
+            if s.startswith("Some fields"):
+                continue
+            invalid.append(s)
+
+        suggestions: dict[str, list[dict[str, Any]]] = {}
+        for f in invalid[:10]:
+            try:
+                res = list_fields(cfg, query=f, limit=10)
+                suggestions[f] = res.get("items") or []
+            except Exception:
+                suggestions[f] = []
+
+        raise PcapMcpError(
+            "INVALID_FIELDS",
+            "invalid fields",
+            {"stderr": stderr, "fields": fields, "invalid": invalid, "suggestions": suggestions},
+        )
+    if "Invalid display filter" in stderr:
+        raise PcapMcpError("INVALID_FILTER", "invalid display filter", {"stderr": stderr, "filter": display_filter})
+
+
 def timeline(
     cfg: Config,
     *,
@@ -281,9 +423,11 @@ def timeline(
     display_filter: str,
     decode_as: Optional[list[str]] = None,
     preferences: Optional[list[str]] = None,
+    protocols: Optional[list[str]] = None,
     fields: list[str],
     limit: int,
     offset: int,
+    capture_slice: Optional[CaptureSlice] = None,
 ) -> TimelineResult:
     if limit < 0 or offset < 0:
         raise PcapMcpError("INVALID_ARGUMENT", "limit/offset must be non-negative")
@@ -299,20 +443,11 @@ def timeline(
         cfg.tshark_path,
     ]
 
-    if decode_as:
-        if len(decode_as) > 50:
-            raise PcapMcpError("INVALID_ARGUMENT", "too many decode_as entries", {"max": 50})
-        for d in decode_as:
-            s = (d or "").strip()
-            if not s:
-                continue
-            args += ["-d", s]
-
-    _append_preferences(args, preferences)
+    args += dissector_args(decode_as, preferences, protocols)
 
     args += [
         "-r",
-        str(p),
+        "-" if capture_slice else str(p),
     ]
 
     if display_filter:
@@ -334,82 +469,50 @@ def timeline(
     for f in fields:
         args += ["-e", f]
 
-    proc = popen_lines(args)
+    proc = popen_bytes(
+        args,
+        stdin_chunks=capture_slice.iter_chunks() if capture_slice else None,
+        policy=_policy(cfg, "interactive"),
+    )
     started = time.time()
     warnings: list[str] = []
     rows: list[dict] = []
+    frame_base = capture_slice.frame_base if capture_slice else 0
 
     try:
         if not proc.stdout:
             raise PcapMcpError("INTERNAL_ERROR", "tshark produced no stdout")
 
-        header = proc.stdout.readline()
-        if not header:
-            stderr = read_all_stderr(proc).strip()
-            raise PcapMcpError("INTERNAL_ERROR", "tshark produced no output", {"stderr": stderr})
-
-        header_fields = header.rstrip("\n").split("\t")
-        if len(header_fields) != len(fields):
-            warnings.append("header_field_count_mismatch")
-
-        seen = 0
-        for line in proc.stdout:
+        header: Optional[list[str]] = None
+        for batch in stdout_rows(proc, header=True, skip=offset):
             if cfg.default_timeout_s and (time.time() - started) > cfg.default_timeout_s:
                 raise PcapMcpError("TIMEOUT", "tshark timed out")
 
-            line = line.rstrip("\n")
-            if line == "":
-                continue
-
-            if seen < offset:
-                seen += 1
+            if header is None:
+                header = batch[0]
+                if len(header) != len(fields):
+                    warnings.append("header_field_count_mismatch")
                 continue
 
-            parts = line.split("\t")
-            row: dict = {}
-
-            for i, key in enumerate(fields):
-                raw = parts[i] if i < len(parts) else ""
-                if "|" in raw:
-                    row[key] = [x for x in raw.split("|") if x != ""]
-                else:
-                    row[key] = raw
-
-            rows.append(row)
+            for parts in batch[: limit - len(rows)]:
+                rows.append(fields_row(parts, fields, frame_base))
             if len(rows) >= limit:
                 break
 
+        if header is None:
+            stderr = read_all_stderr(proc).strip()
+            proc.wait()
+            check_resources(proc, stderr)
+            raise PcapMcpError("INTERNAL_ERROR", "tshark produced no output", {"stderr": stderr})
+
         returncode = proc.poll()
         if returncode is None:
             safe_kill(proc)
 
         stderr = read_all_stderr(proc).strip()
-        if stderr:
-            if "Some fields aren't valid" in stderr:
-                invalid: list[str] = []
-                for ln in stderr.splitlines():
-                    s = ln.strip()
-                    if not s or s.lower().startswith("tshark:"):
-                        continue
-                    if s.startswith("Some fields"):
-                        continue
-                    invalid.append(s)
-
-                suggestions: dict[str, list[dict[str, Any]]] = {}
-                for f in invalid[:10]:
-                    try:
-                        res = list_fields(cfg, query=f, limit=10)
-                        suggestions[f] = res.get("items") or []
-                    except Exception:
-                        suggestions[f] = []
-
-                raise PcapMcpError(
-                    "INVALID_FIELDS",
-                    "invalid fields",
-                    {"stderr": stderr, "fields": fields, "invalid": invalid, "suggestions": suggestions},
-                )
-            if "Invalid display filter" in stderr:
-                raise PcapMcpError("INVALID_FILTER", "invalid display filter", {"stderr": stderr, "filter": display_filter})
+        proc.wait()
+        check_resources(proc, stderr)
+        raise_for_fields_stderr(cfg, stderr, fields=fields, display_filter=display_filter)
 
         return TimelineResult(rows=rows, warnings=warnings)
     finally:
@@ -417,6 +520,67 @@ def timeline(
             safe_kill(proc)
 
 
+def timeline_export(
+    cfg: Config,
+    *,
+    p: Path,
+    display_filter: str,
+    decode_as: Optional[list[str]] = None,
+    preferences: Optional[list[str]] = None,
+    protocols: Optional[list[str]] = None,
+    fields: list[str],
+    sink: Callable[[dict[str, Any]], None],
+    max_rows: int = 0,
+    capture_slice: Optional[CaptureSlice] = None,
+) -> dict[str, Any]:
+    # Same extraction as timeline(), but every row goes to `sink` as soon as it is parsed,
+    # so memory does not grow with the number of rows; runs under the export policy/timeout.
+    args: list[str] = [cfg.tshark_path]
+    args += dissector_args(decode_as, preferences, protocols)
+    args += ["-r", "-" if capture_slice else str(p)]
+    if display_filter:
+        args += ["-Y", display_filter]
+    args += ["-T", "fields", "-E", "header=n", "-E", "separator=\t", "-E", "occurrence=a", "-E", "aggregator=|"]
+    for f in fields:
+        args += ["-e", f]
+
+    proc = popen_bytes(
+        args,
+        stdin_chunks=capture_slice.iter_chunks() if capture_slice else None,
+        policy=_policy(cfg, "export"),
+    )
+    started = time.time()
+    frame_base = capture_slice.frame_base if capture_slice else 0
+    rows = 0
+    truncated = False
+    try:
+        if not proc.stdout:
+            raise PcapMcpError("INTERNAL_ERROR", "tshark produced no stdout")
+
+        for batch in stdout_rows(proc):
+            if cfg.export_timeout_s and (time.time() - started) > cfg.export_timeout_s:
+                raise PcapMcpError("TIMEOUT", "tshark export timed out")
+            if max_rows and rows + len(batch) > max_rows:
+                batch = batch[: max_rows - rows]
+                truncated = True
+            for parts in batch:
+                sink(fields_row(parts, fields, frame_base))
+            rows += len(batch)
+            if truncated:
+                break
+
+        if proc.poll() is None:
+            safe_kill(proc)
+        stderr = read_all_stderr(proc).strip()
+        proc.wait()
+        check_resources(proc, stderr)
+        raise_for_fields_stderr(cfg, stderr, fields=fields, display_filter=display_filter)
+        return {"rows": rows, "truncated": truncated}
+    finally:
+        if proc.poll() is None:
+            safe_kill(proc)
+
+
 def text_search(
     cfg: Config,
     *,
@@ -428,12 +592,14 @@ def text_search(
     layers: Optional[list[str]] = None,
     decode_as: Optional[list[str]] = None,
     preferences: Optional[list[str]] = None,
+    protocols: Optional[list[str]] = None,
     restrict_layers: bool = True,
     limit: int = 200,
     offset: int = 0,
     max_matches: int = 50,
     max_bytes: int = 200000,
     snippet_context_chars: int = 240,
+    capture_slice: Optional[CaptureSlice] = None,
 ) -> dict[str, Any]:
     if not (query or "").strip():
         raise PcapMcpError("INVALID_ARGUMENT", "query is empty")
@@ -453,8 +619,10 @@ def text_search(
         display_filter=display_filter or "",
         decode_as=decode_as,
         preferences=preferences,
+        protocols=protocols,
         limit=limit,
         offset=offset,
+        capture_slice=capture_slice,
     )
 
     q = str(query)
@@ -475,6 +643,7 @@ def text_search(
             restrict_layers=bool(restrict_layers),
             decode_as=decode_as,
             preferences=preferences,
+            protocols=protocols,
             max_bytes=max_bytes,
         )
 
@@ -524,8 +693,10 @@ def frames_by_filter(
     display_filter: str,
     decode_as: Optional[list[str]] = None,
     preferences: Optional[list[str]] = None,
+    protocols: Optional[list[str]] = None,
     limit: int,
     offset: int,
+    capture_slice: Optional[CaptureSlice] = None,
 ) -> list[int]:
     if limit < 0 or offset < 0:
         raise PcapMcpError("INVALID_ARGUMENT", "limit/offset must be non-negative")
@@ -541,20 +712,11 @@ def frames_by_filter(
         cfg.tshark_path,
     ]
 
-    if decode_as:
-        if len(decode_as) > 50:
-            raise PcapMcpError("INVALID_ARGUMENT", "too many decode_as entries", {"max": 50})
-        for d in decode_as:
-            s = (d or "").strip()
-            if not s:
-                continue
-            args += ["-d", s]
-
-    _append_preferences(args, preferences)
+    args += dissector_args(decode_as, preferences, protocols)
 
     args += [
         "-r",
-        str(p),
+        "-" if capture_slice else str(p),
     ]
 
     if display_filter:
@@ -562,33 +724,26 @@ def frames_by_filter(
 
     args += ["-T", "fields", "-e", "frame.number"]
 
-    proc = popen_lines(args)
+    proc = popen_bytes(
+        args,
+        stdin_chunks=capture_slice.iter_chunks() if capture_slice else None,
+        policy=_policy(cfg, "interactive"),
+    )
     started = time.time()
 
     frames: list[int] = []
-    seen = 0
+    frame_base = capture_slice.frame_base if capture_slice else 0
 
     try:
         if not proc.stdout:
             raise PcapMcpError("INTERNAL_ERROR", "tshark produced no stdout")
 
-        for line in proc.stdout:
+        for batch in stdout_rows(proc, columns=0, skip=offset):
             if cfg.default_timeout_s and (time.time() - started) > cfg.default_timeout_s:
                 raise PcapMcpError("TIMEOUT", "tshark timed out")
 
-            s = line.strip()
-            if not s:
-                continue
-
-            if seen < offset:
-                seen += 1
-                continue
-
-            try:
-                frames.append(int(s))
-            except ValueError:
-                continue
-
+            numbers = [int(v) + frame_base for v in batch if v.isdigit()]
+            frames.extend(numbers[: limit - len(frames)])
             if len(frames) >= limit:
                 break
 
@@ -596,6 +751,8 @@ def frames_by_filter(
             safe_kill(proc)
 
         stderr = read_all_stderr(proc).strip()
+        proc.wait()
+        check_resources(proc, stderr)
         if stderr:
             if "Invalid display filter" in stderr:
                 raise PcapMcpError("INVALID_FILTER", "invalid display filter", {"stderr": stderr, "filter": display_filter})
@@ -626,74 +783,193 @@ _LAYER_TO_PROTO = {
 }
 
 
-def frame_detail(
+_FRAME_HEADER_RE = re.compile(r"^Frame (\d+): ")
+
+
+def _detail_layers(layers: Optional[list[str]]) -> list[str]:
+    protos: list[str] = []
+    for l in layers or ():
+        proto = _LAYER_TO_PROTO.get((l or "").strip())
+        if proto and proto not in protos:
+            protos.append(proto)
+    return protos
+
+
+def render_frame_details(
     cfg: Config,
     *,
     p: Path,
-    frame_number: int,
+    frame_numbers: list[int],
     layers: Optional[list[str]],
     restrict_layers: bool = True,
     verbosity: str = "summary",
     decode_as: Optional[list[str]] = None,
     preferences: Optional[list[str]] = None,
-    max_bytes: int,
-) -> tuple[str, bool]:
-    if max_bytes <= 0:
-        raise PcapMcpError("INVALID_ARGUMENT", "max_bytes must be > 0")
-
+    protocols: Optional[list[str]] = None,
+    policy: str = "interactive",
+) -> dict[int, str]:
+    # Renders several frames in one `tshark -V` pass and splits the output on the
+    # "Frame N:" headers. One frame past the last requested one is matched as a sentinel:
+    # its header marks the end of the wanted output, so tshark is stopped there instead
+    # of dissecting the rest of the capture.
     if verbosity not in ("summary", "full"):
         raise PcapMcpError("INVALID_ARGUMENT", "verbosity must be summary|full")
 
-    protos: list[str] = []
-    if layers:
-        for l in layers:
-            key = (l or "").strip()
-            if not key:
-                continue
-            proto = _LAYER_TO_PROTO.get(key)
-            if proto and proto not in protos:
-                protos.append(proto)
-
-    args: list[str] = [
-        cfg.tshark_path,
-    ]
-
-    if decode_as:
-        if len(decode_as) > 50:
-            raise PcapMcpError("INVALID_ARGUMENT", "too many decode_as entries", {"max": 50})
-        for d in decode_as:
-            s = (d or "").strip()
-            if not s:
-                continue
-            args += ["-d", s]
-
-    _append_preferences(args, preferences)
+    wanted = sorted({int(n) for n in frame_numbers if int(n) > 0})
+    if not wanted:
+        return {}
+    sentinel = wanted[-1] + 1
 
+    args: list[str] = [cfg.tshark_path]
+    args += dissector_args(decode_as, preferences, protocols)
     args += [
         "-r",
         str(p),
         "-Y",
-        f"frame.number=={frame_number}",
+        "frame.number in {" + " ".join(str(n) for n in [*wanted, sentinel]) + "}",
         "-V",
     ]
 
     if verbosity == "full":
         args += ["-x"]
 
+    protos = _detail_layers(layers)
     if protos and restrict_layers:
         args += ["-O", ",".join(protos)]
 
-    r = run_checked(args, timeout_s=cfg.default_timeout_s)
-    if r.returncode != 0 and r.stdout.strip() == "":
-        raise PcapMcpError("INTERNAL_ERROR", "tshark frame detail failed", {"stderr": r.stderr.strip()})
+    proc = popen_lines(args, policy=_policy(cfg, policy))
+    started = time.time()
+    out: dict[int, list[str]] = {}
+    current: Optional[list[str]] = None
+    try:
+        for line in stdout_lines(proc):
+            if cfg.default_timeout_s and (time.time() - started) > cfg.default_timeout_s:
+                raise PcapMcpError("TIMEOUT", "tshark timed out")
+            m = _FRAME_HEADER_RE.match(line)
+            if m:
+                n = int(m.group(1))
+                if n >= sentinel:
+                    break
+                current = out.setdefault(n, [])
+            if current is not None:
+                current.append(line)
+
+        if proc.poll() is None:
+            safe_kill(proc)
+        stderr = read_all_stderr(proc).strip()
+        proc.wait()
+        check_resources(proc, stderr)
+        if not out and proc.returncode != 0 and not getattr(proc, "killed_by_caller", False):
+            raise PcapMcpError("INTERNAL_ERROR", "tshark frame detail failed", {"stderr": stderr})
+    finally:
+        if proc.poll() is None:
+            safe_kill(proc)
+
+    return {n: "".join(out.get(n, ())) for n in wanted}
+
 
-    text = r.stdout
+def truncate_text(text: str, max_bytes: int) -> tuple[str, bool]:
+    raw = text.encode("utf-8", errors="replace")
+    if len(raw) <= max_bytes:
+        return text, False
+    return raw[:max_bytes].decode("utf-8", errors="ignore"), True
+
+
+def frame_detail(
+    cfg: Config,
+    *,
+    p: Path,
+    frame_number: int,
+    layers: Optional[list[str]],
+    restrict_layers: bool = True,
+    verbosity: str = "summary",
+    decode_as: Optional[list[str]] = None,
+    preferences: Optional[list[str]] = None,
+    protocols: Optional[list[str]] = None,
+    max_bytes: int,
+) -> tuple[str, bool]:
+    if max_bytes <= 0:
+        raise PcapMcpError("INVALID_ARGUMENT", "max_bytes must be > 0")
+
+    texts = render_frame_details(
+        cfg,
+        p=p,
+        frame_numbers=[frame_number],
+        layers=layers,
+        restrict_layers=restrict_layers,
+        verbosity=verbosity,
+        decode_as=decode_as,
+        preferences=preferences,
+        protocols=protocols,
+    )
+    return truncate_text(texts.get(int(frame_number), ""), max_bytes)
+
+
+def frame_detail_json(
+    cfg: Config,
+    *,
+    p: Path,
+    frame_number: int,
+    layers: Optional[list[str]],
+    restrict_layers: bool = True,
+    verbosity: str = "summary",
+    decode_as: Optional[list[str]] = None,
+    preferences: Optional[list[str]] = None,
+    protocols: Optional[list[str]] = None,
+    max_bytes: int,
+) -> tuple[dict[str, Any], bool, bool, int]:
+    # Returns (layers, truncated, repaired, bytes_read). Output is read line by line and tshark is
+    # stopped as soon as max_bytes is reached; the partial document is then repaired.
+    if max_bytes <= 0:
+        raise PcapMcpError("INVALID_ARGUMENT", "max_bytes must be > 0")
+
+    if verbosity not in ("summary", "full"):
+        raise PcapMcpError("INVALID_ARGUMENT", "verbosity must be summary|full")
+
+    protos = _detail_layers(layers)
+
+    args: list[str] = [cfg.tshark_path]
+    args += dissector_args(decode_as, preferences, protocols)
+    args += ["-r", str(p), "-Y", f"frame.number=={frame_number}", "-T", "json"]
+    if verbosity == "full":
+        args += ["-x"]
+    if protos and restrict_layers:
+        args += ["-J", " ".join(protos)]
+
+    proc = popen_lines(args, policy=_policy(cfg, "interactive"))
+    started = time.time()
+    chunks: list[str] = []
+    size = 0
     truncated = False
-    if len(text.encode("utf-8", errors="replace")) > max_bytes:
-        truncated = True
-        text = text.encode("utf-8", errors="replace")[:max_bytes].decode("utf-8", errors="replace")
+    try:
+        for line in stdout_lines(proc):
+            if cfg.default_timeout_s and (time.time() - started) > cfg.default_timeout_s:
+                raise PcapMcpError("TIMEOUT", "tshark timed out")
+            size += len(line.encode("utf-8", errors="replace"))
+            if size > max_bytes:
+                truncated = True
+                break
+            chunks.append(line)
 
-    return text, truncated
+        if proc.poll() is None:
+            safe_kill(proc)
+        stderr = read_all_stderr(proc).strip()
+        proc.wait()
+        check_resources(proc, stderr)
+        if not chunks and not truncated and proc.returncode not in (0, None) and not getattr(proc, "killed_by_caller", False):
+            raise PcapMcpError("INTERNAL_ERROR", "tshark frame detail failed", {"stderr": stderr})
+    finally:
+        if proc.poll() is None:
+            safe_kill(proc)
+
+    doc, repaired = parse_tshark_json("".join(chunks), truncated=truncated)
+    packets = doc if isinstance(doc, list) else [doc]
+    for pkt in packets:
+        if isinstance(pkt, dict):
+            found = (pkt.get("_source") or {}).get("layers")
+            if isinstance(found, dict):
+                return found, truncated, repaired, size
+    return {}, truncated, repaired, size
 
 
 def packet_list_export(
@@ -703,9 +979,11 @@ def packet_list_export(
     display_filter: str,
     decode_as: Optional[list[str]] = None,
     preferences: Optional[list[str]] = None,
+    protocols: Optional[list[str]] = None,
     output_path: Path,
     extra_columns: Optional[list[tuple[str, str]]] = None,
     include_default_columns: bool = True,
+    capture_slice: Optional[CaptureSlice] = None,
 ) -> dict[str, Any]:
     columns: list[tuple[str, str]] = []
     if include_default_columns:
@@ -774,20 +1052,11 @@ def packet_list_export(
         cfg.tshark_path,
     ]
 
-    if decode_as:
-        if len(decode_as) > 50:
-            raise PcapMcpError("INVALID_ARGUMENT", "too many decode_as entries", {"max": 50})
-        for d in decode_as:
-            s = (d or "").strip()
-            if not s:
-                continue
-            args += ["-d", s]
-
-    _append_preferences(args, preferences)
+    args += dissector_args(decode_as, preferences, protocols)
 
     args += [
         "-r",
-        str(p),
+        "-" if capture_slice else str(p),
     ]
 
     if display_filter:
@@ -812,10 +1081,16 @@ def packet_list_export(
         args += ["-e", field]
 
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    proc = popen_lines(args)
+    proc = popen_bytes(
+        args,
+        stdin_chunks=capture_slice.iter_chunks() if capture_slice else None,
+        policy=_policy(cfg, "export"),
+    )
     started = time.time()
     warnings: list[str] = []
     rows_written = 0
+    frame_base = capture_slice.frame_base if capture_slice else 0
+    frame_cols = [i for i, (_name, field) in enumerate(columns) if field == "frame.number"] if frame_base else []
 
     try:
         if not proc.stdout:
@@ -832,42 +1107,39 @@ def packet_list_export(
                 lineterminator="\n",
             )
             f.write(header)
-            for line in proc.stdout:
+            expected_len = len(columns)
+            for batch in stdout_rows(proc, quoted=True):
                 if cfg.export_timeout_s and (time.time() - started) > cfg.export_timeout_s:
                     raise PcapMcpError("TIMEOUT", "tshark export timed out")
 
-                if line == "":
-                    continue
-
-                line = line.rstrip("\n")
-                if line == "":
-                    continue
-
-                try:
-                    parts = next(csv.reader([line], delimiter="\t", quotechar='"'))
-                except Exception:
-                    parts = line.split("\t")
+                out: list[list[str]] = []
+                for parts in batch:
+                    if len(parts) < expected_len:
+                        parts += [""] * (expected_len - len(parts))
 
-                expected_len = len(columns)
-                if len(parts) < expected_len:
-                    parts += [""] * (expected_len - len(parts))
+                    for i in frame_cols:
+                        if parts[i].isdigit():
+                            parts[i] = str(int(parts[i]) + frame_base)
 
-                epoch_raw = (parts[1] or "").strip()
-                if epoch_raw:
-                    try:
-                        dt = datetime.fromtimestamp(float(epoch_raw)) + time_delta
-                        parts[1] = dt.strftime("%Y-%m-%d %H:%M:%S.%f")
-                    except Exception:
-                        parts[1] = epoch_raw
+                    epoch_raw = (parts[1] or "").strip()
+                    if epoch_raw:
+                        try:
+                            dt = datetime.fromtimestamp(float(epoch_raw)) + time_delta
+                            parts[1] = dt.strftime("%Y-%m-%d %H:%M:%S.%f")
+                        except Exception:
+                            parts[1] = epoch_raw
+                    out.append(parts)
 
-                writer.writerow(parts)
-                rows_written += 1
+                writer.writerows(out)
+                rows_written += len(out)
 
         returncode = proc.poll()
         if returncode is None:
             safe_kill(proc)
 
         stderr = read_all_stderr(proc).strip()
+        proc.wait()
+        check_resources(proc, stderr)
         if stderr:
             if "Invalid display filter" in stderr:
                 raise PcapMcpError(
@@ -884,3 +1156,52 @@ def packet_list_export(
     finally:
         if proc.poll() is None:
             safe_kill(proc)
+
+
+def write_filtered_capture(
+    cfg: Config,
+    *,
+    p: Path,
+    display_filter: str,
+    decode_as: Optional[list[str]] = None,
+    preferences: Optional[list[str]] = None,
+    protocols: Optional[list[str]] = None,
+    output_path: Path,
+    output_format: str,
+    capture_slice: Optional[CaptureSlice] = None,
+) -> None:
+    if output_format not in ("pcap", "pcapng"):
+        raise PcapMcpError("INVALID_ARGUMENT", "output_format must be pcap|pcapng")
+
+    args: list[str] = [
+        cfg.tshark_path,
+    ]
+
+    args += dissector_args(decode_as, preferences, protocols)
+
+    args += [
+        "-r",
+        "-" if capture_slice else str(p),
+    ]
+
+    if display_filter:
+        args += ["-Y", display_filter]
+
+    args += ["-F", output_format, "-w", str(output_path)]
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    try:
+        r = run_checked(
+            args,
+            timeout_s=cfg.export_timeout_s,
+            stdin_chunks=capture_slice.iter_chunks() if capture_slice else None,
+            policy=_policy(cfg, "export"),
+        )
+    except subprocess.TimeoutExpired:
+        raise PcapMcpError("TIMEOUT", "tshark export timed out")
+
+    stderr = r.stderr.strip()
+    if "Invalid display filter" in stderr:
+        raise PcapMcpError("INVALID_FILTER", "invalid display filter", {"stderr": stderr, "filter": display_filter})
+    if r.returncode != 0:
+        raise PcapMcpError("INTERNAL_ERROR", "tshark subcapture export failed", {"stderr": stderr})
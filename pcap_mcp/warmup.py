@@ -0,0 +1,100 @@
+from __future__ import annotations
+
+from concurrent.futures import Future, ThreadPoolExecutor
+import os
+import shutil
+import threading
+import time
+from typing import Any, Callable
+
+from . import metrics
+from .capture_set import index_member
+from .config import Config
+from .identity import metadata_store
+from .paths import validate_pcap_path
+from .timeindex import get_time_index
+from .tshark_tools import field_table_text, tshark_version
+
+
+# tshark probes and capture pre-indexing run on separate workers, so a tool waiting for the
+# field table never queues behind the time index of a large capture.
+_probe_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="pcap-mcp-warmup")
+_index_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pcap-mcp-preindex")
+_jobs: dict[tuple[str, str], Future] = {}
+_jobs_lock = threading.Lock()
+
+
+def _binary_key(path: str) -> str:
+    # A different tshark_path after a reload, or tshark upgraded in place, gets fresh results.
+    resolved = shutil.which(path) or path
+    try:
+        return f"{resolved}:{os.stat(resolved).st_mtime_ns}"
+    except OSError:
+        return resolved
+
+
+def _timed(task: str, fn: Callable[[], Any]) -> Callable[[], Any]:
+    def run() -> Any:
+        t0 = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            metrics.observe("warmup_seconds", time.perf_counter() - t0, task=task)
+
+    return run
+
+
+def _probe(name: str, key: str, fn: Callable[[], Any]) -> Future:
+    with _jobs_lock:
+        fut = _jobs.get((name, key))
+        # Failed probes are retried on the next request (e.g. tshark installed after start-up).
+        if fut is None or (fut.done() and fut.exception() is not None):
+            fut = _probe_executor.submit(metrics.queued("warmup", _timed(name, fn)))
+            _jobs[(name, key)] = fut
+    return fut
+
+
+def _wait(name: str, fut: Future) -> Any:
+    metrics.cache_event(f"warmup.{name}", fut.done())
+    return fut.result()
+
+
+def _version_probe(cfg: Config) -> Future:
+    return _probe("tshark_version", _binary_key(cfg.tshark_path), lambda: tshark_version(cfg))
+
+
+def _field_table_probe(cfg: Config) -> Future:
+    return _probe("field_table", _binary_key(cfg.tshark_path), lambda: field_table_text(cfg))
+
+
+def cached_tshark_version(cfg: Config) -> str:
+    return _wait("tshark_version", _version_probe(cfg))
+
+
+def cached_field_table(cfg: Config) -> str:
+    return _wait("field_table", _field_table_probe(cfg))
+
+
+def _preindex(cfg: Config) -> None:
+    # Rebuilds the in-memory per-capture indexes (time index, capture-set member info) that a
+    # restart lost, for the most recently used captures. Recent paths are stored resolved, so
+    # they are validated without the catalog: its first walk is left to the first tool call
+    # that needs a name lookup instead of competing with it here.
+    for raw in metadata_store(cfg).recent()[: max(0, int(cfg.warmup_recent_captures))]:
+        try:
+            p = validate_pcap_path(cfg, raw, remember=False, catalog=False)
+            get_time_index(cfg, p)
+            index_member(p)
+        except Exception:
+            continue
+
+
+def start_warmup(cfg: Config) -> None:
+    # Returns at once; tools block on a probe only when they need its result.
+    try:
+        cfg.output_dir.mkdir(parents=True, exist_ok=True)
+    except OSError:
+        pass
+    _version_probe(cfg)
+    _field_table_probe(cfg)
+    _index_executor.submit(metrics.queued("warmup", _timed("preindex", lambda: _preindex(cfg))))